@@ -2,6 +2,8 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
 import sys
+import queue
+import threading
 import cv2
 
 # Add the parent directory to the path so we can import video_annotator
@@ -10,6 +12,13 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from xdf_reader import XDFReader
 from ui_components import StreamFrame, InfoFrame, ControlPanel
 from export_utils import export_stream_to_csv
+from frame_store import FrameIndex
+from xdf_index import XDFIndex, LazyStream, LoadCancelled
+from xdf_cache import XDFCache
+
+LOAD_POLL_MS = 100      # How often the UI picks up progress from the loading thread
+TIME_BASE_LSL = "LSL clock"                 # Navigation timestamps are LSL times
+TIME_BASE_VIDEO = "Seconds from video start"
 
 class XDFApp:
     def __init__(self, root):
@@ -22,6 +31,16 @@ class XDFApp:
         self.current_file = None
         self.streams = None
         self.header = None
+        self.frame_index = None
+        
+        # Background loading: the worker thread reports through load_queue
+        self.load_queue = None
+        self.load_cancel = None
+        # Decode each stream's samples only when it is first shown, exported or plotted
+        self.load_on_demand = tk.BooleanVar(value=True)
+        # Parsed files are kept on disk, so reopening maps them instead of parsing again
+        self.xdf_cache = XDFCache()
+        self.use_cache = tk.BooleanVar(value=True)
         
         self.setup_ui()
         
@@ -51,6 +70,12 @@ class XDFApp:
         ttk.Entry(video_frame, textvariable=self.time_offset_var, width=10).grid(row=1, column=1, padx=5, pady=5, sticky="w")
         ttk.Label(video_frame, text="(positive if video starts after XDF recording)").grid(row=1, column=2, padx=5, pady=5, sticky="w")
         
+        # Time base of the timestamps being navigated to
+        ttk.Label(video_frame, text="Time Base:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        self.time_base_var = tk.StringVar(value=TIME_BASE_LSL)
+        ttk.Combobox(video_frame, textvariable=self.time_base_var, values=(TIME_BASE_LSL, TIME_BASE_VIDEO),
+                     state="readonly", width=24).grid(row=2, column=1, padx=5, pady=5, sticky="w")
+        
         # Create paned window for resizable sections
         paned = ttk.PanedWindow(main_frame, orient=tk.HORIZONTAL)
         paned.pack(fill=tk.BOTH, expand=True)
@@ -100,12 +125,21 @@ class XDFApp:
         self.stream_frame = StreamFrame(right_frame)
         self.stream_frame.pack(fill=tk.BOTH, expand=True)
         
-        # Status bar
+        # Status bar, with progress and cancel for file loading
+        status_frame = ttk.Frame(main_frame)
+        status_frame.pack(fill=tk.X, pady=(10, 0))
         self.status_var = tk.StringVar()
         self.status_var.set("Ready. Please open an XDF file.")
-        status_bar = ttk.Label(main_frame, textvariable=self.status_var, 
+        self.cancel_button = ttk.Button(status_frame, text="Cancel", command=self.cancel_loading,
+                                        state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.RIGHT)
+        self.progress = ttk.Progressbar(status_frame, length=200, maximum=100)
+        self.progress.pack(side=tk.RIGHT, padx=5)
+        status_bar = ttk.Label(status_frame, textvariable=self.status_var, 
                              relief=tk.SUNKEN, anchor=tk.W)
-        status_bar.pack(fill=tk.X, pady=(10, 0))
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        # Through the button, so Escape does nothing while it's disabled
+        self.root.bind("<Escape>", lambda event: self.cancel_button.invoke())
         
         # Add right-click menu for streams list
         self.stream_popup = tk.Menu(self.root, tearoff=0)
@@ -125,6 +159,9 @@ class XDFApp:
         file_menu = tk.Menu(menubar, tearoff=0)
         file_menu.add_command(label="Open XDF File", command=self.open_file)
         file_menu.add_command(label="Select Video", command=self.select_video_file)
+        file_menu.add_checkbutton(label="Load Streams on Demand", variable=self.load_on_demand)
+        file_menu.add_checkbutton(label="Cache Parsed Files", variable=self.use_cache)
+        file_menu.add_command(label="Clear Cache", command=self.clear_cache)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.destroy)
         menubar.add_cascade(label="File", menu=file_menu)
@@ -151,18 +188,157 @@ class XDFApp:
         if not filename:
             return
         
-        self.status_var.set(f"Loading file: {filename}")
-        self.root.update()
-        
+        self.load_file(filename)
+    
+    def load_file(self, filename, reloading=False):
+        """Load an XDF file on a worker thread, keeping the UI responsive."""
+        self.cancel_loading()
+        self.streams = None
+        self.header = None
+        self.streams_list.delete(0, tk.END)
+        self.progress.config(mode='determinate', value=0)
+        self.cancel_button.config(state=tk.NORMAL)
+        verb = "Reloading" if reloading else "Loading"
+        self.status_var.set(f"{verb} file: {filename}")
+        
+        # A queue and cancel event per load, so a cancelled load can't report into the next
+        self.load_queue = queue.Queue()
+        self.load_cancel = threading.Event()
+        worker = threading.Thread(target=self._load_worker,
+                                  args=(filename, self.load_queue, self.load_cancel,
+                                        self.load_on_demand.get(),
+                                        self.xdf_cache if self.use_cache.get() else None), daemon=True)
+        worker.start()
+        self.root.after(LOAD_POLL_MS, self._poll_loading, filename, self.load_queue, reloading)
+    
+    def _load_worker(self, filename, load_queue, cancel_event, on_demand, cache):
+        """Runs on the loading thread; never touches Tk, only load_queue."""
         try:
-            self.streams, self.header = self.xdf_reader.load_xdf(filename)
-            self.current_file = filename
-            self.populate_streams_list()
-            self.info_frame.update_info(self.current_file, self.header, len(self.streams))
-            self.status_var.set(f"Loaded {filename} with {len(self.streams)} streams")
+            # The chunk index gives the streams and progress quickly...
+            index = XDFIndex.open(
+                filename, cache,
+                on_stream=lambda entry: load_queue.put(('stream', entry)),
+                on_progress=lambda done, total: load_queue.put(('progress', done, total)),
+                cancel_event=cancel_event)
+            streams, header = index.load_streams()
+            if not on_demand:
+                # ...then every stream is decoded, synchronized and dejittered here,
+                # chunk by chunk, so the load can still be cancelled
+                total = sum(stream.entry.sample_bytes for stream in streams)
+                done = 0
+                for stream in streams:
+                    stream.load(lambda n, done=done: load_queue.put(('decoding', done + n, total)),
+                                cancel_event)
+                    done += stream.entry.sample_bytes
+                    load_queue.put(('decoding', done, total))
+            load_queue.put(('done', streams, header))
+        except LoadCancelled:
+            pass
         except Exception as e:
-            messagebox.showerror("Error Loading File", f"Failed to load XDF file:\n{e}")
-            self.status_var.set("Error loading file.")
+            load_queue.put(('error', e))
+    
+    def _poll_loading(self, filename, load_queue, reloading):
+        if load_queue is not self.load_queue:
+            return    # Superseded by a newer load
+        verb = "Reloading" if reloading else "Loading"
+        while True:
+            try:
+                message = load_queue.get_nowait()
+            except queue.Empty:
+                break
+            kind = message[0]
+            if kind == 'stream':
+                entry = message[1]
+                i = self.streams_list.size()
+                stream_name = entry.name or f"Stream #{i+1}"
+                self.streams_list.insert(tk.END, f"{i+1}: {stream_name} ({entry.type or 'Unknown'})")
+            elif kind == 'progress':
+                done, total = message[1:]
+                self.progress.config(value=100 * done / max(total, 1))
+                self.status_var.set(f"{verb} file: {filename} ({done / 1e6:.0f} of {total / 1e6:.0f} MB scanned)")
+            elif kind == 'decoding':
+                done, total = message[1:]
+                self.progress.config(value=100 * done / max(total, 1))
+                self.status_var.set(f"{verb} file: {filename} ({done / 1e6:.0f} of {total / 1e6:.0f} MB decoded)")
+            else:
+                self._finish_loading()
+                if kind == 'done':
+                    self.streams, self.header = message[1:]
+                    self.current_file = filename
+                    self.populate_streams_list()
+                    self.info_frame.update_info(filename, self.header, len(self.streams))
+                    self.status_var.set(f"{'Reloaded' if reloading else 'Loaded'} {filename} with {len(self.streams)} streams")
+                else:
+                    self.streams_list.delete(0, tk.END)
+                    action = "Reload" if reloading else "Load"
+                    messagebox.showerror(f"Error {verb} File", f"Failed to {action.lower()} XDF file:\n{message[1]}")
+                    self.status_var.set(f"Error {verb.lower()} file.")
+                return
+        self.root.after(LOAD_POLL_MS, self._poll_loading, filename, load_queue, reloading)
+    
+    def cancel_loading(self):
+        """Stop the load in progress, if any; its result is discarded."""
+        if self.load_cancel is not None:
+            # The worker stops at the next chunk while scanning or decoding; a
+            # result it still produces goes to a queue nobody reads any more
+            self.load_cancel.set()
+            self.streams_list.delete(0, tk.END)
+            self.status_var.set("Loading cancelled.")
+        self._finish_loading()
+    
+    def clear_cache(self):
+        kept = self.xdf_cache.clear()
+        if not kept:
+            self.status_var.set(f"Cleared the cache in {self.xdf_cache.directory}")
+            return
+        # Entries of the open file stay while its samples are mapped
+        self.status_var.set(f"Cleared the cache in {self.xdf_cache.directory}, except {len(kept)} entries")
+        messagebox.showwarning("Clear Cache", "These cache entries could not be removed:\n" +
+                               "\n".join(f"{os.path.basename(d)}: {reason}" for d, reason in kept))
+    
+    def _finish_loading(self):
+        self.load_queue = None
+        self.load_cancel = None
+        self.progress.stop()
+        self.progress.config(mode='determinate', value=0)
+        self.cancel_button.config(state=tk.DISABLED)
+    
+    def with_samples(self, stream, action):
+        """Call action() once the stream's samples are decoded, decoding them in the background if needed."""
+        if not isinstance(stream, LazyStream) or stream.loaded:
+            action()
+            return
+        self.status_var.set(f"Decoding samples of {stream.entry.name or 'stream'}...")
+        result = queue.Queue()
+        def decode():
+            try:
+                stream.load()
+                result.put(None)
+            except Exception as e:
+                result.put(e)
+        threading.Thread(target=decode, daemon=True).start()
+        self.root.after(LOAD_POLL_MS, self._poll_samples, result, action)
+    
+    def _poll_samples(self, result, action):
+        try:
+            error = result.get_nowait()
+        except queue.Empty:
+            self.root.after(LOAD_POLL_MS, self._poll_samples, result, action)
+            return
+        if error is None:
+            action()
+        else:
+            messagebox.showerror("Error Decoding Stream", f"Failed to decode stream samples:\n{error}")
+            self.status_var.set("Error decoding stream.")
+    
+    @staticmethod
+    def stream_metadata(stream):
+        """Name and type of a stream from its header alone, so the samples are never decoded for them."""
+        info = stream.get('info') or {}
+        def field(key):
+            value = info.get(key)
+            return value[0] if isinstance(value, list) and value else value
+        return {'name': field('name') or '', 'type': field('type') or ''}
     
     def populate_streams_list(self):
         self.streams_list.delete(0, tk.END)
@@ -189,12 +365,18 @@ class XDFApp:
         index = selection[0]
         if index < len(self.streams):
             stream = self.streams[index]
-            self.stream_frame.display_stream(stream, index)
-            self.status_var.set(f"Displaying stream {index+1}")
-            
-            # Enable click-to-navigate on data points for this stream
-            if hasattr(self, 'video_player') and self.video_player is not None:
-                self.stream_frame.enable_timestamp_navigation(self.navigate_to_video_frame)
+            self.with_samples(stream, lambda: self.display_stream(stream, index))
+    
+    def display_stream(self, stream, index):
+        if (not self.streams or index >= len(self.streams) or self.streams[index] is not stream
+                or self.streams_list.curselection() != (index,)):
+            return    # Another file or stream was picked while the samples were decoded
+        self.stream_frame.display_stream(stream, index)
+        self.status_var.set(f"Displaying stream {index+1}")
+        
+        # Enable click-to-navigate on data points for this stream
+        if hasattr(self, 'video_player') and self.video_player is not None:
+            self.stream_frame.enable_timestamp_navigation(self.navigate_to_video_frame)
     
     def export_stream(self):
         """Export the selected stream to CSV."""
@@ -206,33 +388,36 @@ class XDFApp:
         index = selection[0]
         if index < len(self.streams):
             stream = self.streams[index]
-            stream_info = self.xdf_reader.get_stream_info(stream)
-            
-            # Generate default filename based on stream name
-            default_filename = f"{stream_info['name']}.csv"
-            
-            # Ask user where to save
-            filename = filedialog.asksaveasfilename(
-                title="Export Stream to CSV",
-                defaultextension=".csv",
-                initialfile=default_filename,
-                filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
-            )
-            
-            if filename:
-                try:
-                    self.status_var.set(f"Exporting stream to {filename}...")
-                    self.root.update()
-                    
-                    # Convert stream data to CSV
-                    export_stream_to_csv(stream, filename)
-                    
-                    self.status_var.set(f"Exported stream to {filename}")
-                    messagebox.showinfo("Export Complete", 
-                                      f"Stream '{stream_info['name']}' was successfully exported to:\n{filename}")
-                except Exception as e:
-                    messagebox.showerror("Export Error", f"Failed to export stream: {e}")
-                    self.status_var.set("Error exporting stream.")
+            self.with_samples(stream, lambda: self.export_loaded_stream(stream))
+    
+    def export_loaded_stream(self, stream):
+        stream_info = self.stream_metadata(stream)
+        
+        # Generate default filename based on stream name
+        default_filename = f"{stream_info['name']}.csv"
+        
+        # Ask user where to save
+        filename = filedialog.asksaveasfilename(
+            title="Export Stream to CSV",
+            defaultextension=".csv",
+            initialfile=default_filename,
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        
+        if filename:
+            try:
+                self.status_var.set(f"Exporting stream to {filename}...")
+                self.root.update()
+                
+                # Convert stream data to CSV
+                export_stream_to_csv(stream, filename)
+                
+                self.status_var.set(f"Exported stream to {filename}")
+                messagebox.showinfo("Export Complete", 
+                                  f"Stream '{stream_info['name']}' was successfully exported to:\n{filename}")
+            except Exception as e:
+                messagebox.showerror("Export Error", f"Failed to export stream: {e}")
+                self.status_var.set("Error exporting stream.")
 
     def visualize_selected_stream(self):
         if not self.streams:
@@ -246,27 +431,22 @@ class XDFApp:
             
         index = selection[0]
         if index < len(self.streams):
-            try:
-                from data_visualizer import visualize_stream
-                visualize_stream(self.streams[index])
-                self.status_var.set("Visualization window opened")
-            except Exception as e:
-                messagebox.showerror("Visualization Error", f"Failed to visualize stream:\n{e}")
-                self.status_var.set("Error visualizing stream.")
+            stream = self.streams[index]
+            self.with_samples(stream, lambda: self.visualize_loaded_stream(stream))
+    
+    def visualize_loaded_stream(self, stream):
+        try:
+            from data_visualizer import visualize_stream
+            visualize_stream(stream)
+            self.status_var.set("Visualization window opened")
+        except Exception as e:
+            messagebox.showerror("Visualization Error", f"Failed to visualize stream:\n{e}")
+            self.status_var.set("Error visualizing stream.")
     
     def refresh_data(self):
         """Reload the currently open XDF file without prompting."""
         if self.current_file:
-            filename = self.current_file
-            self.status_var.set(f"Reloading file: {filename}")
-            try:
-                self.streams, self.header = self.xdf_reader.load_xdf(filename)
-                self.populate_streams_list()
-                self.info_frame.update_info(filename, self.header, len(self.streams))
-                self.status_var.set(f"Reloaded {filename} with {len(self.streams)} streams")
-            except Exception as e:
-                messagebox.showerror("Error Reloading File", f"Failed to reload XDF file:\n{e}")
-                self.status_var.set("Error reloading file.")
+            self.load_file(self.current_file, reloading=True)
         else:
             messagebox.showinfo("No File", "Please open an XDF file first.")
 
@@ -283,6 +463,13 @@ class XDFApp:
         self.video_path = video_path
         self.video_path_var.set(os.path.basename(video_path))
         
+        # Per-frame index written by camels.py, if the recording has one
+        try:
+            self.frame_index = FrameIndex.for_video(video_path)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring frame index for {video_path}: {e}")
+            self.frame_index = None
+        
         # Try to open the video to get properties
         try:
             from video_annotator import VideoAnnotator
@@ -303,13 +490,34 @@ class XDFApp:
         adjusted_timestamp = timestamp + self.time_offset_var.get()
         
         try:
-            # Get video properties
-            fps = self.video_player.cap.get(cv2.CAP_PROP_FPS)
-            if not fps or fps <= 0:
-                fps = 30.0  # fallback
-            
-            # Find the closest frame
-            frame_number = int(adjusted_timestamp * fps)
+            # The time base setting, not the value, says what the timestamp is
+            relative = self.time_base_var.get() == TIME_BASE_VIDEO
+            note = ""
+            if self.frame_index is not None and len(self.frame_index):
+                # Look the frame up by its recorded LSL grab time
+                times = self.frame_index.records['lsl_time']
+                lsl_time = times[0] + adjusted_timestamp if relative else adjusted_timestamp
+                if lsl_time < times[0]:
+                    note = " - before the video, showing its first frame"
+                elif lsl_time > times[-1]:
+                    note = " - after the video, showing its last frame"
+                frame_number = self.frame_index.position_at_time(lsl_time)
+            else:
+                # Get video properties
+                fps = self.video_player.cap.get(cv2.CAP_PROP_FPS)
+                if not fps or fps <= 0:
+                    fps = 30.0  # fallback
+                
+                # Without a frame index there are no LSL times to go by, so the
+                # (offset) timestamp is taken as seconds from the video start
+                if not relative:
+                    note = " - no frame index, timestamp taken as seconds from video start"
+                
+                # Estimate the closest frame, within the video
+                frame_count = int(self.video_player.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                frame_number = int(adjusted_timestamp * fps)
+                if frame_count > 0:
+                    frame_number = min(max(frame_number, 0), frame_count - 1)
             
             # Open the video player window if not already open
             if not self.video_player.is_window_open():
@@ -317,7 +525,7 @@ class XDFApp:
             
             # Jump to the frame
             self.video_player.jump_to_frame(frame_number)
-            self.status_var.set(f"Navigated to frame {frame_number} (timestamp: {adjusted_timestamp:.3f}s)")
+            self.status_var.set(f"Navigated to frame {frame_number} (timestamp: {adjusted_timestamp:.3f}s){note}")
         except Exception as e:
             messagebox.showerror("Navigation Error", f"Could not navigate to timestamp {timestamp}: {e}")
 
@@ -329,8 +537,8 @@ class XDFApp:
         
         # Check if this is a marker stream
         stream = self.streams[stream_idx]
-        stream_info = self.xdf_reader.get_stream_info(stream)
-        stype = (stream_info.get('type') or '').lower()
+        stream_info = self.stream_metadata(stream)
+        stype = stream_info['type'].lower()
         
         if stype not in ['markers', 'marker']:
             messagebox.showinfo("Not a Marker Stream", 
@@ -352,6 +560,10 @@ class XDFApp:
                 messagebox.showinfo("No Video", "Marker editing canceled. Please select a video file first.")
                 return
         
+        # The editor reads the markers, so they're decoded first
+        self.with_samples(stream, lambda: self.start_stream_marker_editor(stream, stream_info['name']))
+    
+    def start_stream_marker_editor(self, stream, name):
         # Import and create the marker editor
         try:
             from lsl_marker_editor import LSLMarkerEditor
@@ -364,7 +576,7 @@ class XDFApp:
                 time_offset=self.time_offset_var.get()
             )
             
-            self.status_var.set(f"Marker editor opened for '{stream_info['name']}' stream")
+            self.status_var.set(f"Marker editor opened for '{name}' stream")
             
         except Exception as e:
             messagebox.showerror("Error", f"Could not open marker editor: {e}")
@@ -383,8 +595,7 @@ class XDFApp:
             # Check if it's a marker stream
             is_marker = False
             if self.streams and index < len(self.streams):
-                stream_info = self.xdf_reader.get_stream_info(self.streams[index])
-                stype = (stream_info.get('type') or '').lower()
+                stype = self.stream_metadata(self.streams[index])['type'].lower()
                 is_marker = stype in ['markers', 'marker']
             
             # Enable/disable the Edit Markers option
@@ -423,10 +634,9 @@ class XDFApp:
                 # No selection, so find marker streams and let user choose
                 marker_streams = []
                 for i, stream in enumerate(self.streams):
-                    stream_info = self.xdf_reader.get_stream_info(stream)
-                    stype = (stream_info.get('type') or '').lower()
-                    if stype in ['markers', 'marker']:
-                        marker_streams.append((i, stream_info.get('name', f"Stream {i+1}")))
+                    stream_info = self.stream_metadata(stream)
+                    if stream_info['type'].lower() in ['markers', 'marker']:
+                        marker_streams.append((i, stream_info['name'] or f"Stream {i+1}"))
                 
                 if not marker_streams:
                     messagebox.showinfo("No Marker Streams", "No marker streams found in the XDF file.")
@@ -479,8 +689,7 @@ class XDFApp:
         
         # Check marker type
         marker_stream = self.streams[marker_stream_idx]
-        stream_info = self.xdf_reader.get_stream_info(marker_stream)
-        stype = (stream_info.get('type') or '').lower()
+        stype = self.stream_metadata(marker_stream)['type'].lower()
         if stype not in ['markers', 'marker']:
             messagebox.showerror("Error", "Selected stream is not a marker stream.")
             return
@@ -496,10 +705,9 @@ class XDFApp:
         # Prompt user to select a video frame stream (if any exist)
         video_streams = []
         for i, s in enumerate(self.streams):
-            s_info = self.xdf_reader.get_stream_info(s)
-            sname = (s_info.get('name') or "").lower()
-            if "video" in sname or "frame" in sname:
-                video_streams.append((i, s_info.get('name', f"Stream {i+1}")))
+            sname = self.stream_metadata(s)['name']
+            if "video" in sname.lower() or "frame" in sname.lower():
+                video_streams.append((i, sname or f"Stream {i+1}"))
         
         video_stream = None
         selected_index = [None]  # ensure always defined
@@ -558,9 +766,14 @@ class XDFApp:
             
             def start_editor():
                 offset = offset_var.get()
+                offset_dialog.destroy()
+                # The editor reads both streams, so they're decoded first (a
+                # missing video stream goes straight through)
+                self.with_samples(marker_stream, lambda: self.with_samples(
+                    video_stream, lambda: create_editor(offset)))
+            
+            def create_editor(offset):
                 try:
-                    offset_dialog.destroy()
-                    
                     editor_window = tk.Toplevel(self.root)
                     editor_window.title("LSL Marker Editor")
                     editor_window.geometry("1200x800")
@@ -619,54 +832,58 @@ Version: 1.0
         index = selection[0]
         if index < len(self.streams):
             stream = self.streams[index]
-            stream_info = self.xdf_reader.get_stream_info(stream)
-            
-            # Create a detailed info dialog
-            info_dialog = tk.Toplevel(self.root)
-            info_dialog.title(f"Stream Info: {stream_info['name']}")
-            info_dialog.geometry("600x500")
-            info_dialog.transient(self.root)
-            
-            # Create a scrollable text area
-            frame = ttk.Frame(info_dialog, padding="10")
-            frame.pack(fill=tk.BOTH, expand=True)
-            
-            scroll = ttk.Scrollbar(frame)
-            scroll.pack(side=tk.RIGHT, fill=tk.Y)
-            
-            info_text = tk.Text(frame, wrap=tk.WORD, yscrollcommand=scroll.set, font=("Consolas", 10))
-            info_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-            scroll.config(command=info_text.yview)
-            
-            # Format the info text
-            info_text.insert(tk.END, f"Stream Name: {stream_info['name']}\n")
-            info_text.insert(tk.END, f"Stream Type: {stream_info['type']}\n")
-            info_text.insert(tk.END, f"Channel Count: {stream_info['channel_count']}\n")
-            info_text.insert(tk.END, f"Nominal Sampling Rate: {stream_info['nominal_srate']}\n")
-            info_text.insert(tk.END, f"Actual Sampling Rate: {stream_info['actual_srate']:.2f} Hz\n")
-            info_text.insert(tk.END, f"Sample Count: {len(stream['time_stamps'])}\n\n")
-            
-            # Add channel info if available
-            if 'channels' in stream_info and stream_info['channels']:
-                info_text.insert(tk.END, "Channel Information:\n")
-                for i, channel in enumerate(stream_info['channels']):
-                    info_text.insert(tk.END, f"  Channel {i+1}: {channel.get('name', 'Unnamed')}\n")
-                    info_text.insert(tk.END, f"    Type: {channel.get('type', 'Unknown')}\n")
-                    info_text.insert(tk.END, f"    Unit: {channel.get('unit', 'Unspecified')}\n\n")
-            
-            # Add sample data
-            info_text.insert(tk.END, "Sample Data Points:\n")
-            samples = self.xdf_reader.get_sample_data(stream, max_samples=5)
-            for i, sample in enumerate(samples):
-                info_text.insert(tk.END, f"  Sample {i+1}:\n")
-                info_text.insert(tk.END, f"    Timestamp: {sample['timestamp']}\n")
-                info_text.insert(tk.END, f"    Data: {sample['data']}\n\n")
-            
-            # Make text read-only
-            info_text.config(state=tk.DISABLED)
-            
-            # Close button
-            ttk.Button(info_dialog, text="Close", command=info_dialog.destroy).pack(pady=10)
+            self.with_samples(stream, lambda: self.show_stream_info(stream))
+    
+    def show_stream_info(self, stream):
+        # Sample count, rate and the first samples need the decoded stream
+        stream_info = self.xdf_reader.get_stream_info(stream)
+        
+        # Create a detailed info dialog
+        info_dialog = tk.Toplevel(self.root)
+        info_dialog.title(f"Stream Info: {stream_info['name']}")
+        info_dialog.geometry("600x500")
+        info_dialog.transient(self.root)
+        
+        # Create a scrollable text area
+        frame = ttk.Frame(info_dialog, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        scroll = ttk.Scrollbar(frame)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        info_text = tk.Text(frame, wrap=tk.WORD, yscrollcommand=scroll.set, font=("Consolas", 10))
+        info_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll.config(command=info_text.yview)
+        
+        # Format the info text
+        info_text.insert(tk.END, f"Stream Name: {stream_info['name']}\n")
+        info_text.insert(tk.END, f"Stream Type: {stream_info['type']}\n")
+        info_text.insert(tk.END, f"Channel Count: {stream_info['channel_count']}\n")
+        info_text.insert(tk.END, f"Nominal Sampling Rate: {stream_info['nominal_srate']}\n")
+        info_text.insert(tk.END, f"Actual Sampling Rate: {stream_info['actual_srate']:.2f} Hz\n")
+        info_text.insert(tk.END, f"Sample Count: {len(stream['time_stamps'])}\n\n")
+        
+        # Add channel info if available
+        if 'channels' in stream_info and stream_info['channels']:
+            info_text.insert(tk.END, "Channel Information:\n")
+            for i, channel in enumerate(stream_info['channels']):
+                info_text.insert(tk.END, f"  Channel {i+1}: {channel.get('name', 'Unnamed')}\n")
+                info_text.insert(tk.END, f"    Type: {channel.get('type', 'Unknown')}\n")
+                info_text.insert(tk.END, f"    Unit: {channel.get('unit', 'Unspecified')}\n\n")
+        
+        # Add sample data
+        info_text.insert(tk.END, "Sample Data Points:\n")
+        samples = self.xdf_reader.get_sample_data(stream, max_samples=5)
+        for i, sample in enumerate(samples):
+            info_text.insert(tk.END, f"  Sample {i+1}:\n")
+            info_text.insert(tk.END, f"    Timestamp: {sample['timestamp']}\n")
+            info_text.insert(tk.END, f"    Data: {sample['data']}\n\n")
+        
+        # Make text read-only
+        info_text.config(state=tk.DISABLED)
+        
+        # Close button
+        ttk.Button(info_dialog, text="Close", command=info_dialog.destroy).pack(pady=10)
 
     def advanced_visualize(self):
         """Open advanced visualization for the selected stream."""
@@ -678,77 +895,80 @@ Version: 1.0
         index = selection[0]
         if index < len(self.streams):
             stream = self.streams[index]
-            stream_info = self.xdf_reader.get_stream_info(stream)
-            
-            # Create a dialog for visualization
-            viz_dialog = tk.Toplevel(self.root)
-            viz_dialog.title(f"Advanced Visualization: {stream_info['name']}")
-            viz_dialog.geometry("800x600")
-            viz_dialog.transient(self.root)
-            
-            # Create matplotlib figure
-            import matplotlib.pyplot as plt
-            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-            import numpy as np
-            
-            fig, ax = plt.subplots(figsize=(8, 5))
-            
-            # Get the data to plot
-            time_series = stream['time_series']
-            time_stamps = stream['time_stamps']
-            
-            # Check data dimensions
-            if len(time_stamps) == 0:
-                tk.Label(viz_dialog, text="No data to visualize").pack(pady=20)
-                return
-            
-            # Adjust time to start from 0
-            time_offset = time_stamps[0]
-            adjusted_times = [t - time_offset for t in time_stamps]
-            
-            # Plot based on data dimensions
-            if isinstance(time_series, np.ndarray):
-                if len(time_series.shape) == 1:  # 1D data
-                    ax.plot(adjusted_times, time_series)
-                elif time_series.shape[1] <= 10:  # 2D data with few channels
-                    for i in range(time_series.shape[1]):
-                        ax.plot(adjusted_times, time_series[:, i], label=f"Channel {i+1}")
-                    ax.legend()
-                else:  # 2D data with many channels - plot as heatmap
-                    # Subsample for better visualization
-                    max_points = 1000
-                    if len(adjusted_times) > max_points:
-                        indices = np.linspace(0, len(adjusted_times) - 1, max_points, dtype=int)
-                        times_subset = [adjusted_times[i] for i in indices]
-                        data_subset = time_series[indices]
-                    else:
-                        times_subset = adjusted_times
-                        data_subset = time_series
-                    
-                    im = ax.imshow(data_subset.T, aspect='auto', origin='lower', 
-                                 extent=[times_subset[0], times_subset[-1], 0, time_series.shape[1]])
-                    fig.colorbar(im, ax=ax, label='Amplitude')
-                    ax.set_ylabel('Channel')
-            else:
-                # Handle non-numpy data
+            self.with_samples(stream, lambda: self.show_advanced_visualization(stream))
+    
+    def show_advanced_visualization(self, stream):
+        stream_info = self.xdf_reader.get_stream_info(stream)
+        
+        # Create a dialog for visualization
+        viz_dialog = tk.Toplevel(self.root)
+        viz_dialog.title(f"Advanced Visualization: {stream_info['name']}")
+        viz_dialog.geometry("800x600")
+        viz_dialog.transient(self.root)
+        
+        # Create matplotlib figure
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        import numpy as np
+        
+        fig, ax = plt.subplots(figsize=(8, 5))
+        
+        # Get the data to plot
+        time_series = stream['time_series']
+        time_stamps = stream['time_stamps']
+        
+        # Check data dimensions
+        if len(time_stamps) == 0:
+            tk.Label(viz_dialog, text="No data to visualize").pack(pady=20)
+            return
+        
+        # Adjust time to start from 0
+        time_offset = time_stamps[0]
+        adjusted_times = [t - time_offset for t in time_stamps]
+        
+        # Plot based on data dimensions
+        if isinstance(time_series, np.ndarray):
+            if len(time_series.shape) == 1:  # 1D data
                 ax.plot(adjusted_times, time_series)
-            
-            ax.set_xlabel('Time (s)')
-            ax.set_title(f"{stream_info['name']} - {stream_info['type']}")
-            
-            # Create canvas
-            canvas = FigureCanvasTkAgg(fig, master=viz_dialog)
-            canvas.draw()
-            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-            
-            # Add toolbar
-            from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
-            toolbar_frame = tk.Frame(viz_dialog)
-            toolbar_frame.pack(fill=tk.X)
-            NavigationToolbar2Tk(canvas, toolbar_frame)
-            
-            # Close button
-            ttk.Button(viz_dialog, text="Close", command=viz_dialog.destroy).pack(pady=10)
+            elif time_series.shape[1] <= 10:  # 2D data with few channels
+                for i in range(time_series.shape[1]):
+                    ax.plot(adjusted_times, time_series[:, i], label=f"Channel {i+1}")
+                ax.legend()
+            else:  # 2D data with many channels - plot as heatmap
+                # Subsample for better visualization
+                max_points = 1000
+                if len(adjusted_times) > max_points:
+                    indices = np.linspace(0, len(adjusted_times) - 1, max_points, dtype=int)
+                    times_subset = [adjusted_times[i] for i in indices]
+                    data_subset = time_series[indices]
+                else:
+                    times_subset = adjusted_times
+                    data_subset = time_series
+                
+                im = ax.imshow(data_subset.T, aspect='auto', origin='lower', 
+                             extent=[times_subset[0], times_subset[-1], 0, time_series.shape[1]])
+                fig.colorbar(im, ax=ax, label='Amplitude')
+                ax.set_ylabel('Channel')
+        else:
+            # Handle non-numpy data
+            ax.plot(adjusted_times, time_series)
+        
+        ax.set_xlabel('Time (s)')
+        ax.set_title(f"{stream_info['name']} - {stream_info['type']}")
+        
+        # Create canvas
+        canvas = FigureCanvasTkAgg(fig, master=viz_dialog)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # Add toolbar
+        from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
+        toolbar_frame = tk.Frame(viz_dialog)
+        toolbar_frame.pack(fill=tk.X)
+        NavigationToolbar2Tk(canvas, toolbar_frame)
+        
+        # Close button
+        ttk.Button(viz_dialog, text="Close", command=viz_dialog.destroy).pack(pady=10)
 
 def main():
     root = tk.Tk()
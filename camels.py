@@ -1,65 +1,850 @@
+import os
 import cv2
+import json
 import time
-import paho.mqtt.subscribe as subscribe
+import queue
+import argparse
 import datetime
-from pylsl import StreamInfo, StreamOutlet
-
-# Initialize video capture
-cap = cv2.VideoCapture(0)
-assert cap.isOpened(), "Error reading video file"
-
-# Set video capture properties
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
-cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
-cap.set(cv2.CAP_PROP_FPS, 60.0)
-
-# Get video properties
-w, h, fps = (int(cap.get(x)) for x in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FPS))
-print(w, h, fps)
-
-# Get current date and time for filename
-now = datetime.datetime.now()
-date_time = now.strftime("%Y-%m-%d_%H-%M-%S")
-filename = fr"C:\Users\Admin\Desktop\DawgOs\videos\{date_time}.mp4"
-
-# Initialize video writer
-video_writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
-
-# Initialize LSL stream
-info = StreamInfo('FrameNumberStream', 'Markers', 1, 0, 'int32', 'myuidw43536')
-outlet = StreamOutlet(info)
-
-# Subscribe to MQTT topic
-# msg = subscribe.simple("video", hostname="127.0.0.1")
-# print(f"Message received: {msg.payload}")
-
-# Start video capture loop
-start_time = time.time()
-counter = 0
-
-while cap.isOpened():
-    counter += 1
-    success, im0 = cap.read()
-    if not success:
-        print("Video frame is empty or video processing has been successfully completed.")
-        break
-
-    print(counter)
-    cv2.imshow('Frame', im0)
-    video_writer.write(im0)
-
-    # Send frame number to LSL stream
-    outlet.push_sample([counter])
-
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-# Release resources
-cap.release()
-video_writer.release()
-cv2.destroyAllWindows()
-
-end_time = time.time()
-elapsed_time = end_time - start_time
-print(f'Time elapsed: {elapsed_time} seconds')
+import tempfile
+import threading
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
+from pylsl import StreamInfo, StreamOutlet, local_clock
+from frame_store import MjpegWriter, FrameIndexWriter, MJPEG_EXTENSION, index_path
+from shm_encoder import EncoderPool, ProcessEncoder, ffmpeg_path
+from mqtt_control import MqttControl, LocalBroker, stdin_publisher, MQTT_HOST, MQTT_TOPIC
+from frame_sync import FrameSynchronizer
+from capture_health import CaptureHealth, health_outlet, format_report, HEALTH_INTERVAL, CONSOLE_INTERVAL
+from frame_sources import open_source
+
+# Capture settings
+FRAME_WIDTH = 1920
+FRAME_HEIGHT = 1080
+FRAME_RATE = 60.0
+VIDEO_DIR = r"C:\Users\Admin\Desktop\DawgOs\videos"
+SOURCE_ID = 'myuidw43536'
+
+# Benchmark defaults, used unless --camera and --duration are given
+BENCHMARK_SOURCE = "synthetic:1920x1080@60"
+BENCHMARK_SECONDS = 10.0
+
+# Pipeline settings
+QUEUE_SIZE = 120            # Frames buffered for the encoder (~2 s at 60 fps)
+PREVIEW_QUEUE_SIZE = 2      # The preview only ever needs the latest frames
+# What the capture thread does when the encoder queue is full:
+# - block:        wait for the encoder (lossless, capture may stall)
+# - drop_oldest:  never wait, discard the oldest queued frame to make room
+# The preview never holds capture back; it skips whatever it can't show.
+# drop_preview is the old name for block, from when the preview could block too.
+QUEUE_POLICIES = ("block", "drop_oldest")
+QUEUE_POLICY = "block"
+
+# The preview shows a downscaled copy at a capped rate from its own thread.
+# Passthrough JPEGs are decoded straight to a reduced size by libjpeg.
+PREVIEW_SCALE = 0.5
+PREVIEW_FPS = 15.0
+PREVIEW_REDUCED_DECODE = [(8, cv2.IMREAD_REDUCED_COLOR_8),
+                          (4, cv2.IMREAD_REDUCED_COLOR_4),
+                          (2, cv2.IMREAD_REDUCED_COLOR_2)]
+
+# Triggered recording keeps the most recent frames while idle. Both limits
+# apply; with --passthrough the frames are compressed so the time limit wins,
+# decoded 1080p frames hit the byte limit after about 40 frames.
+PRETRIGGER_SECONDS = 2.0
+PRETRIGGER_MAX_MB = 256
+
+# Recordings rotate to a new file after this long or this many bytes (0 = never).
+# With --encoder-processes the size is that of the parts encoded so far, since
+# the file itself only exists once they are stitched.
+SEGMENT_SECONDS = 300
+SEGMENT_MAX_MB = 2048
+SEGMENT_SIZE_CHECK_EVERY = 60
+
+# A captured frame: running frame number, LSL timestamp at grab, the camera's
+# own position in ms and the image (a BGR array, or the camera's JPEG payload
+# in passthrough mode)
+Frame = namedtuple('Frame', ['number', 'timestamp', 'pos_msec', 'image'])
+
+
+class FrameQueue:
+    """Bounded queue between the capture thread and one worker."""
+
+    def __init__(self, maxsize, drop_when_full):
+        self.queue = queue.Queue(maxsize)
+        self.drop_when_full = drop_when_full
+        self.dropped = 0
+
+    def put(self, frame):
+        if not self.drop_when_full:
+            self.queue.put(frame)
+            return
+        # Make room by discarding the oldest frame rather than waiting
+        while True:
+            try:
+                self.queue.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self):
+        return self.queue.get()
+
+
+class PreTriggerBuffer:
+    """Ring of the most recent frames, bounded by age and by total bytes."""
+
+    def __init__(self, seconds, max_bytes):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.frames = deque()
+        self.nbytes = 0
+
+    def push(self, frame):
+        self.frames.append(frame)
+        self.nbytes += frame.image.nbytes
+        while self.frames and (self.nbytes > self.max_bytes or
+                               frame.timestamp - self.frames[0].timestamp > self.seconds):
+            self.nbytes -= self.frames.popleft().image.nbytes
+
+    def drain(self):
+        frames = list(self.frames)
+        self.frames.clear()
+        self.nbytes = 0
+        return frames
+
+
+class Segment:
+    """One output file of a recording and the frames that went into it."""
+
+    def __init__(self, number, filename, video_writer, frame_index):
+        self.number = number
+        self.filename = filename
+        self.video_writer = video_writer
+        self.frame_index = frame_index
+        self.first_frame = self.last_frame = None
+        self.first_time = self.last_time = None
+        self.frames = 0
+        self.complete = False
+
+    def add(self, frame):
+        if self.first_frame is None:
+            self.first_frame, self.first_time = frame.number, frame.timestamp
+        self.last_frame, self.last_time = frame.number, frame.timestamp
+        self.frames += 1
+
+    def bytes_written(self):
+        offset = getattr(self.video_writer, 'offset', None)
+        if offset is not None:
+            return offset
+        if isinstance(self.video_writer, ProcessEncoder):
+            return self.video_writer.bytes_written()
+        try:
+            return os.path.getsize(self.filename)
+        except OSError:
+            return 0
+
+    def entry(self):
+        entry = {
+            'file': os.path.basename(self.filename),
+            'index': os.path.basename(self.frame_index.filename),
+            'first_frame': self.first_frame,
+            'last_frame': self.last_frame,
+            'first_lsl_time': self.first_time,
+            'last_lsl_time': self.last_time,
+            'frames': self.frames,
+            'complete': self.complete,
+        }
+        parts = getattr(self.video_writer, 'parts', None)
+        if parts:
+            # The parts couldn't be joined, so the file doesn't exist
+            entry['file'] = None
+            entry['parts'] = [os.path.basename(part) for part in parts]
+        return entry
+
+
+class Recorder:
+    """Owns the output files. Only the encoder thread calls into it.
+
+    A recording is a session of numbered segments. The next segment's writer
+    is opened in the background while the current one fills, and finished
+    segments are released in the background, so a rotation never stalls the
+    encoder. The manifest is rewritten whenever a segment starts or ends, so a
+    crash only loses the segment being written.
+    """
+
+    def __init__(self, open_output, output_dir, pretrigger, marker_outlet,
+                 segment_seconds=0, segment_bytes=0, name=""):
+        self.open_output = open_output
+        self.name = name
+        self.output_dir = output_dir
+        self.pretrigger = pretrigger
+        self.marker_outlet = marker_outlet
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="segment-io")
+        self.session = None
+        self.segments = []
+        self.segment = None
+        self.next_output = None
+        self.last_frame = 0
+        self.bytes_closed = 0
+
+    @property
+    def recording(self):
+        return self.segment is not None
+
+    def _segment_base(self, number):
+        return os.path.join(self.output_dir, f"{self.session}_{number:03d}")
+
+    def _manifest_path(self):
+        return os.path.join(self.output_dir, f"{self.session}.manifest.json")
+
+    def start(self, timestamp=None):
+        if self.recording:
+            return
+        # Get current date and time for the session name
+        date_time = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        if self.name:
+            date_time = f"{date_time}_{self.name}"
+        self.session = date_time
+        suffix = 1
+        while os.path.exists(self._manifest_path()):
+            # Several recordings can start within the same second
+            self.session = f"{date_time}_{suffix}"
+            suffix += 1
+        self.segments = []
+        self.next_output = self.io.submit(self.open_output, self._segment_base(0))
+        self._open_next_segment()
+        print(f"Recording to {self.segment.filename}")
+        self.marker(f"start {self.segment.filename}", timestamp)
+        # Flush the frames from just before the trigger
+        for frame in self.pretrigger.drain():
+            self._write(frame)
+
+    def stop(self, timestamp=None):
+        if not self.recording:
+            return
+        self._close_segment(self.segment)
+        self.segment = None
+        # The writer opened ahead of time for the next segment is not needed
+        unused, self.next_output = self.next_output, None
+        self.io.submit(self._discard_output, unused)
+        self.marker(f"stop {self.session}", timestamp)
+        print(f"Stopped recording {self.session} ({len(self.segments)} segments)")
+
+    def new_segment(self, timestamp=None):
+        if not self.recording:
+            return
+        previous = self.segment
+        self._open_next_segment()
+        self._close_segment(previous)
+        self.marker(f"segment {self.segment.filename}", timestamp)
+
+    def close(self):
+        self.stop()
+        self.io.shutdown(wait=True)
+
+    def total_bytes(self):
+        segment = self.segment
+        return self.bytes_closed + (segment.bytes_written() if segment is not None else 0)
+
+    def _open_next_segment(self):
+        # Usually ready already; only blocks if the last open is still running
+        filename, video_writer, frame_index = self.next_output.result()
+        self.segment = Segment(len(self.segments), filename, video_writer, frame_index)
+        self.segments.append(self.segment)
+        self.next_output = self.io.submit(self.open_output, self._segment_base(len(self.segments)))
+        self._save_manifest()
+
+    def _close_segment(self, segment):
+        self.io.submit(self._release_segment, segment)
+        # The manifest write is queued behind the release on the same thread
+        segment.complete = True
+        self._save_manifest()
+
+    def _save_manifest(self):
+        # The entries are taken on the I/O thread, after any release queued before
+        # this, so they show how the closed segments' files actually ended up
+        self.io.submit(self._write_manifest, self._manifest_path(), self.session, list(self.segments))
+
+    def _release_segment(self, segment):
+        segment.video_writer.release()
+        segment.frame_index.close()
+        self.bytes_closed += segment.bytes_written()
+
+    @staticmethod
+    def _discard_output(future):
+        filename, video_writer, frame_index = future.result()
+        video_writer.release()
+        frame_index.close()
+        for path in (filename, frame_index.filename):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def _write_manifest(path, session, segments):
+        manifest = {
+            'session': session,
+            'segments': [segment.entry() for segment in segments],
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def marker(self, text, timestamp=None):
+        # Every marker carries the camera and frame number it refers to
+        if self.name:
+            text = f"{self.name} {text}"
+        self.marker_outlet.push_sample([f"{text} frame={self.last_frame}"],
+                                       local_clock() if timestamp is None else timestamp)
+
+    def handle_command(self, command):
+        if command.name == "start":
+            self.start(command.timestamp)
+        elif command.name == "stop":
+            self.stop(command.timestamp)
+        elif command.name == "segment":
+            self.new_segment(command.timestamp)
+        elif command.name == "mark":
+            self.marker(f"mark {command.argument}".strip(), command.timestamp)
+
+    def handle_frame(self, frame):
+        self.last_frame = frame.number
+        if self.recording:
+            self._write(frame)
+            if self._segment_full():
+                self.new_segment()
+        else:
+            self.pretrigger.push(frame)
+
+    def _segment_full(self):
+        segment = self.segment
+        if self.segment_seconds and segment.last_time - segment.first_time >= self.segment_seconds:
+            return True
+        # Checking the file size is a syscall, so only look every second or so
+        if self.segment_bytes and segment.frames % SEGMENT_SIZE_CHECK_EVERY == 0:
+            return segment.bytes_written() >= self.segment_bytes
+        return False
+
+    def _write(self, frame):
+        # Only the MJPEG container reports offsets, and all its frames are keyframes;
+        # for cv2.VideoWriter the index flags the offset unknown instead
+        offset = self.segment.video_writer.write(frame.image)
+        self.segment.frame_index.append(frame.number, frame.timestamp, frame.pos_msec,
+                                        offset, keyframe=True)
+        self.segment.add(frame)
+
+
+class SyncFeed:
+    """Queue-like adaptor that forwards one camera's frame stamps to the synchronizer."""
+
+    def __init__(self, sync_queue, camera):
+        self.sync_queue = sync_queue
+        self.camera = camera
+
+    def put(self, frame):
+        if frame is None:
+            self.sync_queue.put((self.camera, None, None))
+        else:
+            self.sync_queue.put((self.camera, frame.number, frame.timestamp))
+
+
+def sync_loop(synchronizer, sync_queue, cameras):
+    remaining = cameras
+    while remaining:
+        camera, number, timestamp = sync_queue.get()
+        if number is None:
+            synchronizer.finish(camera)
+            remaining -= 1
+        else:
+            synchronizer.add(camera, number, timestamp)
+    synchronizer.flush()
+
+
+def capture_loop(cap, outlet, queues, health, stop_event):
+    """Grab and stamp frames, then hand them to the workers. Nothing else runs here."""
+    counter = 0
+    while not stop_event.is_set():
+        success, im0 = cap.read()
+        timestamp = local_clock()
+        if not success:
+            print("Video frame is empty or video processing has been successfully completed.")
+            break
+        counter += 1
+        health.on_frame(timestamp)
+
+        # Send frame number to LSL stream, stamped with the grab time
+        outlet.push_sample([counter], timestamp)
+
+        frame = Frame(counter, timestamp, cap.get(cv2.CAP_PROP_POS_MSEC), im0)
+        for q in queues:
+            q.put(frame)
+
+    # Tell the workers no more frames are coming
+    for q in queues:
+        q.put(None)
+
+
+def encoder_loop(recorder, encoder_queue, commands, health, stop_event):
+    failed = False
+    while True:
+        frame = encoder_queue.get()
+        if failed:
+            # Keep draining so the capture thread never blocks on a dead encoder
+            if frame is None:
+                break
+            continue
+        try:
+            # Control commands are applied between frames, on this thread
+            while not commands.empty():
+                recorder.handle_command(commands.get_nowait())
+            if frame is None:
+                break
+            write_start = time.perf_counter()
+            recorder.handle_frame(frame)
+            if recorder.recording:
+                health.on_write(time.perf_counter() - write_start)
+        except Exception as e:
+            print(f"Error writing frame {frame.number if frame else '-'}: {e}")
+            failed = True
+            stop_event.set()
+            if frame is None:
+                break
+    recorder.close()
+
+
+def preview_image(frame, compressed, scale):
+    """Downscaled copy of a frame with its frame number drawn on, or None if undecodable."""
+    if compressed:
+        # Let the JPEG decoder do as much of the downscaling as it can
+        factor, flags = next(((f, fl) for f, fl in PREVIEW_REDUCED_DECODE if f * scale <= 1.0),
+                             (1, cv2.IMREAD_COLOR))
+        image = cv2.imdecode(frame.image.reshape(-1), flags)
+        if image is None:
+            return None
+    else:
+        factor, image = 1, frame.image
+    h, w = image.shape[:2]
+    size = (max(1, int(w * factor * scale)), max(1, int(h * factor * scale)))
+    if size != (w, h):
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    elif image is frame.image:
+        # Never draw on the frame the encoder is writing
+        image = image.copy()
+    cv2.putText(image, str(frame.number), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+    return image
+
+
+def preview_worker(previews, images, stop_event, compressed=False, scale=PREVIEW_SCALE, fps=PREVIEW_FPS):
+    """Prepare the newest frame of every (window name, FrameQueue) pair at most fps times a second.
+
+    Decoding and downscaling happen here, off the main thread, and the finished
+    (window, image) pairs go to images for show_previews. Returns, after putting
+    None, once every queue has ended.
+    """
+    period = 1.0 / fps
+    active = dict(previews)
+    next_tick = time.perf_counter()
+    while active:
+        for window, preview_queue in list(active.items()):
+            # Skip straight to the newest frame
+            frame = None
+            try:
+                while True:
+                    frame = preview_queue.queue.get_nowait()
+                    if frame is None:
+                        del active[window]
+                        break
+            except queue.Empty:
+                pass
+            if frame is None or stop_event.is_set():
+                # Keep draining until the capture threads have finished
+                continue
+            image = preview_image(frame, compressed, scale)
+            if image is not None:
+                images.put((window, image))
+
+        next_tick += period
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_tick = time.perf_counter()
+    images.put(None)
+
+
+def show_previews(images, stop_event, fps=PREVIEW_FPS):
+    """Show what preview_worker prepared until it ends. Must run on the main thread.
+
+    HighGUI windows only work reliably from the main thread (Cocoa, Qt), so this
+    loop does nothing but imshow and waitKey.
+    """
+    wait_ms = max(1, int(500 / fps))
+    try:
+        done = False
+        while not done:
+            latest = {}
+            try:
+                while True:
+                    item = images.queue.get_nowait()
+                    if item is None:
+                        done = True
+                        break
+                    window, image = item
+                    latest[window] = image
+            except queue.Empty:
+                pass
+            for window, image in latest.items():
+                cv2.imshow(window, image)
+            if cv2.waitKey(wait_ms) & 0xFF == ord('q'):
+                stop_event.set()
+    except KeyboardInterrupt:
+        stop_event.set()
+    cv2.destroyAllWindows()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Record a camera to disk and stream frame numbers over LSL")
+    parser.add_argument('--camera', action='append', metavar='SOURCE',
+                        help="device index, video file or synthetic[:WxH][@FPS] to record; "
+                             "repeat for several cameras (default 0)")
+    parser.add_argument('--max-rate', action='store_true',
+                        help="replay files and synthetic sources as fast as possible instead of in real time")
+    parser.add_argument('--headless', action='store_true',
+                        help="no preview window")
+    parser.add_argument('--duration', type=float, default=0,
+                        help="stop after this many seconds (0 = until the source ends or 'q')")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="record --duration seconds headless in every pipeline mode and compare "
+                             "fps, drops, CPU time and encode latency")
+    parser.add_argument('--sync', action='store_true',
+                        help="group frames across cameras by LSL time and publish FrameSyncStream")
+    parser.add_argument('--output-dir', default=VIDEO_DIR,
+                        help="where recordings, indexes and manifests are written")
+    parser.add_argument('--segment-seconds', type=float, default=SEGMENT_SECONDS,
+                        help="start a new file after this many seconds (0 = never)")
+    parser.add_argument('--segment-mb', type=float, default=SEGMENT_MAX_MB,
+                        help="start a new file after this many MB (0 = never)")
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE,
+                        help="frames buffered between capture and encoder")
+    parser.add_argument('--preview-scale', type=float, default=PREVIEW_SCALE,
+                        help="size of the preview relative to the captured frames")
+    parser.add_argument('--preview-fps', type=float, default=PREVIEW_FPS,
+                        help="maximum preview refresh rate")
+    parser.add_argument('--queue-policy', choices=QUEUE_POLICIES + ("drop_preview",), default=QUEUE_POLICY,
+                        help="what to do when a worker queue is full")
+    parser.add_argument('--passthrough', action='store_true',
+                        help="store the camera's MJPEG frames as-is instead of re-encoding to mp4v")
+    parser.add_argument('--encoder-processes', type=int, default=0, metavar='N',
+                        help="encode mp4v on N worker processes through shared memory (0 = encoder thread)")
+    parser.add_argument('--mqtt-host', metavar='HOST',
+                        help=f"wait for start/stop/mark/segment on MQTT (e.g. {MQTT_HOST}) instead of "
+                             "recording right away; 'local' reads the commands from stdin")
+    parser.add_argument('--mqtt-topic', default=MQTT_TOPIC)
+    parser.add_argument('--pretrigger-seconds', type=float, default=PRETRIGGER_SECONDS,
+                        help="seconds of video kept from before a start command")
+    parser.add_argument('--pretrigger-mb', type=float, default=PRETRIGGER_MAX_MB,
+                        help="memory cap for the pre-trigger buffer")
+    args = parser.parse_args()
+    if args.queue_policy == "drop_preview":
+        args.queue_policy = "block"
+    if args.benchmark:
+        args.camera = args.camera or [BENCHMARK_SOURCE]
+        args.duration = args.duration or BENCHMARK_SECONDS
+    if args.passthrough and args.encoder_processes:
+        parser.error("--encoder-processes has nothing to encode in --passthrough mode")
+    if args.encoder_processes and ffmpeg_path() is None:
+        parser.error("--encoder-processes needs ffmpeg on the PATH to join the encoded parts")
+    return args
+
+
+def health_loop(pipelines, done_event):
+    """Publish each camera's health at HEALTH_INTERVAL and print it every CONSOLE_INTERVAL."""
+    last_print = time.time()
+    while not done_event.wait(HEALTH_INTERVAL):
+        show = time.time() - last_print >= CONSOLE_INTERVAL
+        for pipeline in pipelines:
+            sample = pipeline.health.snapshot(pipeline.encoder_queue.queue.qsize(),
+                                              pipeline.recorder.total_bytes())
+            pipeline.health_outlet.push_sample(sample)
+            if show:
+                print(format_report(pipeline.window, sample))
+        if show:
+            last_print = time.time()
+
+
+def open_capture(source, args):
+    # Initialize video capture
+    cap = open_source(source, realtime=not args.max_rate)
+    assert cap.isOpened(), f"Error reading video source {source}"
+
+    # Set video capture properties
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
+    cap.set(cv2.CAP_PROP_FPS, FRAME_RATE)
+    if args.passthrough:
+        # Hand out the compressed buffers instead of decoding every frame to BGR
+        cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+    return cap
+
+
+class CameraPipeline:
+    """Capture thread, encoder thread, queues, LSL outlet and recorder of one camera."""
+
+    def __init__(self, camera, source, args, marker_outlet, multi_camera):
+        self.camera = camera
+        self.source = source
+        self.name = f"cam{camera}" if multi_camera else ""
+        self.window = f"Camera {camera}" if multi_camera else "Frame"
+        self.passthrough = args.passthrough
+        self.encoder_processes = args.encoder_processes
+        self.headless = args.headless
+
+        self.cap = open_capture(source, args)
+
+        # Get video properties
+        self.w, self.h, self.fps = (int(self.cap.get(x)) for x in (cv2.CAP_PROP_FRAME_WIDTH,
+                                                                     cv2.CAP_PROP_FRAME_HEIGHT,
+                                                                     cv2.CAP_PROP_FPS))
+        print(source, self.w, self.h, self.fps)
+
+        # Initialize LSL stream; the first camera keeps the original name and source id
+        if camera == 0:
+            info = StreamInfo('FrameNumberStream', 'Markers', 1, 0, 'int32', SOURCE_ID)
+            self.health_outlet = health_outlet('CaptureHealth', f'{SOURCE_ID}-health')
+        else:
+            info = StreamInfo(f'FrameNumberStream{camera}', 'Markers', 1, 0, 'int32', f'{SOURCE_ID}-{camera}')
+            self.health_outlet = health_outlet(f'CaptureHealth{camera}', f'{SOURCE_ID}-{camera}-health')
+        self.outlet = StreamOutlet(info)
+        self.health = CaptureHealth(self.window, self.fps)
+
+        pretrigger = PreTriggerBuffer(args.pretrigger_seconds, int(args.pretrigger_mb * 1024 * 1024))
+        self.recorder = Recorder(self.open_output, args.output_dir, pretrigger, marker_outlet,
+                                 args.segment_seconds, int(args.segment_mb * 1024 * 1024), self.name)
+
+        # One set of encoder processes serves every segment of every recording
+        self.encoder_pool = None
+        if self.encoder_processes:
+            self.encoder_pool = EncoderPool('mp4v', self.fps, (self.w, self.h), workers=self.encoder_processes)
+
+        # Bounded queues between the capture thread and the workers
+        self.encoder_queue = FrameQueue(args.queue_size, drop_when_full=args.queue_policy == "drop_oldest")
+        self.preview_queue = FrameQueue(PREVIEW_QUEUE_SIZE, drop_when_full=True)
+
+    def open_output(self, base):
+        extension = MJPEG_EXTENSION if self.passthrough else ".mp4"
+        filename = base + extension
+
+        # Initialize video writer
+        size = (self.w, self.h)
+        if self.passthrough:
+            video_writer = MjpegWriter(filename, self.fps, size)
+        elif self.encoder_processes:
+            video_writer = ProcessEncoder(filename, 'mp4v', self.fps, size, pool=self.encoder_pool)
+        else:
+            video_writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, size)
+        return filename, video_writer, FrameIndexWriter(index_path(filename))
+
+    def start(self, commands, stop_event, extra_queues=()):
+        queues = [self.encoder_queue] + ([] if self.headless else [self.preview_queue]) + list(extra_queues)
+        self.capture_thread = threading.Thread(target=capture_loop, name=f"capture-{self.camera}",
+                                               args=(self.cap, self.outlet, queues, self.health, stop_event))
+        self.encoder_thread = threading.Thread(target=encoder_loop, name=f"encoder-{self.camera}",
+                                               args=(self.recorder, self.encoder_queue, commands,
+                                                     self.health, stop_event))
+        self.capture_thread.start()
+        self.encoder_thread.start()
+
+    def join(self):
+        self.capture_thread.join()
+        self.encoder_thread.join()
+        if self.encoder_pool is not None:
+            self.encoder_pool.close()
+        self.cap.release()
+
+
+def wait_for_capture(pipelines, stop_event, duration):
+    # Wait for the sources to end, the duration, 'q' in the preview or Ctrl+C
+    deadline = time.time() + duration if duration else None
+    try:
+        while any(pipeline.capture_thread.is_alive() for pipeline in pipelines):
+            if stop_event.is_set() or (deadline is not None and time.time() >= deadline):
+                break
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    stop_event.set()
+
+
+def run(args):
+    """Record one session and return its health summary."""
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    marker_info = StreamInfo('RecorderMarkers', 'Markers', 1, 0, 'string', f'{SOURCE_ID}-markers')
+    marker_outlet = StreamOutlet(marker_info)
+
+    sources = args.camera or ['0']
+    multi_camera = len(sources) > 1
+    pipelines = [CameraPipeline(i, source, args, marker_outlet, multi_camera)
+                 for i, source in enumerate(sources)]
+
+    # Subscribe to MQTT topic, or start recording straight away
+    control = None
+    if args.mqtt_host == "local":
+        broker = LocalBroker()
+        control = MqttControl(topic=args.mqtt_topic, client=broker.client())
+        stdin_publisher(broker, args.mqtt_topic)
+        print("Type start, stop, mark [label] or segment")
+    elif args.mqtt_host:
+        control = MqttControl(args.mqtt_host, topic=args.mqtt_topic)
+        print(f"Waiting for commands on {args.mqtt_host} topic '{args.mqtt_topic}'")
+    if control is None:
+        for pipeline in pipelines:
+            pipeline.recorder.start()
+
+    # Optional software sync across cameras, published as one LSL sample per group
+    synchronizer = None
+    sync_queue = None
+    if args.sync and multi_camera:
+        sync_info = StreamInfo('FrameSyncStream', 'Markers', len(pipelines), 0, 'int32', f'{SOURCE_ID}-sync')
+        sync_outlet = StreamOutlet(sync_info)
+        tolerance = 0.5 / max(pipeline.fps or FRAME_RATE for pipeline in pipelines)
+        synchronizer = FrameSynchronizer(len(pipelines), tolerance,
+                                         lambda numbers, t: sync_outlet.push_sample(numbers, t))
+        # Only small stamps go through here, so it's left unbounded and never drops
+        sync_queue = queue.Queue()
+        sync_thread = threading.Thread(target=sync_loop, name="sync",
+                                       args=(synchronizer, sync_queue, len(pipelines)))
+        sync_thread.start()
+
+    # Start video capture pipelines
+    start_time = time.time()
+    session = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    stop_event = threading.Event()
+    for pipeline in pipelines:
+        commands = control.listen() if control is not None else queue.Queue()
+        extra = [SyncFeed(sync_queue, pipeline.camera)] if synchronizer else []
+        pipeline.start(commands, stop_event, extra)
+
+    # Rate-limited health reporting instead of printing every frame
+    health_done = threading.Event()
+    health_thread = threading.Thread(target=health_loop, name="health", args=(pipelines, health_done))
+    health_thread.start()
+
+    preview_thread = None
+    if args.headless:
+        wait_for_capture(pipelines, stop_event, args.duration)
+    else:
+        # The windows are shown from this thread, so the waiting moves to another
+        previews = [(pipeline.window, pipeline.preview_queue) for pipeline in pipelines]
+        images = FrameQueue(PREVIEW_QUEUE_SIZE * len(previews), drop_when_full=True)
+        preview_thread = threading.Thread(target=preview_worker, name="preview",
+                                          args=(previews, images, stop_event, args.passthrough,
+                                                args.preview_scale, args.preview_fps))
+        wait_thread = threading.Thread(target=wait_for_capture, name="wait",
+                                       args=(pipelines, stop_event, args.duration))
+        preview_thread.start()
+        wait_thread.start()
+        show_previews(images, stop_event, args.preview_fps)
+        wait_thread.join()
+
+    for pipeline in pipelines:
+        pipeline.join()
+    if preview_thread is not None:
+        preview_thread.join()
+    if synchronizer is not None:
+        sync_thread.join()
+    health_done.set()
+    health_thread.join()
+
+    # Release resources
+    if control is not None:
+        control.close()
+
+    end_time = time.time()
+    elapsed_time = end_time - start_time
+    print(f'Time elapsed: {elapsed_time} seconds')
+    for pipeline in pipelines:
+        print(f'{pipeline.window}: frames dropped: encoder {pipeline.encoder_queue.dropped}, '
+              f'preview {pipeline.preview_queue.dropped}, detected {pipeline.health.dropped}')
+    if synchronizer is not None:
+        print(synchronizer.report([pipeline.window for pipeline in pipelines]))
+
+    # Save the session's health summary next to the recordings
+    summary = {
+        'session': session,
+        'elapsed_s': elapsed_time,
+        'cameras': [pipeline.health.summary({'encoder': pipeline.encoder_queue.dropped,
+                                             'preview': pipeline.preview_queue.dropped})
+                    for pipeline in pipelines],
+    }
+    if synchronizer is not None:
+        summary['sync'] = synchronizer.summary([pipeline.window for pipeline in pipelines])
+    summary_path = os.path.join(args.output_dir, f"{session}_health.json")
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Health summary written to {summary_path}")
+    return summary
+
+
+# Pipeline modes compared by --benchmark, as overrides of the parsed arguments
+BENCHMARK_MODES = [
+    ("mp4v thread", {}),
+    ("mp4v processes", {'encoder_processes': max(1, min(4, (os.cpu_count() or 2) - 1))}),
+    ("mjpeg passthrough", {'passthrough': True}),
+]
+
+
+def benchmark(args):
+    """Run every pipeline mode headless against the same source and compare throughput."""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="camels-bench-") as output_dir:
+        for mode, overrides in BENCHMARK_MODES:
+            if overrides.get('encoder_processes') and ffmpeg_path() is None:
+                print(f"--- {mode} skipped: needs ffmpeg on the PATH ---")
+                continue
+            run_args = argparse.Namespace(**vars(args))
+            run_args.encoder_processes = 0
+            run_args.passthrough = False
+            for key, value in overrides.items():
+                setattr(run_args, key, value)
+            run_args.output_dir = os.path.join(output_dir, mode.replace(" ", "_"))
+            run_args.headless = True
+            run_args.mqtt_host = None
+
+            print(f"--- {mode} ---")
+            cpu_start = os.times()
+            summary = run(run_args)
+            cpu_end = os.times()
+            # Children cover the encoder processes once they have been joined
+            cpu = sum(cpu_end[:4]) - sum(cpu_start[:4])
+            results.append((mode, summary, cpu))
+
+    print()
+    print(f"{'mode':<20}{'fps':>8}{'frames':>8}{'dropped':>9}{'cpu s':>8}{'cpu/frame ms':>14}"
+          f"{'encode ms':>11}{'p99 ms':>8}")
+    for mode, summary, cpu in results:
+        for camera in summary['cameras']:
+            frames = camera['frames']
+            dropped = camera['dropped_frames'] + sum(camera['queue_drops'].values())
+            latency = camera['encode_latency']
+            print(f"{mode:<20}{camera['mean_fps']:>8.1f}{frames:>8}{dropped:>9}{cpu:>8.2f}"
+                  f"{cpu / max(frames, 1) * 1000:>14.2f}{latency['mean_ms']:>11.2f}{latency['p99_ms']:>8.2f}")
+
+
+def main():
+    args = parse_args()
+    if args.benchmark:
+        benchmark(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
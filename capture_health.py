@@ -0,0 +1,174 @@
+import math
+import threading
+from pylsl import StreamInfo, StreamOutlet, local_clock
+
+# Capture health telemetry for camels.py.
+#
+# The capture and encoder threads only bump counters here. A reporter thread
+# takes a snapshot once per HEALTH_INTERVAL, publishes it on a low-rate LSL
+# stream and prints a line every CONSOLE_INTERVAL. The full histograms are
+# written to a JSON summary when the session ends.
+HEALTH_INTERVAL = 1.0       # Seconds between LSL health samples
+CONSOLE_INTERVAL = 5.0      # Seconds between console reports
+DROP_THRESHOLD = 1.5        # Intervals longer than this many periods mean lost frames
+HEALTH_CHANNELS = ['fps', 'interval_jitter_ms', 'dropped_frames', 'encode_latency_ms',
+                   'encode_latency_max_ms', 'queue_depth', 'write_mbps']
+
+
+class Histogram:
+    """Fixed-width histogram in milliseconds; the last bin collects everything above."""
+
+    def __init__(self, bin_ms, bins):
+        self.bin_ms = bin_ms
+        self.counts = [0] * bins
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, value_ms):
+        self.counts[min(int(value_ms / self.bin_ms), len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total += value_ms
+        self.total_sq += value_ms * value_ms
+        self.min = min(self.min, value_ms)
+        self.max = max(self.max, value_ms)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(max(0.0, self.total_sq / self.count - self.mean ** 2))
+
+    def percentile(self, q):
+        """Upper edge of the bin holding the q-th percentile."""
+        if not self.count:
+            return 0.0
+        target = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return (i + 1) * self.bin_ms
+        return len(self.counts) * self.bin_ms
+
+    def to_dict(self):
+        return {
+            'bin_ms': self.bin_ms,
+            'counts': self.counts,
+            'count': self.count,
+            'mean_ms': self.mean,
+            'std_ms': self.std,
+            'min_ms': self.min if self.count else None,
+            'max_ms': self.max,
+            'p50_ms': self.percentile(50),
+            'p99_ms': self.percentile(99),
+        }
+
+
+class CaptureHealth:
+    """Counters for one camera, updated from the capture and encoder threads."""
+
+    def __init__(self, name, fps):
+        self.name = name
+        self.period = 1.0 / fps if fps else 0.0
+        self.lock = threading.Lock()
+        self.intervals = Histogram(0.5, 200)
+        self.latencies = Histogram(0.25, 400)
+        self.frames = 0
+        self.dropped = 0
+        self.first_time = None
+        self.last_time = None
+        self.max_queue_depth = 0
+        self.bytes_written = 0
+        self._window = Histogram(0.5, 1)
+        self._window_latency = Histogram(0.25, 1)
+        self._window_frames = 0
+        self._window_start = None
+        self._window_bytes = 0
+
+    def on_frame(self, timestamp):
+        with self.lock:
+            if self.last_time is not None:
+                interval = timestamp - self.last_time
+                self.intervals.add(interval * 1000)
+                self._window.add(interval * 1000)
+                if self.period and interval > DROP_THRESHOLD * self.period:
+                    self.dropped += int(round(interval / self.period)) - 1
+            else:
+                self.first_time = timestamp
+                if self._window_start is None:
+                    self._window_start = timestamp
+            self.last_time = timestamp
+            self.frames += 1
+            self._window_frames += 1
+
+    def on_write(self, seconds):
+        with self.lock:
+            self.latencies.add(seconds * 1000)
+            self._window_latency.add(seconds * 1000)
+
+    def snapshot(self, queue_depth, bytes_written):
+        """Close the current report window and return one sample per HEALTH_CHANNELS."""
+        now = local_clock()
+        with self.lock:
+            if self._window_start is None:
+                self._window_start = now
+                self._window_bytes = bytes_written
+            elapsed = max(now - self._window_start, 1e-6)
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+            self.bytes_written = bytes_written
+            sample = [
+                self._window_frames / elapsed,
+                self._window.std,
+                float(self.dropped),
+                self._window_latency.mean,
+                self._window_latency.max,
+                float(queue_depth),
+                (bytes_written - self._window_bytes) / elapsed / 1e6,
+            ]
+            self._window = Histogram(0.5, 1)
+            self._window_latency = Histogram(0.25, 1)
+            self._window_frames = 0
+            self._window_start = now
+            self._window_bytes = bytes_written
+        return sample
+
+    def summary(self, queue_drops=None):
+        with self.lock:
+            duration = (self.last_time - self.first_time) if self.frames > 1 else 0.0
+            return {
+                'name': self.name,
+                'frames': self.frames,
+                'duration_s': duration,
+                'mean_fps': (self.frames - 1) / duration if duration else 0.0,
+                'dropped_frames': self.dropped,
+                'queue_drops': queue_drops or {},
+                'max_queue_depth': self.max_queue_depth,
+                'bytes_written': self.bytes_written,
+                'mean_write_mbps': self.bytes_written / duration / 1e6 if duration else 0.0,
+                'frame_interval': self.intervals.to_dict(),
+                'encode_latency': self.latencies.to_dict(),
+            }
+
+
+def health_outlet(name, source_id):
+    info = StreamInfo(name, 'CaptureHealth', len(HEALTH_CHANNELS), 1.0 / HEALTH_INTERVAL,
+                      'float32', source_id)
+    channels = info.desc().append_child("channels")
+    for label in HEALTH_CHANNELS:
+        channels.append_child("channel").append_child_value("label", label)
+    return StreamOutlet(info)
+
+
+def format_report(name, sample):
+    values = dict(zip(HEALTH_CHANNELS, sample))
+    return (f"{name}: {values['fps']:.1f} fps, jitter {values['interval_jitter_ms']:.2f} ms, "
+            f"dropped {int(values['dropped_frames'])}, encode {values['encode_latency_ms']:.2f} ms "
+            f"(max {values['encode_latency_max_ms']:.2f}), queue {int(values['queue_depth'])}, "
+            f"{values['write_mbps']:.1f} MB/s")
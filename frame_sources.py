@@ -0,0 +1,158 @@
+import re
+import time
+import numpy as np
+import cv2
+
+# Frame sources for camels.py besides a physical camera.
+#
+# Both sources mimic the part of cv2.VideoCapture the recorder uses (read,
+# get, set, isOpened, release). In real-time mode they behave like a camera:
+# frames keep coming at the native rate whether or not they are read, and a
+# late reader skips frames instead of receiving them late. In max-rate mode
+# every frame is delivered as fast as the reader can take it.
+#
+# Source specs accepted by open_source():
+#   0, 1, ...                       a capture device
+#   synthetic:1920x1080@60          generated frames
+#   path/to/video.mp4               a file replayed at its own frame rate
+SYNTHETIC_PATTERN = re.compile(r'^synthetic(?::(\d+)x(\d+))?(?:@([\d.]+))?$')
+SYNTHETIC_FRAMES = 60       # Distinct generated frames, cycled
+JPEG_QUALITY = 90
+
+
+class PacedSource:
+    """Shared pacing and property handling for the non-device sources."""
+
+    def __init__(self, width, height, fps, realtime):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.realtime = realtime
+        self.compressed = False
+        self.position = -1
+        self.start_time = None
+        self.opened = True
+
+    def isOpened(self):
+        return self.opened
+
+    def release(self):
+        self.opened = False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return max(self.position, 0) * 1000.0 / self.fps
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position + 1)
+        if prop == cv2.CAP_PROP_CONVERT_RGB:
+            return 0.0 if self.compressed else 1.0
+        return 0.0
+
+    def set(self, prop, value):
+        # Like a camera, ask for CONVERT_RGB=0 to get JPEG payloads
+        if prop == cv2.CAP_PROP_CONVERT_RGB:
+            self.compressed = not value
+            return True
+        return False
+
+    def _next_position(self):
+        """Frame number to deliver next, sleeping until it is due in real-time mode."""
+        if not self.realtime:
+            return self.position + 1
+        now = time.perf_counter()
+        if self.start_time is None:
+            self.start_time = now
+        position = max(self.position + 1, int((now - self.start_time) * self.fps))
+        due = self.start_time + position / self.fps
+        if due > now:
+            time.sleep(due - now)
+        return position
+
+    def _encode(self, image):
+        ok, data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        return data.reshape(1, -1)
+
+
+class SyntheticSource(PacedSource):
+    """Generated frames at a chosen resolution and rate."""
+
+    def __init__(self, width=1920, height=1080, fps=60.0, realtime=True):
+        super().__init__(width, height, fps, realtime)
+        self._frames = None
+        self._payloads = None
+
+    def _generate(self):
+        # A moving gradient with a frame label, so encoders see realistic motion
+        x = np.linspace(0, 255, self.width, dtype=np.float32)
+        y = np.linspace(0, 255, self.height, dtype=np.float32)[:, None]
+        frames = []
+        for i in range(SYNTHETIC_FRAMES):
+            shift = 255.0 * i / SYNTHETIC_FRAMES
+            image = np.empty((self.height, self.width, 3), dtype=np.uint8)
+            image[..., 0] = (x + shift) % 256
+            image[..., 1] = (y + shift) % 256
+            image[..., 2] = ((x + y) / 2 + 2 * shift) % 256
+            cv2.putText(image, f"synthetic {i}", (40, 80), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+            frames.append(image)
+        return frames
+
+    def read(self, image=None):
+        if not self.opened:
+            return False, None
+        if self._frames is None:
+            self._frames = self._generate()
+        if self.compressed and self._payloads is None:
+            self._payloads = [self._encode(frame) for frame in self._frames]
+        self.position = self._next_position()
+        frames = self._payloads if self.compressed else self._frames
+        return True, frames[self.position % SYNTHETIC_FRAMES].copy()
+
+
+class FileSource(PacedSource):
+    """A video file replayed at its native frame rate or as fast as possible."""
+
+    def __init__(self, filename, realtime=True):
+        self.cap = cv2.VideoCapture(filename)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        super().__init__(int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                         int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), fps, realtime)
+        self.opened = self.cap.isOpened()
+
+    def read(self, image=None):
+        if not self.opened:
+            return False, None
+        position = self._next_position()
+        # Frames the reader was too late for are skipped, as a camera would
+        while self.position + 1 < position:
+            if not self.cap.grab():
+                return False, None
+            self.position += 1
+        success, image = self.cap.read()
+        if not success:
+            return False, None
+        self.position = position
+        if self.compressed:
+            # Stand in for the camera's own JPEG encoder
+            image = self._encode(image)
+        return True, image
+
+    def release(self):
+        super().release()
+        self.cap.release()
+
+
+def open_source(spec, realtime=True):
+    """Open a device index, synthetic spec or video file as a capture source."""
+    if isinstance(spec, int) or spec.isdigit():
+        return cv2.VideoCapture(int(spec))
+    match = SYNTHETIC_PATTERN.match(spec)
+    if match:
+        width, height, fps = match.groups()
+        return SyntheticSource(int(width or 1920), int(height or 1080), float(fps or 60.0), realtime)
+    return FileSource(spec, realtime)
@@ -0,0 +1,246 @@
+import os
+import struct
+import argparse
+import numpy as np
+import cv2
+
+# Length-prefixed MJPEG frame container written by camels.py --passthrough.
+#
+# File header: magic, version, width, height, fps
+# Each frame:  uint32 payload length followed by the camera's JPEG bytes
+#
+# Frames are stored exactly as the camera delivered them, one record per
+# captured frame, so record N is LSL frame number N.
+MJPEG_MAGIC = b'MJPC'
+MJPEG_VERSION = 1
+MJPEG_HEADER = struct.Struct('<4sHHHd')
+MJPEG_LENGTH = struct.Struct('<I')
+MJPEG_EXTENSION = '.mjpc'
+
+JPEG_SOI = b'\xff\xd8'
+
+# Per-frame index sidecar written next to every recording.
+#
+# File header: magic, version, record size
+# Each record is fixed width, one per stored frame in file order:
+#   frame number (as pushed to FrameNumberStream), LSL local_clock() at grab,
+#   camera CAP_PROP_POS_MSEC, byte offset of the frame in the container
+#   (-1 when the writer doesn't expose it) and flags
+#
+# INDEX_OFFSET_UNKNOWN marks records whose writer (cv2.VideoWriter) reported
+# no offset. Their INDEX_KEYFRAME bit is never set, because nothing is known
+# about the encoder's keyframes: readers must not seek by offset or keyframe
+# in such files and should go by position or time instead.
+INDEX_MAGIC = b'FIDX'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('<4sHH')
+INDEX_RECORD = struct.Struct('<QddqB7x')
+INDEX_DTYPE = np.dtype({
+    'names': ['frame', 'lsl_time', 'pos_msec', 'offset', 'flags'],
+    'formats': ['<u8', '<f8', '<f8', '<i8', 'u1'],
+    'offsets': [0, 8, 16, 24, 32],
+    'itemsize': INDEX_RECORD.size,
+})
+INDEX_EXTENSION = '.fidx'
+INDEX_KEYFRAME = 0x01
+INDEX_OFFSET_UNKNOWN = 0x02
+INDEX_FLUSH_EVERY = 60      # Records between flushes, bounds what a crash can lose
+
+
+def index_path(video_filename):
+    return os.path.splitext(video_filename)[0] + INDEX_EXTENSION
+
+
+class MjpegWriter:
+    """Append compressed JPEG frames to a container file without re-encoding."""
+
+    def __init__(self, filename, fps, frame_size):
+        self.filename = filename
+        self.file = open(filename, 'wb')
+        w, h = frame_size
+        self.file.write(MJPEG_HEADER.pack(MJPEG_MAGIC, MJPEG_VERSION, w, h, fps))
+        self.offset = MJPEG_HEADER.size
+        self.frame_count = 0
+
+    def isOpened(self):
+        return not self.file.closed
+
+    def write(self, payload):
+        """Write one frame and return the byte offset of its record."""
+        payload = np.asarray(payload)
+        if payload.ndim > 2 or (payload.ndim == 2 and payload.shape[0] != 1):
+            raise ValueError("Expected a compressed JPEG payload but got a decoded image; "
+                             "the capture backend ignored CAP_PROP_CONVERT_RGB=0")
+        data = payload.tobytes()
+        if not data.startswith(JPEG_SOI):
+            raise ValueError("Frame payload is not a JPEG image")
+
+        record_offset = self.offset
+        self.file.write(MJPEG_LENGTH.pack(len(data)))
+        self.file.write(data)
+        self.offset += MJPEG_LENGTH.size + len(data)
+        self.frame_count += 1
+        return record_offset
+
+    def release(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class MjpegReader:
+    """Sequential and offset-based access to a container written by MjpegWriter."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, 'rb')
+        magic, version, w, h, fps = MJPEG_HEADER.unpack(self.file.read(MJPEG_HEADER.size))
+        if magic != MJPEG_MAGIC:
+            raise ValueError(f"{filename} is not an MJPEG frame container")
+        if version != MJPEG_VERSION:
+            raise ValueError(f"Unsupported MJPEG container version {version}")
+        self.width, self.height, self.fps = w, h, fps
+
+    def read_payload(self, offset=None):
+        """Return the JPEG bytes of the record at offset (or the next one), None at the end."""
+        if offset is not None:
+            self.file.seek(offset)
+        prefix = self.file.read(MJPEG_LENGTH.size)
+        if len(prefix) < MJPEG_LENGTH.size:
+            return None
+        (length,) = MJPEG_LENGTH.unpack(prefix)
+        data = self.file.read(length)
+        if len(data) < length:
+            # Truncated last record from an interrupted recording
+            return None
+        return data
+
+    def read(self, offset=None, flags=cv2.IMREAD_COLOR):
+        """Decode the record at offset (or the next one), mirroring cv2.VideoCapture.read()."""
+        data = self.read_payload(offset)
+        if data is None:
+            return False, None
+        return True, cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+
+    def __iter__(self):
+        self.file.seek(MJPEG_HEADER.size)
+        while True:
+            data = self.read_payload()
+            if data is None:
+                return
+            yield data
+
+    def release(self):
+        self.file.close()
+
+
+class FrameIndexWriter:
+    """Append one fixed-width record per stored frame."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, 'wb')
+        self.file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, INDEX_RECORD.size))
+        self.count = 0
+
+    def append(self, frame_number, lsl_time, pos_msec, offset=None, keyframe=False):
+        """Record a frame. Without an offset the record is flagged unknown and keyframe is ignored."""
+        if offset is None:
+            offset, flags = -1, INDEX_OFFSET_UNKNOWN
+        else:
+            flags = INDEX_KEYFRAME if keyframe else 0
+        self.file.write(INDEX_RECORD.pack(frame_number, lsl_time, pos_msec, offset, flags))
+        self.count += 1
+        if self.count % INDEX_FLUSH_EVERY == 0:
+            self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class FrameIndex:
+    """Memory-mapped index sidecar. Record N describes stored frame N."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            magic, version, record_size = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{filename} is not a frame index")
+        if version != INDEX_VERSION or record_size != INDEX_RECORD.size:
+            raise ValueError(f"Unsupported frame index version {version}")
+
+        # A trailing partial record from an interrupted recording is ignored
+        count = (os.path.getsize(filename) - INDEX_HEADER.size) // INDEX_RECORD.size
+        if count > 0:
+            self.records = np.memmap(filename, dtype=INDEX_DTYPE, mode='r',
+                                     offset=INDEX_HEADER.size, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=INDEX_DTYPE)
+
+    @classmethod
+    def for_video(cls, video_filename):
+        """Open the sidecar next to video_filename, or return None if there is none."""
+        path = index_path(video_filename)
+        if not os.path.exists(path):
+            return None
+        return cls(path)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, position):
+        return self.records[position]
+
+    def position_of_frame(self, frame_number):
+        """Stored position of an LSL frame number, or None if it was never written."""
+        frames = self.records['frame']
+        pos = int(np.searchsorted(frames, frame_number))
+        if pos < len(frames) and frames[pos] == frame_number:
+            return pos
+        return None
+
+    def position_at_time(self, lsl_time):
+        """Stored position of the frame grabbed closest to lsl_time."""
+        times = self.records['lsl_time']
+        if len(times) == 0:
+            return None
+        pos = int(np.searchsorted(times, lsl_time))
+        if pos == len(times) or (pos > 0 and lsl_time - times[pos - 1] < times[pos] - lsl_time):
+            pos -= 1
+        return pos
+
+    def close(self):
+        self.records = None
+
+
+def transcode(filename, output, fourcc='mp4v'):
+    """Decode a container and re-encode it with cv2.VideoWriter, e.g. for playback tools."""
+    reader = MjpegReader(filename)
+    writer = cv2.VideoWriter(output, cv2.VideoWriter_fourcc(*fourcc), reader.fps,
+                             (reader.width, reader.height))
+    count = 0
+    try:
+        for data in reader:
+            writer.write(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR))
+            count += 1
+    finally:
+        reader.release()
+        writer.release()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert an MJPEG frame container to a regular video file")
+    parser.add_argument('container')
+    parser.add_argument('output', nargs='?')
+    parser.add_argument('--fourcc', default='mp4v')
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.container)[0] + '.mp4'
+    count = transcode(args.container, output, args.fourcc)
+    print(f"Wrote {count} frames to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+from collections import deque
+
+# Software synchronisation of several cameras recorded by camels.py.
+#
+# Frames are grouped by nearest LSL grab time: the oldest pending frame of any
+# camera anchors a group, and every camera contributes its oldest pending frame
+# if that lies within the tolerance of the anchor. A camera with no frame in
+# range is counted as a drop for that group. A group is only decided once every
+# camera has reported a frame past the tolerance window, so late frames are
+# never mistaken for drops.
+MAX_PENDING = 120    # Frames held per camera before groups are forced out
+
+
+class SkewStats:
+    """Running statistics of one camera's offset from the group time."""
+
+    def __init__(self):
+        self.count = 0
+        self.sum_abs = 0.0
+        self.max_abs = 0.0
+        self.missing = 0
+
+    def add(self, skew):
+        self.count += 1
+        self.sum_abs += abs(skew)
+        self.max_abs = max(self.max_abs, abs(skew))
+
+    @property
+    def mean_abs(self):
+        return self.sum_abs / self.count if self.count else 0.0
+
+
+class FrameSynchronizer:
+    """Group frame numbers from several cameras by nearest LSL timestamp.
+
+    on_group(numbers, timestamp) is called for every group with one frame
+    number per camera (-1 where that camera dropped the frame) and the mean
+    grab time of the frames in the group.
+    """
+
+    def __init__(self, cameras, tolerance, on_group=None):
+        self.tolerance = tolerance
+        self.on_group = on_group
+        self.pending = [deque() for _ in range(cameras)]
+        self.latest = [None] * cameras
+        self.finished = [False] * cameras
+        self.stats = [SkewStats() for _ in range(cameras)]
+        self.groups = 0
+
+    def add(self, camera, number, timestamp):
+        self.pending[camera].append((number, timestamp))
+        self.latest[camera] = timestamp
+        self._emit_ready()
+
+    def finish(self, camera):
+        """Mark a camera as done; its missing frames no longer hold groups back."""
+        self.finished[camera] = True
+        self._emit_ready()
+
+    def flush(self):
+        while any(self.pending):
+            self._emit_group()
+
+    def _emit_ready(self):
+        while any(self.pending):
+            anchor = min(p[0][1] for p in self.pending if p)
+            horizon = anchor + self.tolerance
+            decided = all(done or (latest is not None and latest > horizon)
+                          for done, latest in zip(self.finished, self.latest))
+            overfull = any(len(p) > MAX_PENDING for p in self.pending)
+            if not (decided or overfull):
+                return
+            self._emit_group()
+
+    def _emit_group(self):
+        anchor = min(p[0][1] for p in self.pending if p)
+        members = []
+        for pending in self.pending:
+            if pending and pending[0][1] - anchor <= self.tolerance:
+                members.append(pending.popleft())
+            else:
+                members.append(None)
+
+        times = [m[1] for m in members if m is not None]
+        group_time = sum(times) / len(times)
+        for stats, member in zip(self.stats, members):
+            if member is None:
+                stats.missing += 1
+            else:
+                stats.add(member[1] - group_time)
+        self.groups += 1
+
+        if self.on_group is not None:
+            self.on_group([-1 if m is None else m[0] for m in members], group_time)
+
+    def summary(self, names=None):
+        cameras = []
+        for i, stats in enumerate(self.stats):
+            cameras.append({
+                'name': names[i] if names else f"camera {i}",
+                'frames': stats.count,
+                'dropped': stats.missing,
+                'mean_abs_skew_ms': stats.mean_abs * 1000,
+                'max_abs_skew_ms': stats.max_abs * 1000,
+            })
+        return {'groups': self.groups, 'tolerance_ms': self.tolerance * 1000, 'cameras': cameras}
+
+    def report(self, names=None):
+        lines = [f"Synchronized groups: {self.groups}"]
+        for i, stats in enumerate(self.stats):
+            name = names[i] if names else f"camera {i}"
+            lines.append(f"  {name}: dropped {stats.missing}, "
+                         f"mean |skew| {stats.mean_abs * 1000:.2f} ms, "
+                         f"max |skew| {stats.max_abs * 1000:.2f} ms")
+        return "\n".join(lines)
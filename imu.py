@@ -1,83 +1,468 @@
+import os
+import json
 import asyncio
+import argparse
+import struct
+import numpy as np
 from bleak import BleakScanner, BleakClient
-import time
-from pylsl import StreamInfo, StreamOutlet  # Import LSL components
+from pylsl import StreamInfo, StreamOutlet, local_clock  # Import LSL components
+from imu_clock import DeviceClock, CLOCK_CHANNELS
+from imu_fusion import OrientationBank, FUSION_FILTERS
 
 IMU_SERVICE_UUID = "19B10000-E8F2-537E-4F6C-D104768A1214"
 IMU_CHARACTERISTIC_UUID = "19B10001-E8F2-537E-4F6C-D104768A1214"
+IMU_CHANNELS = 6  # 3 accel + 3 gyro
 
-# Global variables for rate calculation and LSL outlet
-sample_count = 0
-start_time = None
-lsl_outlet = None  # LSL outlet for streaming IMU data
+# Binary notification format (all little-endian):
+# - uint8 magic (0xA5), uint8 flags, uint8 sample count, 1 pad byte
+# - uint16 sequence number of the first sample (counts samples, wraps at 65536)
+# - uint32 device time of the first sample in microseconds, if FLAG_DEVICE_TIME is set
+# - sample count x 6 channels as int16 (scaled below) or float32 if FLAG_FLOAT32 is set
+# Anything not starting with the magic byte is parsed as the ASCII CSV format.
+BINARY_MAGIC = 0xA5
+FLAG_FLOAT32 = 0x01
+FLAG_DEVICE_TIME = 0x02
+BINARY_HEADER = struct.Struct('<BBBxH')
+DEVICE_TIME = struct.Struct('<I')
+# int16 full-scale ranges; must match the firmware's sensor configuration
+ACCEL_INT16_SCALE = 2.0 / 32768    # ±2 g
+GYRO_INT16_SCALE = 250.0 / 32768   # ±250 deg/s
+INT16_SCALE = np.array([ACCEL_INT16_SCALE] * 3 + [GYRO_INT16_SCALE] * 3, dtype=np.float32)
 
-def imu_callback(_, data):
-    global sample_count, start_time, lsl_outlet
-    
-    try:
-        # Skip if data is empty
-        if not data:
+# LSL output. Samples are collected into chunks and sent when BATCH_SAMPLES
+# are waiting or the oldest one has waited LATENCY_BUDGET, whichever is first.
+NOMINAL_RATE = 0.0       # Outlet nominal rate in Hz; 0 declares an irregular stream
+LSL_CHUNK_SIZE = 0       # Outlet chunk_size; 0 sends every pushed chunk as it is
+LSL_MAX_BUFFERED = 360   # Seconds the outlet buffers for slow consumers
+BATCH_SAMPLES = 32       # Most samples sent in one push_chunk
+LATENCY_BUDGET = 0.010   # Seconds a sample may wait before its chunk is sent
+
+PRINT_INTERVAL = 0.5     # Seconds between debug prints of the latest sample with --verbose
+REPORT_INTERVAL = 1.0    # Seconds between throughput reports
+SCAN_TIMEOUT = 10.0      # Seconds to scan for devices advertising IMU_SERVICE_UUID
+PACKET_QUEUE_SIZE = 4096 # Notifications waiting for process_packets() before new ones are dropped
+
+# Reconnecting. Addresses of the last devices used are kept in ADDRESS_CACHE so
+# the next run, and every reconnect, can go straight to the device. Only when
+# that fails is the device looked for again, with a growing pause in between.
+ADDRESS_CACHE = os.path.join(os.path.expanduser('~'), '.imu_devices.json')
+CONNECT_TIMEOUT = 5.0        # Seconds for one connection attempt
+RECONNECT_BACKOFF = 0.5      # Pause before the first scan after a failed reconnect
+RECONNECT_BACKOFF_MAX = 8.0  # Longest pause between attempts
+
+def decode_packet(data):
+    """Decode one notification into (samples, seq, device_time).
+
+    samples is an (N, 6) float32 array. seq and device_time are None for ASCII
+    packets and for binary packets that don't carry them.
+    """
+    if data[0] != BINARY_MAGIC:
+        # Legacy ASCII CSV: one sample per notification
+        values = [float(x) for x in bytes(data).decode().split(',')]
+        if len(values) < IMU_CHANNELS:
+            raise ValueError("Received data with insufficient channels.")
+        return np.array([values[:IMU_CHANNELS]], dtype=np.float32), None, None
+
+    _, flags, count, seq = BINARY_HEADER.unpack_from(data)
+    offset = BINARY_HEADER.size
+    device_time = None
+    if flags & FLAG_DEVICE_TIME:
+        (device_time,) = DEVICE_TIME.unpack_from(data, offset)
+        offset += DEVICE_TIME.size
+    dtype = np.dtype('<f4') if flags & FLAG_FLOAT32 else np.dtype('<i2')
+    expected = offset + count * IMU_CHANNELS * dtype.itemsize
+    if len(data) < expected:
+        raise ValueError(f"Truncated packet: {len(data)} of {expected} bytes")
+    samples = np.frombuffer(data, dtype=dtype, count=count * IMU_CHANNELS, offset=offset)
+    samples = samples.reshape(count, IMU_CHANNELS).astype(np.float32)
+    if not flags & FLAG_FLOAT32:
+        samples *= INT16_SCALE
+    return samples, seq, device_time
+
+def encode_packet(samples, seq, device_time=None, float32=False):
+    """Build a binary notification; the reference for the firmware side of the format."""
+    samples = np.asarray(samples, dtype=np.float32).reshape(-1, IMU_CHANNELS)
+    flags = (FLAG_FLOAT32 if float32 else 0) | (FLAG_DEVICE_TIME if device_time is not None else 0)
+    packet = bytearray(BINARY_HEADER.pack(BINARY_MAGIC, flags, len(samples), seq & 0xFFFF))
+    if device_time is not None:
+        packet += DEVICE_TIME.pack(int(device_time) & 0xFFFFFFFF)
+    if float32:
+        packet += samples.astype('<f4').tobytes()
+    else:
+        scaled = np.clip(np.round(samples / INT16_SCALE), -32768, 32767)
+        packet += scaled.astype('<i2').tobytes()
+    return bytes(packet)
+
+class SampleBatcher:
+    """Collect samples and their timestamps into chunks for one LSL outlet.
+
+    add() is called from the packet processing task and flush_loop() runs as a
+    task on the same event loop, so no locking is needed.
+    """
+
+    def __init__(self, outlet, max_samples=BATCH_SAMPLES, latency_budget=LATENCY_BUDGET):
+        self.outlet = outlet
+        self.latency_budget = latency_budget
+        self.samples = np.empty((max_samples, IMU_CHANNELS), dtype=np.float32)
+        self.timestamps = np.empty(max_samples)
+        self.count = 0
+        self.oldest = None   # local_clock() when the first waiting sample arrived
+        self.chunks = 0
+
+    def add(self, samples, timestamps):
+        start = 0
+        while start < len(samples):
+            n = min(len(samples) - start, len(self.samples) - self.count)
+            if self.count == 0:
+                self.oldest = local_clock()
+            self.samples[self.count:self.count + n] = samples[start:start + n]
+            self.timestamps[self.count:self.count + n] = timestamps[start:start + n]
+            self.count += n
+            start += n
+            if self.count == len(self.samples):
+                self.flush()
+
+    def flush(self):
+        if not self.count:
             return
+        if self.count == 1:
+            self.outlet.push_sample(self.samples[0], self.timestamps[0])
+        else:
+            self.outlet.push_chunk(self.samples[:self.count], self.timestamps[:self.count].tolist())
+        self.count = 0
+        self.oldest = None
+        self.chunks += 1
+
+    async def flush_loop(self):
+        """Send partial chunks once their oldest sample is over the latency budget."""
+        while True:
+            wait = self.latency_budget
+            if self.count:
+                wait = self.oldest + self.latency_budget - local_clock()
+                if wait <= 0:
+                    self.flush()
+                    wait = self.latency_budget
+            await asyncio.sleep(wait)
+
+def sample_timestamps(count, receive_time, rate):
+    """Timestamps for a packet of samples, the last one taken at receive_time."""
+    if rate > 0:
+        return receive_time - np.arange(count - 1, -1, -1) / rate
+    return np.full(count, receive_time)
+
+def source_id_for(address):
+    """Stable LSL source id for a device, from its BLE address (or CoreBluetooth UUID)."""
+    return 'imu-' + ''.join(c for c in address.lower() if c.isalnum())
+
+class ImuDevice:
+    """One connected IMU: its notification queue, LSL outlet and counters."""
+
+    def __init__(self, target, name, stream_name, args, markers,
+                 scanner=BleakScanner, client=BleakClient, fusion=None):
+        self.target = target   # A BLEDevice from a scan, or just the cached address
+        self.scanner = scanner
+        self.client = client
+        self.address = getattr(target, 'address', target)
+        self.name = name or self.address
+        self.label = stream_name   # Device names repeat, stream names don't
+        self.rate = args.rate
+        self.verbose = args.verbose
+        self.scan_timeout = args.scan_timeout
+        self.markers = markers
+        info = StreamInfo(stream_name, 'IMU', IMU_CHANNELS, args.rate, 'float32',
+                          source_id_for(self.address))
+        info.desc().append_child_value("address", self.address)
+        self.outlet = StreamOutlet(info, args.chunk_size, args.max_buffered)
+        # Device-to-LSL clock fit, published once per REPORT_INTERVAL next to the data
+        self.clock = DeviceClock(args.rate)
+        clock_info = StreamInfo(f"{stream_name}_Clock", 'IMU_Clock', len(CLOCK_CHANNELS),
+                                1.0 / REPORT_INTERVAL, 'double64', source_id_for(self.address) + '-clock')
+        channels = clock_info.desc().append_child("channels")
+        for label in CLOCK_CHANNELS:
+            channels.append_child("channel").append_child_value("label", label)
+        self.clock_outlet = StreamOutlet(clock_info)
+        # Optional orientation stream, fused together with the other devices
+        self.fusion = fusion
+        if fusion is not None:
+            self.fusion_index = fusion.add_device(stream_name, source_id_for(self.address), args.rate)
+        self.batcher = SampleBatcher(self.outlet, args.batch_samples, args.latency_ms / 1000)
+        # (receive time, raw bytes) of every notification, for process_packets()
+        self.packets = asyncio.Queue(PACKET_QUEUE_SIZE)
+        self.disconnected = asyncio.Event()
+        self.samples = 0
+        self.packet_count = 0
+        self.lost_samples = 0
+        self.dropped_packets = 0     # Notifications that found the queue full
+        self.failed_packets = 0      # Notifications that raised while being processed
+        self.resync = False          # Set on reconnect: don't count the gap as lost samples
+        self.first_connect = None
+        self.disconnect_time = None
+        self.outage_start = None
+        self.outages = []            # Seconds from each disconnect to resubscribing
+
+    def on_notify(self, _, data):
+        # Runs on the BLE event loop for every notification: only timestamp and queue
+        # the raw bytes here, process_packets() does the rest
+        if data:
+            try:
+                self.packets.put_nowait((local_clock(), bytes(data)))
+            except asyncio.QueueFull:
+                # Binary packets that are dropped here show up as lost samples too
+                self.dropped_packets += 1
+
+    def on_disconnect(self, client):
+        self.disconnect_time = local_clock()
+        self.disconnected.set()
+
+    def marker(self, text, timestamp):
+        self.markers.push_sample([f"{text} {self.label}"], timestamp)
+
+    def link_up(self):
+        now = local_clock()
+        if self.first_connect is None:
+            self.first_connect = now
+            print(f"{self.label}: connected to {self.name} ({self.address})")
+        if self.outage_start is not None:
+            duration = now - self.outage_start
+            self.outages.append(duration)
+            self.marker(f"gap_end duration={duration:.3f}", now)
+            print(f"{self.label}: reconnected after {duration:.2f} s")
+            self.outage_start = None
+            self.resync = True
+
+    def link_down(self):
+        if self.first_connect is None or self.outage_start is not None:
+            return
+        self.outage_start = self.disconnect_time or local_clock()
+        self.marker("gap_start", self.outage_start)
+        print(f"{self.label} disconnected, reconnecting")
+
+    def report(self):
+        """One line on outages for the end of the session."""
+        if self.first_connect is None:
+            return f"{self.label}: never connected"
+        lost = sum(self.outages)
+        if self.outage_start is not None:
+            lost += local_clock() - self.outage_start
+        session = local_clock() - self.first_connect
+        line = f"{self.label}: {len(self.outages)} reconnects"
+        if self.outages:
+            line += (f", latency mean {sum(self.outages) / len(self.outages):.2f} s "
+                     f"max {max(self.outages):.2f} s")
+        line += f", {lost:.1f} s lost of {session:.1f} s"
+        if self.dropped_packets or self.failed_packets:
+            line += f", {self.dropped_packets} packets dropped, {self.failed_packets} failed"
+        return line
 
-        # Parse the IMU data (expected 6 channels: 3 accel and 3 gyro)
-        values = [float(x) for x in data.decode().split(',')]
-        if len(values) < 6:
-            print("Received data with insufficient channels.")
+    async def process_packets(self):
+        """Decode queued notifications, count losses and feed the batcher."""
+        next_seq = None    # Sequence number expected in the next binary packet
+        last_print = 0.0
+        while True:
+            receive_time, data = await self.packets.get()
+            if self.resync:
+                next_seq = None
+                self.resync = False
+            try:
+                # Parse the IMU data (expected 6 channels: 3 accel and 3 gyro)
+                samples, seq, device_time = decode_packet(data)
+                if not len(samples):
+                    # A binary packet may carry no samples; there is nothing to publish
+                    continue
+
+                # Count samples lost between binary packets
+                if seq is not None:
+                    if next_seq is not None and seq != next_seq:
+                        missed = (seq - next_seq) & 0xFFFF
+                        self.lost_samples += missed
+                        print(f"{self.label}: lost {missed} samples (total {self.lost_samples})")
+                    next_seq = (seq + len(samples)) & 0xFFFF
+
+                # Timestamps from the device clock when the packet has one, else from the receive time
+                timestamps = self.clock.timestamps(len(samples), seq, device_time, receive_time)
+                if timestamps is None:
+                    timestamps = sample_timestamps(len(samples), receive_time, self.rate)
+                self.batcher.add(samples, timestamps)
+                if self.fusion is not None:
+                    self.fusion.add(self.fusion_index, samples, timestamps)
+                self.samples += len(samples)
+                self.packet_count += 1
+
+                # Print the latest sample for debugging, at most every PRINT_INTERVAL
+                if self.verbose and receive_time - last_print >= PRINT_INTERVAL:
+                    print(f"{self.label} Accel (x,y,z): {samples[-1, 0:3]}")
+                    print(f"{self.label} Gyro (x,y,z): {samples[-1, 3:6]}")
+                    last_print = receive_time
+            except Exception as e:
+                # One bad packet must not end the task and silently stop the stream
+                self.failed_packets += 1
+                print(f"{self.label}: error processing packet ({self.failed_packets} failed): {e}")
+
+    async def stream(self):
+        """Connect, subscribe and publish, reconnecting whenever the link drops.
+
+        The connection loop runs next to the packet processing and chunk flushing
+        tasks; if any of them fails the device is stopped instead of staying
+        connected with nothing reaching its outlet.
+        """
+        tasks = [asyncio.create_task(self.connect_loop()),
+                 asyncio.create_task(self.batcher.flush_loop()),
+                 asyncio.create_task(self.process_packets())]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception as e:
+            print(f"{self.label}: stopped after an error: {e!r}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.batcher.flush()
+
+    async def connect_loop(self):
+        failures = 0
+        while True:
+            if failures:
+                # Going straight to the address failed: back off, then look for the device
+                await asyncio.sleep(min(RECONNECT_BACKOFF * 2 ** (failures - 1), RECONNECT_BACKOFF_MAX))
+                found = await self.scanner.find_device_by_address(self.address, timeout=self.scan_timeout)
+                if found is None:
+                    print(f"{self.label}: {self.address} not found")
+                    failures += 1
+                    continue
+                self.target = found
+            self.disconnected.clear()
+            try:
+                async with self.client(self.target, disconnected_callback=self.on_disconnect,
+                                       timeout=CONNECT_TIMEOUT) as client:
+                    await client.start_notify(IMU_CHARACTERISTIC_UUID, self.on_notify)
+                    self.link_up()
+                    failures = 0
+                    await self.disconnected.wait()
+            except Exception as e:
+                print(f"{self.label}: {e}")
+                failures += 1
+            self.link_down()
+
+async def find_imus(count, timeout=SCAN_TIMEOUT, scanner=BleakScanner):
+    """Scan for devices advertising IMU_SERVICE_UUID.
+
+    Stops as soon as count devices are seen (0 = keep scanning for the whole
+    timeout) instead of always waiting out a full discovery.
+    """
+    found = {}
+    enough = asyncio.Event()
+
+    def on_advertisement(device, advertisement):
+        # Not every backend applies the service filter, so check again
+        uuids = [u.lower() for u in advertisement.service_uuids]
+        if IMU_SERVICE_UUID.lower() in uuids and device.address not in found:
+            found[device.address] = device
+            print(f"Found {device.name} ({device.address})")
+            if count and len(found) >= count:
+                enough.set()
+
+    async with scanner(on_advertisement, service_uuids=[IMU_SERVICE_UUID]):
+        try:
+            await asyncio.wait_for(enough.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    return list(found.values())
+
+def load_address_cache():
+    """[(address, name), ...] of the devices used last time, or [] if there are none."""
+    try:
+        with open(ADDRESS_CACHE) as f:
+            return [(d['address'], d.get('name')) for d in json.load(f)]
+    except (OSError, ValueError, KeyError, TypeError):
+        return []
+
+def save_address_cache(targets):
+    try:
+        with open(ADDRESS_CACHE, 'w') as f:
+            json.dump([{'address': a, 'name': n} for a, n in targets], f, indent=2)
+    except OSError as e:
+        print(f"Could not save {ADDRESS_CACHE}: {e}")
+
+async def report_loop(devices):
+    """Print per-device and aggregate throughput every REPORT_INTERVAL."""
+    last = [(d.samples, d.packet_count) for d in devices]
+    last_time = local_clock()
+    while True:
+        await asyncio.sleep(REPORT_INTERVAL)
+        now = local_clock()
+        elapsed = now - last_time
+        total_rate = 0.0
+        for i, device in enumerate(devices):
+            samples, packets = last[i]
+            rate = (device.samples - samples) / elapsed
+            total_rate += rate
+            clock = device.clock.metadata()
+            device.clock_outlet.push_sample(clock)
+            print(f"{device.label}: {rate:.2f} Hz, {(device.packet_count - packets) / elapsed:.1f} packets/s, "
+                  f"lost {device.lost_samples}, {device.packets.qsize()} packets waiting, "
+                  f"{device.dropped_packets} dropped, {device.failed_packets} failed, "
+                  f"drift {clock[0]:.1f} ppm, jitter {clock[1]:.2f} ms")
+            last[i] = (device.samples, device.packet_count)
+        if len(devices) > 1:
+            print(f"All {len(devices)} IMUs: {total_rate:.2f} Hz")
+        last_time = now
+
+async def main(args):
+    scanner, client = BleakScanner, BleakClient
+    if args.simulate is not None:
+        import imu_sim
+        imu_sim.configure(**imu_sim.parse_spec(args.simulate))
+        scanner, client = imu_sim.SimScanner, imu_sim.SimClient
+
+    # Use the devices from last time if there are enough of them, or scan for
+    # devices advertising the IMU service
+    use_cache = args.simulate is None
+    targets = load_address_cache() if use_cache and args.devices and not args.rescan else []
+    if len(targets) >= args.devices > 0:
+        targets = targets[:args.devices]
+        print("Using cached devices: " + ", ".join(address for address, _ in targets))
+    else:
+        ble_devices = await find_imus(args.devices, args.scan_timeout, scanner)
+        if not ble_devices:
+            print("No IMU found")
             return
+        if args.devices:
+            ble_devices = ble_devices[:args.devices]
+        if use_cache:
+            save_address_cache([(d.address, d.name) for d in ble_devices])
+        targets = [(d, d.name) for d in ble_devices]
+
+    # Connection gaps of every device are marked on one string stream
+    marker_info = StreamInfo('IMU_Markers', 'Markers', 1, 0, 'string', 'imu-markers')
+    markers = StreamOutlet(marker_info)
 
-        # Print the channels for debugging
-        print(f"Accel (x,y,z): {values[0:3]}")
-        print(f"Gyro (x,y,z): {values[3:6]}")
-
-        # Push the parsed sample to the LSL stream
-        if lsl_outlet:
-            lsl_outlet.push_sample(values)
-        
-        # Rate calculation: initialize start time on the first callback
-        if start_time is None:
-            start_time = time.time()
-        
-        # Count this sample
-        sample_count += 1
-        
-        # Calculate and print sample rate every second
-        current_time = time.time()
-        elapsed_time = current_time - start_time
-        if elapsed_time >= 1.0:
-            rate = sample_count / elapsed_time
-            print(f"IMU Sample Rate: {rate:.2f} Hz")
-            # Reset counter and start time for the next interval
-            sample_count = 0
-            start_time = current_time
-            
-    except Exception as e:
-        print(f"Error in callback: {e}")
-
-async def main():
-    global lsl_outlet
-    # Create LSL stream info and outlet:
-    # - Stream name: IMU_Stream
+    # One LSL outlet per device:
+    # - Stream name: IMU_Stream, or IMU_Stream_<address suffix> with several devices
     # - Type: IMU
     # - 6 channels
-    # - Sampling rate 0 (irregular)
+    # - Sampling rate from --rate (0 = irregular)
     # - Data type: float32
-    # - A unique source id (here 'imu12345')
-    info = StreamInfo('IMU_Stream', 'IMU', 6, 0, 'float32', 'imu12345')
-    lsl_outlet = StreamOutlet(info)
-    print("LSL stream created")
+    # - Source id derived from the device address, so it survives restarts
+    fusion = OrientationBank(args.orientation) if args.orientation else None
+    devices = []
+    for target, name in targets:
+        address = getattr(target, 'address', target)
+        stream_name = 'IMU_Stream'
+        if len(targets) > 1:
+            stream_name += '_' + source_id_for(address)[-6:]
+        devices.append(ImuDevice(target, name, stream_name, args, markers, scanner, client, fusion))
+        print(f"LSL stream {stream_name} created for {name} ({address})")
 
-    # Discover BLE devices and connect to the Arduino
-    devices = await BleakScanner.discover()
-    for d in devices:
-        if d.name == "Arduino":
-            print(f"Found {d.name}")
-            async with BleakClient(d.address) as client:
-                print("Connected!")
-                await client.start_notify(IMU_CHARACTERISTIC_UUID, imu_callback)
-                # Wait indefinitely (or until disconnect / keyboard interrupt)
-                await asyncio.get_event_loop().create_future()
-    else:
-        print("Arduino not found")
+    background = [asyncio.create_task(report_loop(devices))]
+    if fusion is not None:
+        background.append(asyncio.create_task(fusion.run_loop()))
+    try:
+        # Connect to every device at once; each one reconnects on its own
+        await asyncio.gather(*(device.stream() for device in devices))
+    finally:
+        for task in background:
+            task.cancel()
+        for device in devices:
+            print(device.report())
 
 async def scan_devices():
     print("Scanning for BLE devices...")
@@ -90,5 +475,34 @@ async def scan_devices():
         print(f"Details: {d}")
         print("-" * 50)
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a BLE IMU to LSL")
+    parser.add_argument('--rate', type=float, default=NOMINAL_RATE,
+                        help="nominal sampling rate in Hz (0 = irregular)")
+    parser.add_argument('--chunk-size', type=int, default=LSL_CHUNK_SIZE,
+                        help="LSL outlet chunk size in samples (0 = as pushed)")
+    parser.add_argument('--max-buffered', type=int, default=LSL_MAX_BUFFERED,
+                        help="seconds of data the LSL outlet buffers")
+    parser.add_argument('--batch-samples', type=int, default=BATCH_SAMPLES,
+                        help="most samples sent in one chunk")
+    parser.add_argument('--latency-ms', type=float, default=LATENCY_BUDGET * 1000,
+                        help="longest a sample waits before its chunk is sent")
+    parser.add_argument('--devices', type=int, default=1,
+                        help="number of IMUs to connect (0 = every one found while scanning)")
+    parser.add_argument('--scan-timeout', type=float, default=SCAN_TIMEOUT,
+                        help="seconds to scan for IMUs")
+    parser.add_argument('--rescan', action='store_true',
+                        help=f"scan for IMUs instead of using the ones in {ADDRESS_CACHE}")
+    parser.add_argument('--orientation', choices=FUSION_FILTERS,
+                        help="also publish orientation (quaternion and Euler angles) from this filter")
+    parser.add_argument('--simulate', metavar='SPEC', nargs='?', const='',
+                        help="use simulated IMUs, e.g. devices=2,rate=1000,burst=8,loss=0.01 (see imu_sim.py)")
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help="print the latest sample a few times per second")
+    return parser.parse_args(argv)
+
 if __name__ == '__main__':
-    asyncio.run(main())
+    try:
+        asyncio.run(main(parse_args()))
+    except KeyboardInterrupt:
+        pass
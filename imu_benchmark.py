@@ -0,0 +1,158 @@
+import io
+import gc
+import time
+import asyncio
+import argparse
+import threading
+import contextlib
+import numpy as np
+from pylsl import StreamInlet, resolve_byprop, local_clock
+import imu
+import imu_sim
+
+# Load test for the imu.py pipeline.
+#
+# Simulated devices (imu_sim.py) feed the real notification callback, packet
+# processing, batching and LSL outlets at each rate in turn, while an inlet per
+# device pulls the stream back. The simulator writes the sample index into the
+# first channel, so every received sample can be matched with the time it was
+# taken. CPU time covers the whole process, simulator and inlets included.
+BENCHMARK_RATES = [100, 500, 1000, 2000, 5000]
+BENCHMARK_SECONDS = 10
+PACKETS_PER_SECOND = 100    # Notification rate the default burst size aims for
+DRAIN_SECONDS = 0.5         # Time the inlets keep pulling after the pipeline stops
+POLL_INTERVAL = 0.001       # Inlet sleep when nothing has arrived
+
+
+class Collector(threading.Thread):
+    """Pull one IMU stream and keep the sample indices, timestamps and pull times."""
+
+    def __init__(self, info):
+        super().__init__(name=f"collect-{info.source_id()}", daemon=True)
+        self.source_id = info.source_id()
+        self.inlet = StreamInlet(info, max_buflen=60)
+        self.stop_event = threading.Event()
+        self.chunks = []
+
+    def run(self):
+        self.inlet.open_stream()
+        while not self.stop_event.is_set():
+            # A pull with a timeout waits for a full chunk, so poll instead
+            data, timestamps = self.inlet.pull_chunk(timeout=0.0)
+            if timestamps:
+                self.chunks.append((np.array(data)[:, 0], np.array(timestamps), local_clock()))
+            else:
+                time.sleep(POLL_INTERVAL)
+
+    def results(self):
+        if not self.chunks:
+            return np.empty(0), np.empty(0), np.empty(0)
+        indices = np.concatenate([c[0] for c in self.chunks]).astype(np.int64)
+        stamps = np.concatenate([c[1] for c in self.chunks])
+        pulled = np.concatenate([np.full(len(c[0]), c[2]) for c in self.chunks])
+        return indices, stamps, pulled
+
+
+async def run_rate(rate, args):
+    burst = args.burst or max(1, round(rate / PACKETS_PER_SECOND))
+    spec = (f"devices={args.devices},rate={rate},burst={burst},loss={args.loss},"
+            f"jitter={args.jitter},format=float,counter=1")
+    imu_args = imu.parse_args(['--simulate', spec, '--rate', str(rate),
+                               '--devices', str(args.devices), '--scan-timeout', '1'])
+    # imu.main() configures the simulator the same way; do it here to know the devices
+    imu_sim.configure(**imu_sim.parse_spec(spec))
+    sources = [imu.source_id_for(d.address) for d in imu_sim.devices]
+
+    log = io.StringIO()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        pipeline = asyncio.create_task(imu.main(imu_args))
+        # Wait for the outlets, then attach an inlet to each
+        infos = []
+        while len(infos) < len(sources) and not pipeline.done():
+            found = await asyncio.to_thread(resolve_byprop, 'type', 'IMU', 0, 0.5)
+            infos = [i for i in found if i.source_id() in sources]
+        collectors = [Collector(info) for info in infos]
+        for c in collectors:
+            c.start()
+        await asyncio.sleep(args.seconds)
+        pipeline.cancel()
+        try:
+            await pipeline
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(DRAIN_SECONDS)
+        for c in collectors:
+            c.stop_event.set()
+            c.join()
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    generated = lost = expected = received = 0
+    latencies, stamp_errors = [], []
+    for c in collectors:
+        address = next(d.address for d in imu_sim.devices if imu.source_id_for(d.address) == c.source_id)
+        sim = imu_sim.stats[address]
+        generated += sim.generated
+        lost += sim.lost
+        indices, stamps, pulled = c.results()
+        received += len(np.unique(indices))
+        # Samples sent before the inlet connected never had a chance to arrive
+        if len(indices):
+            expected += burst * sum(1 for first in sim.sent_packets if first >= indices.min())
+        taken = sim.epoch + indices / rate
+        latencies.append(pulled - taken)
+        stamp_errors.append(stamps - taken)
+    latencies = np.concatenate(latencies) * 1000 if latencies else np.zeros(1)
+    stamp_errors = np.concatenate(stamp_errors) * 1000 if stamp_errors else np.zeros(1)
+    gc.collect()    # Drop this run's outlets before the next one resolves streams
+    return {
+        'rate': rate,
+        'burst': burst,
+        'generated': generated,
+        'link_lost': lost,
+        'pipeline_dropped': max(expected - received, 0),
+        'latency_p50_ms': np.percentile(latencies, 50),
+        'latency_p95_ms': np.percentile(latencies, 95),
+        'latency_p99_ms': np.percentile(latencies, 99),
+        'stamp_error_mean_ms': stamp_errors.mean(),
+        'stamp_error_std_ms': stamp_errors.std(),
+        'cpu_percent': 100 * cpu / wall,
+    }
+
+
+async def benchmark(args):
+    results = []
+    for rate in args.rates:
+        print(f"--- {rate} Hz x {args.devices} ---")
+        results.append(await run_rate(rate, args))
+
+    print()
+    print(f"{'rate':>6}{'burst':>6}{'samples':>9}{'link lost':>10}{'dropped':>9}{'p50 ms':>8}"
+          f"{'p95 ms':>8}{'p99 ms':>8}{'stamp err':>10}{'stamp sd':>9}{'cpu %':>7}")
+    for r in results:
+        print(f"{r['rate']:>6}{r['burst']:>6}{r['generated']:>9}{r['link_lost']:>10}"
+              f"{r['pipeline_dropped']:>9}{r['latency_p50_ms']:>8.1f}{r['latency_p95_ms']:>8.1f}"
+              f"{r['latency_p99_ms']:>8.1f}{r['stamp_error_mean_ms']:>10.2f}"
+              f"{r['stamp_error_std_ms']:>9.2f}{r['cpu_percent']:>7.1f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load-test the IMU to LSL pipeline with simulated devices")
+    parser.add_argument('--rates', type=int, nargs='+', default=BENCHMARK_RATES,
+                        help="sampling rates to test, in Hz")
+    parser.add_argument('--seconds', type=float, default=BENCHMARK_SECONDS,
+                        help="duration of each run")
+    parser.add_argument('--devices', type=int, default=1,
+                        help="simulated devices streaming at once")
+    parser.add_argument('--burst', type=int, default=0,
+                        help=f"samples per notification (0 = rate / {PACKETS_PER_SECOND})")
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help="fraction of notifications lost on the simulated link")
+    parser.add_argument('--jitter', type=float, default=0.005,
+                        help="mean extra notification delay in seconds")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(benchmark(parse_args()))
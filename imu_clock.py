@@ -0,0 +1,149 @@
+import math
+import numpy as np
+
+# Device-clock timestamps for imu.py.
+#
+# A notification reaches us tens of ms after its samples were taken, batched by
+# the BLE connection interval and delayed by the scheduler, so receive times
+# come in clumps. When packets carry a sample counter or a device timestamp,
+# device time is mapped to LSL time with a linear model (offset + drift) fitted
+# by recursive least squares. The forgetting factor makes it behave like a
+# sliding window of about CLOCK_WINDOW packets, so slow drift is followed but
+# single late packets barely move it. Samples then get the model's time for
+# their device time, which is smooth and kept strictly increasing.
+CLOCK_WINDOW = 2000       # Packets the fit effectively remembers
+CLOCK_WARMUP = 20         # Packets before the fit is trusted; receive times are used until then
+CLOCK_RESET = 1.0         # Seconds of residual that mean the device restarted
+SEQ_MODULUS = 1 << 16     # The sample counter is a uint16
+TIME_MODULUS = 1 << 32    # Device time is a uint32 in microseconds
+CLOCK_CHANNELS = ['drift_ppm', 'jitter_ms', 'offset_ms']
+
+
+def unwrap(raw, modulus, predicted):
+    """The value congruent to raw modulo modulus that is closest to predicted."""
+    return raw + modulus * round((predicted - raw) / modulus)
+
+
+class ClockModel:
+    """Exponentially weighted RLS fit of y = offset + slope * x."""
+
+    def __init__(self, window=CLOCK_WINDOW):
+        self.forget = 1.0 - 1.0 / window
+        self.reset()
+
+    def reset(self):
+        # theta is (offset at x_ref, slope). x_ref follows the latest point, which
+        # keeps the regressor small and the covariance well conditioned
+        self.theta = np.array([0.0, 1.0])
+        self.P = np.diag([1e6, 1e-2])
+        self.x_ref = None
+        self.updates = 0
+        self.residual_var = 0.0
+
+    def update(self, x, y):
+        if self.x_ref is None:
+            self.x_ref = x
+            self.theta[0] = y
+        shift = np.array([[1.0, x - self.x_ref], [0.0, 1.0]])
+        self.theta = shift @ self.theta
+        self.P = shift @ self.P @ shift.T
+        self.x_ref = x
+        error = y - self.theta[0]
+        gain = self.P[:, 0] / (self.forget + self.P[0, 0])
+        self.theta = self.theta + gain * error
+        self.P = (self.P - np.outer(gain, self.P[0])) / self.forget
+        self.updates += 1
+        if self.updates > 1:
+            self.residual_var += (error * error - self.residual_var) * (1.0 - self.forget)
+        return error
+
+    def map(self, x):
+        return self.theta[0] + self.theta[1] * (np.asarray(x) - self.x_ref)
+
+    @property
+    def drift_ppm(self):
+        return (self.theta[1] - 1.0) * 1e6
+
+    @property
+    def jitter(self):
+        return math.sqrt(self.residual_var)
+
+
+class DeviceClock:
+    """Turn the sequence numbers and device times of one IMU's packets into LSL timestamps.
+
+    rate is the device's nominal sampling rate (0 if unknown). With only a
+    sequence counter the rate is needed to convert samples to seconds; with
+    device timestamps the sample period is measured when it isn't given.
+    """
+
+    def __init__(self, rate=0.0, window=CLOCK_WINDOW):
+        self.rate = rate
+        self.model = ClockModel(window)
+        self.period = 1.0 / rate if rate > 0 else 0.0
+        self.last_seq = None        # Unwrapped sequence number of the last packet
+        self.last_time = None       # Unwrapped device time (µs) of the last packet
+        self.last_receive = None
+        self.last_timestamp = -math.inf
+        self.last_device_seconds = None
+
+    def timestamps(self, count, seq, device_time, receive_time):
+        """LSL timestamps for a packet of count samples, or None without a device clock."""
+        if count == 0:
+            # Nothing to stamp, and nothing to learn about the clock from
+            return np.empty(0)
+        first = self._device_seconds(seq, device_time, receive_time)
+        self.last_receive = receive_time
+        if first is None:
+            return None
+        device_times = first + np.arange(count) * self.period
+        self.last_device_seconds = device_times[-1]
+
+        error = self.model.update(device_times[-1], receive_time)
+        if abs(error) > CLOCK_RESET and self.model.updates > CLOCK_WARMUP:
+            print(f"Device clock jumped by {error:.3f} s, refitting")
+            self.model.reset()
+            self.model.update(device_times[-1], receive_time)
+        if self.model.updates <= CLOCK_WARMUP:
+            stamps = receive_time - (device_times[-1] - device_times)
+        else:
+            stamps = self.model.map(device_times)
+
+        # Never go backwards, whatever the fit does
+        if stamps[0] <= self.last_timestamp:
+            stamps = np.maximum(stamps, self.last_timestamp + 1e-6)
+        stamps = np.maximum.accumulate(stamps)
+        self.last_timestamp = stamps[-1]
+        return stamps
+
+    def _device_seconds(self, seq, device_time, receive_time):
+        """Device time of the packet's first sample in seconds, or None."""
+        elapsed = receive_time - self.last_receive if self.last_receive is not None else 0.0
+        if seq is not None:
+            if self.last_seq is not None:
+                predicted = self.last_seq + elapsed * (self.rate or (1.0 / self.period if self.period else 0.0))
+                seq = unwrap(seq, SEQ_MODULUS, predicted)
+        if device_time is not None:
+            if self.last_time is not None:
+                device_time = unwrap(device_time, TIME_MODULUS, self.last_time + elapsed * 1e6)
+            if not self.rate and seq is not None and self.last_seq is not None and seq > self.last_seq:
+                # Measure the sample period from the device's own clock
+                period = (device_time - self.last_time) * 1e-6 / (seq - self.last_seq)
+                self.period = period if not self.period else self.period + (period - self.period) * 0.05
+            self.last_time = device_time
+        if seq is not None:
+            self.last_seq = seq
+
+        if device_time is not None:
+            return device_time * 1e-6
+        if seq is not None and self.rate > 0:
+            return seq / self.rate
+        return None
+
+    def metadata(self):
+        """One sample per CLOCK_CHANNELS describing the current fit."""
+        if self.model.updates <= CLOCK_WARMUP:
+            return [0.0, 0.0, 0.0]
+        x = self.last_device_seconds
+        offset = self.model.map(x) - x
+        return [self.model.drift_ppm, self.model.jitter * 1000, offset * 1000]
@@ -0,0 +1,230 @@
+import math
+import asyncio
+import threading
+import numpy as np
+from pylsl import StreamInfo, StreamOutlet
+
+# Orientation estimation for imu.py.
+#
+# Madgwick's gradient-descent filter and Mahony's complementary filter for
+# 6-axis IMUs (accel in g, gyro in deg/s), run for every device at once: the
+# state is one quaternion per device and each step updates all of them with
+# NumPy. Decoded chunks are queued per device and fused together every
+# FUSION_INTERVAL, shorter chunks simply sitting out the last steps. The passes
+# run on a worker thread so the BLE event loop never waits on them. Results go
+# to one orientation stream per device with the same timestamps as the data.
+FUSION_INTERVAL = 0.010      # Seconds between fusion passes
+FUSION_MAX_DT = 0.1          # Longest step integrated, so reconnect gaps don't spin the estimate
+MADGWICK_BETA = 0.1          # Madgwick gain (rad/s of gyro error corrected)
+MAHONY_KP = 1.0              # Mahony proportional gain
+MAHONY_KI = 0.0              # Mahony integral gain (gyro bias estimation)
+FUSION_FILTERS = ('madgwick', 'mahony')
+ORIENTATION_CHANNELS = ['qw', 'qx', 'qy', 'qz', 'roll', 'pitch', 'yaw']
+
+
+def quaternion_to_euler(q):
+    """Roll, pitch and yaw in degrees from (..., 4) quaternions [w, x, y, z]."""
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    roll = np.arctan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+    pitch = np.arcsin(np.clip(2 * (w * y - z * x), -1.0, 1.0))
+    yaw = np.arctan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+    return np.degrees(np.stack([roll, pitch, yaw], axis=-1))
+
+
+def _normalize(v):
+    norm = np.linalg.norm(v, axis=-1, keepdims=True)
+    return np.divide(v, norm, out=np.zeros_like(v), where=norm > 0)
+
+
+# The filters below take the state as (4, D) and the inputs as (L, 3, D) for L
+# steps of D devices, and work on the components as (D,) arrays: per step that
+# is a few dozen small NumPy operations whatever the number of devices. With a
+# single device the same arithmetic runs on Python floats, which is several
+# times faster than NumPy on one-element arrays.
+
+def _components(q, accel, gyro, dt):
+    """The filter inputs as (D,) arrays per step, or as floats when D is 1, and the math to match."""
+    if q.shape[1] == 1:
+        return (q[:, 0].tolist(), accel[:, :, 0].tolist(), gyro[:, :, 0].tolist(), dt[:, 0].tolist(),
+                math.sqrt, max)
+    return q, accel, gyro, dt, np.sqrt, np.maximum
+
+
+def _stack_steps(steps, shape):
+    # (L, 4, D) from the per-step (w, x, y, z), whether floats or (D,) arrays
+    return np.array(steps, dtype=np.float64).reshape(len(steps), *shape)
+
+def madgwick_steps(q, accel, gyro, dt, beta=MADGWICK_BETA):
+    """Run the Madgwick IMU filter over L steps; accel normalized, gyro in rad/s, dt (L, D).
+
+    Returns the (L, 4, D) quaternions after every step; q is updated in place.
+    """
+    state, accel, gyro, dt, sqrt, maximum = _components(q, accel, gyro, dt)
+    w, x, y, z = state
+    steps = []
+    for k in range(len(dt)):
+        gx, gy, gz = gyro[k]
+        ax, ay, az = accel[k]
+        # Rate of change from the gyro: 0.5 * q (x) [0, g]
+        dw = 0.5 * (-x * gx - y * gy - z * gz)
+        dx = 0.5 * (w * gx + y * gz - z * gy)
+        dy = 0.5 * (w * gy - x * gz + z * gx)
+        dz = 0.5 * (w * gz + x * gy - y * gx)
+        # Gradient of the error between measured and predicted gravity
+        f1 = 2 * (x * z - w * y) - ax
+        f2 = 2 * (w * x + y * z) - ay
+        f3 = 1 - 2 * (x * x + y * y) - az
+        s0 = -2 * y * f1 + 2 * x * f2
+        s1 = 2 * z * f1 + 2 * w * f2 - 4 * x * f3
+        s2 = -2 * w * f1 + 2 * z * f2 - 4 * y * f3
+        s3 = 2 * x * f1 + 2 * y * f2
+        gain = beta / maximum(sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3), 1e-12)
+        # A zero accelerometer reading has no gravity to go by, so only the gyro counts
+        gain = gain * (ax * ax + ay * ay + az * az > 0)
+        h = dt[k]
+        w = w + (dw - gain * s0) * h
+        x = x + (dx - gain * s1) * h
+        y = y + (dy - gain * s2) * h
+        z = z + (dz - gain * s3) * h
+        norm = 1.0 / sqrt(w * w + x * x + y * y + z * z)
+        w, x, y, z = w * norm, x * norm, y * norm, z * norm
+        steps.append((w, x, y, z))
+    q[:] = np.reshape([w, x, y, z], q.shape)
+    return _stack_steps(steps, q.shape)
+
+
+def mahony_steps(q, accel, gyro, dt, integral, kp=MAHONY_KP, ki=MAHONY_KI):
+    """Run the Mahony IMU filter over L steps; integral (3, D) holds the gyro bias estimate.
+
+    Returns the (L, 4, D) quaternions after every step; q and integral are updated in place.
+    """
+    state, accel, gyro, dt, sqrt, _ = _components(q, accel, gyro, dt)
+    w, x, y, z = state
+    ix, iy, iz = integral[:, 0].tolist() if integral.shape[1] == 1 else integral
+    steps = []
+    for k in range(len(dt)):
+        gx, gy, gz = gyro[k]
+        ax, ay, az = accel[k]
+        # Gravity direction predicted by the current orientation, crossed with the
+        # measured one; a zero accelerometer reading gives no correction
+        vx = 2 * (x * z - w * y)
+        vy = 2 * (w * x + y * z)
+        vz = w * w - x * x - y * y + z * z
+        ex = ay * vz - az * vy
+        ey = az * vx - ax * vz
+        ez = ax * vy - ay * vx
+        h = dt[k]
+        if ki > 0:
+            ix = ix + ki * ex * h
+            iy = iy + ki * ey * h
+            iz = iz + ki * ez * h
+        gx = gx + kp * ex + ix
+        gy = gy + kp * ey + iy
+        gz = gz + kp * ez + iz
+        half = 0.5 * h
+        w, x, y, z = (w + (-x * gx - y * gy - z * gz) * half,
+                      x + (w * gx + y * gz - z * gy) * half,
+                      y + (w * gy - x * gz + z * gx) * half,
+                      z + (w * gz + x * gy - y * gx) * half)
+        norm = 1.0 / sqrt(w * w + x * x + y * y + z * z)
+        w, x, y, z = w * norm, x * norm, y * norm, z * norm
+        steps.append((w, x, y, z))
+    q[:] = np.reshape([w, x, y, z], q.shape)
+    integral[:] = np.reshape([ix, iy, iz], integral.shape)
+    return _stack_steps(steps, q.shape)
+
+
+class OrientationBank:
+    """Orientation filters for several devices, stepped together.
+
+    add_device() registers a device and creates its orientation outlet; add()
+    queues a decoded chunk with its timestamps; run() fuses everything queued
+    and publishes the results. add() is called from the event loop while
+    run_loop() runs the passes on a worker thread, so the queues are locked.
+    """
+
+    def __init__(self, method='madgwick'):
+        if method not in FUSION_FILTERS:
+            raise ValueError(f"Orientation filter must be one of {FUSION_FILTERS}")
+        self.method = method
+        self.outlets = []
+        self.rates = []
+        self.q = np.zeros((4, 0))          # One quaternion [w, x, y, z] per column
+        self.integral = np.zeros((3, 0))
+        self.last_time = []
+        self.pending = []
+        self.lock = threading.Lock()
+        self.samples = 0
+
+    def add_device(self, stream_name, source_id, rate):
+        info = StreamInfo(f"{stream_name}_Orientation", 'Orientation', len(ORIENTATION_CHANNELS),
+                          rate, 'float32', source_id + '-orientation')
+        desc = info.desc()
+        desc.append_child_value("filter", self.method)
+        channels = desc.append_child("channels")
+        for label in ORIENTATION_CHANNELS:
+            channels.append_child("channel").append_child_value("label", label)
+        self.outlets.append(StreamOutlet(info))
+        self.rates.append(rate)
+        self.q = np.hstack([self.q, [[1.0], [0.0], [0.0], [0.0]]])
+        self.integral = np.hstack([self.integral, np.zeros((3, 1))])
+        self.last_time.append(None)
+        with self.lock:
+            self.pending.append([])
+        return len(self.outlets) - 1
+
+    def add(self, device, samples, timestamps):
+        with self.lock:
+            self.pending[device].append((samples, timestamps))
+
+    def run(self):
+        """Fuse every queued chunk, all devices in step, and push the orientation chunks."""
+        with self.lock:
+            queued, self.pending = self.pending, [[] for _ in self.pending]
+        chunks = []
+        for device, pending in enumerate(queued):
+            if pending:
+                samples = np.concatenate([p[0] for p in pending])
+                timestamps = np.concatenate([p[1] for p in pending])
+                chunks.append((device, samples, timestamps))
+        if not chunks:
+            return
+
+        devices = np.array([c[0] for c in chunks])
+        length = max(len(c[1]) for c in chunks)
+        # Padding past the end of a shorter chunk has dt = 0, which leaves q as it is
+        accel = np.zeros((length, 3, len(chunks)))
+        gyro = np.zeros((length, 3, len(chunks)))
+        dt = np.zeros((length, len(chunks)))
+        for i, (device, samples, timestamps) in enumerate(chunks):
+            n = len(samples)
+            accel[:n, :, i] = _normalize(samples[:, 0:3].astype(np.float64))
+            gyro[:n, :, i] = np.radians(samples[:, 3:6])
+            previous = self.last_time[device]
+            if previous is None:
+                previous = timestamps[0] - (1.0 / self.rates[device] if self.rates[device] else 0.0)
+            dt[:n, i] = np.clip(np.diff(timestamps, prepend=previous), 0.0, FUSION_MAX_DT)
+            self.last_time[device] = timestamps[-1]
+
+        q = self.q[:, devices]
+        if self.method == 'madgwick':
+            out = madgwick_steps(q, accel, gyro, dt)
+        else:
+            integral = self.integral[:, devices]
+            out = mahony_steps(q, accel, gyro, dt, integral)
+            self.integral[:, devices] = integral
+        self.q[:, devices] = q
+
+        for i, (device, samples, timestamps) in enumerate(chunks):
+            n = len(samples)
+            quaternions = out[:n, :, i]
+            values = np.hstack([quaternions, quaternion_to_euler(quaternions)]).astype(np.float32)
+            self.outlets[device].push_chunk(values, timestamps.tolist())
+            self.samples += n
+
+    async def run_loop(self, interval=FUSION_INTERVAL):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            # The filter steps are Python loops; off the event loop, notifications keep flowing
+            await loop.run_in_executor(None, self.run)
@@ -0,0 +1,187 @@
+import asyncio
+import random
+from collections import namedtuple, deque
+import numpy as np
+from pylsl import local_clock
+from imu import IMU_SERVICE_UUID, IMU_CHARACTERISTIC_UUID, IMU_CHANNELS, encode_packet
+
+# Simulated BLE IMUs for imu.py.
+#
+# SimScanner and SimClient stand in for BleakScanner and BleakClient, covering
+# the part of their API imu.py uses: scanning with a detection callback,
+# find_device_by_address, connecting as an async context manager with a
+# disconnected_callback, and start_notify. Each simulated device samples at a
+# fixed rate on the LSL clock, sends `burst` samples per notification, loses
+# a fraction of the notifications and delivers the rest with random delay but
+# in order, like a BLE link.
+#
+# Configure with configure() or a spec string such as
+#   devices=2,rate=1000,burst=8,loss=0.01,jitter=0.02,format=binary
+SIM_DEFAULTS = {
+    'devices': 1,          # Simulated devices advertising the IMU service
+    'rate': 100.0,         # Samples per second per device
+    'burst': 1,            # Samples per notification (always 1 for csv)
+    'loss': 0.0,           # Fraction of notifications lost on the link
+    'jitter': 0.0,         # Mean extra delivery delay in seconds (exponential)
+    'format': 'binary',    # binary (int16 + device time), float (float32 + device time) or csv
+    'counter': False,      # Put the sample index in the first channel, for measuring drops
+}
+SIM_FORMATS = ('binary', 'float', 'csv')
+SIM_TICK = 0.001           # Seconds between checks for due notifications
+SIM_ROCK_HZ = 0.5          # Simulated motion: rocking frequency
+SIM_ROCK_AMPLITUDE = 0.5   # and amplitude in radians
+
+SimDevice = namedtuple('SimDevice', ['address', 'name', 'index'])
+SimAdvertisement = namedtuple('SimAdvertisement', ['service_uuids', 'local_name'])
+
+config = dict(SIM_DEFAULTS)
+devices = []
+stats = {}         # address -> SimStats of the latest connection
+
+
+def parse_spec(spec):
+    """Turn "key=value,..." into a configuration dict, converting to the defaults' types."""
+    settings = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        key, _, value = item.partition('=')
+        if key not in SIM_DEFAULTS:
+            raise ValueError(f"Unknown simulator setting {key!r}")
+        default = SIM_DEFAULTS[key]
+        if isinstance(default, bool):
+            settings[key] = value.lower() in ('1', 'true', 'yes', '')
+        else:
+            settings[key] = type(default)(value)
+    return settings
+
+
+def configure(**settings):
+    config.clear()
+    config.update(SIM_DEFAULTS)
+    config.update(settings)
+    if config['format'] not in SIM_FORMATS:
+        raise ValueError(f"Simulator format must be one of {SIM_FORMATS}")
+    devices[:] = [SimDevice(f"5A:1D:00:00:00:{i:02X}", f"IMU-Sim{i}", i)
+                  for i in range(config['devices'])]
+    stats.clear()
+
+
+class SimStats:
+    """What one simulated device generated, sent and lost, with generation times."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.epoch = None      # LSL time of sample 0
+        self.generated = 0
+        self.sent = 0
+        self.lost = 0
+        self.sent_packets = []  # Index of the first sample of every delivered packet
+
+    def sample_time(self, index):
+        return self.epoch + index / self.rate
+
+
+class SimScanner:
+    def __init__(self, detection_callback=None, service_uuids=None, **kwargs):
+        self.detection_callback = detection_callback
+
+    async def __aenter__(self):
+        for device in devices:
+            if self.detection_callback:
+                self.detection_callback(device, SimAdvertisement([IMU_SERVICE_UUID], device.name))
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    @staticmethod
+    async def discover(timeout=5.0, **kwargs):
+        return list(devices)
+
+    @staticmethod
+    async def find_device_by_address(address, timeout=10.0, **kwargs):
+        return next((d for d in devices if d.address == address), None)
+
+
+class SimClient:
+    def __init__(self, address_or_device, disconnected_callback=None, timeout=10.0, **kwargs):
+        address = getattr(address_or_device, 'address', address_or_device)
+        self.device = next((d for d in devices if d.address == address), None)
+        self.disconnected_callback = disconnected_callback
+        self.task = None
+        self.is_connected = False
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.disconnect()
+
+    async def connect(self):
+        if self.device is None:
+            raise OSError("Simulated device not found")
+        self.is_connected = True
+
+    async def disconnect(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.is_connected:
+            self.is_connected = False
+            if self.disconnected_callback:
+                self.disconnected_callback(self)
+
+    async def start_notify(self, uuid, callback):
+        if uuid.lower() != IMU_CHARACTERISTIC_UUID.lower():
+            raise ValueError(f"Unknown characteristic {uuid}")
+        self.task = asyncio.create_task(self._notify(callback))
+
+    async def _notify(self, callback):
+        rate = config['rate']
+        burst = 1 if config['format'] == 'csv' else max(1, config['burst'])
+        device_stats = stats[self.device.address] = SimStats(rate)
+        device_stats.epoch = local_clock()
+        rng = np.random.default_rng(self.device.index)
+        pending = deque()     # (delivery time, first sample, payload), in delivery order
+        next_packet = 0
+        while True:
+            now = local_clock()
+            # Every packet whose last sample has been taken by now
+            while device_stats.sample_time((next_packet + 1) * burst - 1) <= now:
+                first = next_packet * burst
+                next_packet += 1
+                device_stats.generated += burst
+                if random.random() < config['loss']:
+                    device_stats.lost += burst
+                    continue
+                ready = device_stats.sample_time(first + burst - 1)
+                delay = random.expovariate(1.0 / config['jitter']) if config['jitter'] > 0 else 0.0
+                deliver = max(ready + delay, pending[-1][0] if pending else 0.0)
+                pending.append((deliver, first, self._packet(first, burst, device_stats, rng)))
+            while pending and pending[0][0] <= now:
+                _, first, payload = pending.popleft()
+                callback(None, bytearray(payload))
+                device_stats.sent += burst
+                device_stats.sent_packets.append(first)
+            await asyncio.sleep(SIM_TICK)
+
+    def _packet(self, first, count, device_stats, rng):
+        index = np.arange(first, first + count)
+        t = index / device_stats.rate
+        samples = np.empty((count, IMU_CHANNELS), dtype=np.float32)
+        # Rocking about the x axis, +-0.5 rad at 0.5 Hz: gravity turns in the y-z
+        # plane and the gyro sees the angular rate, so orientation filters converge
+        phase = 2 * np.pi * SIM_ROCK_HZ * t
+        angle = SIM_ROCK_AMPLITUDE * np.sin(phase)
+        samples[:, 0] = 0.0
+        samples[:, 1] = np.sin(angle)
+        samples[:, 2] = np.cos(angle)
+        samples[:, 3] = np.degrees(SIM_ROCK_AMPLITUDE * 2 * np.pi * SIM_ROCK_HZ * np.cos(phase))
+        samples[:, 4:6] = 0.0
+        samples += rng.normal(0.0, 0.002, samples.shape).astype(np.float32)
+        if config['counter']:
+            samples[:, 0] = index
+        if config['format'] == 'csv':
+            return ','.join(f"{v:.6f}" for v in samples[0]).encode()
+        device_time = int(t[0] * 1e6)
+        return encode_packet(samples, first, device_time, float32=config['format'] == 'float')
@@ -1,7 +1,13 @@
 import time
+import math
+import fnmatch
+import argparse
+import threading
+import numpy as np
 import pygame
-from collections import deque
-from pylsl import StreamInlet, resolve_stream
+from pylsl import (StreamInlet, resolve_byprop, resolve_bypred, resolve_streams, local_clock,
+                   cf_float32, cf_double64, cf_int8, cf_int16, cf_int32, cf_int64)
+from pylsl.util import LostError
 
 # Constants (same as in ble_imu.py)
 WINDOW_WIDTH = 1000
@@ -10,6 +16,26 @@ PADDING = 50
 PLOT_HEIGHT = (WINDOW_HEIGHT - 4 * PADDING) // 2  # Adjusted plot height
 WINDOW_SIZE = 100
 SCALE_FACTOR = 50
+IMU_CHANNELS = 6
+RING_SECONDS = 10             # History kept in the ring buffer
+RING_MIN_SAMPLES = 1024       # Ring size for streams without a nominal rate
+CHUNK_SAMPLES = 1024          # Samples pulled per pull_chunk call
+TARGET_FPS = 60               # Redraws per second
+STATUS_INTERVAL = 0.25        # Seconds between updates of the rate and lag text
+PLOT_WIDTH = WINDOW_WIDTH - 2 * PADDING   # Pixel columns per plot
+
+# Dashboard mode
+RESOLVE_SECONDS = 2.0         # Time spent discovering streams
+PANEL_SECONDS = 5.0           # Time span shown in each panel
+PANEL_MARGIN = 8
+MAX_TRACES = 8                # Channels drawn per panel
+INGEST_INTERVAL = 0.005       # Ingest thread sleep when no stream had data
+RECONNECT_TIMEOUT = 1.0       # Time spent per attempt at finding a lost stream again
+RECONNECT_INTERVAL = 1.0      # Pause between attempts
+TRACE_COLORS = [(255, 0, 0), (0, 255, 0), (0, 128, 255), (255, 255, 0),
+                (255, 0, 255), (0, 255, 255), (255, 128, 0), (200, 200, 200)]
+CHANNEL_DTYPES = {cf_float32: np.float32, cf_double64: np.float64, cf_int8: np.int8,
+                  cf_int16: np.int16, cf_int32: np.int32, cf_int64: np.int64}
 
 # Colors
 BLACK  = (0, 0, 0)
@@ -19,40 +45,149 @@ GREEN  = (0, 255, 0)
 BLUE   = (0, 0, 255)
 YELLOW = (255, 255, 0)
 
+class SampleRing:
+    """Preallocated (capacity, channels) ring of samples with their timestamps."""
+
+    def __init__(self, capacity, channels, dtype=np.float32):
+        self.data = np.zeros((capacity, channels), dtype=dtype)
+        self.timestamps = np.zeros(capacity)
+        self.head = 0      # Row the next sample goes to
+        self.count = 0     # Rows filled so far, up to capacity
+        self.total = 0     # Samples ever added
+
+    def extend(self, samples, timestamps):
+        capacity = len(self.data)
+        n = len(samples)
+        self.total += n
+        if n > capacity:
+            samples, timestamps = samples[-capacity:], timestamps[-capacity:]
+            n = capacity
+        first = min(n, capacity - self.head)
+        self.data[self.head:self.head + first] = samples[:first]
+        self.timestamps[self.head:self.head + first] = timestamps[:first]
+        self.data[:n - first] = samples[first:]
+        self.timestamps[:n - first] = timestamps[first:]
+        self.head = (self.head + n) % capacity
+        self.count = min(self.count + n, capacity)
+
+    def latest(self, n):
+        """The last n samples (fewer if the ring holds fewer), oldest first."""
+        return self._latest(self.data, n)
+
+    def latest_timestamps(self, n):
+        return self._latest(self.timestamps, n)
+
+    def _latest(self, array, n):
+        n = min(n, self.count)
+        start = self.head - n
+        if start >= 0:
+            return array[start:self.head]
+        return np.concatenate([array[start:], array[:self.head]])
+
+    @property
+    def last_timestamp(self):
+        return self.timestamps[self.head - 1] if self.count else None
+
+
+class MinMaxHistory:
+    """Per-column minimum and maximum of every channel over a long time span.
+
+    The span is cut into `columns` buckets of equal duration, kept as a ring
+    and updated as samples arrive, so drawing minutes of history costs the
+    same as drawing one screen width of samples.
+    """
+
+    def __init__(self, columns, seconds, channels):
+        self.columns = columns
+        self.seconds = seconds
+        self.bucket_seconds = seconds / columns
+        self.mins = np.full((columns, channels), np.inf, dtype=np.float32)
+        self.maxs = np.full((columns, channels), -np.inf, dtype=np.float32)
+        self.bucket_ids = np.full(columns, -1, dtype=np.int64)   # Absolute bucket held by each slot
+        self.latest_id = None
+
+    def extend(self, samples, timestamps):
+        ids = (timestamps / self.bucket_seconds).astype(np.int64)
+        # Reduce each run of samples in the same bucket, then merge into the ring
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])[-self.columns:]
+        samples = samples[starts[0]:]
+        starts = starts - starts[0]
+        ids = ids[starts]
+        mins = np.minimum.reduceat(samples, starts, axis=0)
+        maxs = np.maximum.reduceat(samples, starts, axis=0)
+        slots = ids % self.columns
+        same = (self.bucket_ids[slots] == ids)[:, None]
+        self.mins[slots] = np.where(same, np.minimum(self.mins[slots], mins), mins)
+        self.maxs[slots] = np.where(same, np.maximum(self.maxs[slots], maxs), maxs)
+        self.bucket_ids[slots] = ids
+        self.latest_id = ids[-1] if self.latest_id is None else max(self.latest_id, ids[-1])
+
+    def window(self):
+        """(columns, channels) minima and maxima, oldest column first, NaN where empty."""
+        if self.latest_id is None:
+            empty = np.full(self.mins.shape, np.nan, dtype=np.float32)
+            return empty, empty
+        ids = np.arange(self.latest_id - self.columns + 1, self.latest_id + 1)
+        slots = ids % self.columns
+        valid = (self.bucket_ids[slots] == ids)[:, None]
+        return (np.where(valid, self.mins[slots], np.nan),
+                np.where(valid, self.maxs[slots], np.nan))
+
+
+def drain(inlet, ring, buffer, history=None):
+    """Move every sample waiting in the inlet into the ring; returns how many there were."""
+    pulled = 0
+    while True:
+        _, timestamps = inlet.pull_chunk(timeout=0.0, max_samples=len(buffer), dest_obj=buffer)
+        n = len(timestamps)
+        if n:
+            ring.extend(buffer[:n], np.asarray(timestamps))
+            if history is not None:
+                history.extend(buffer[:n], np.asarray(timestamps))
+        pulled += n
+        if n < len(buffer):
+            return pulled
+
+
 class IMUVisualizer:
-    def __init__(self):
+    def __init__(self, stream):
         pygame.init()
         self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption("IMU LSL Data Visualization")
         
-        # Data storage using deque for a fixed-size window
-        self.acc_x = deque([0] * WINDOW_SIZE, maxlen=WINDOW_SIZE)
-        self.acc_y = deque([0] * WINDOW_SIZE, maxlen=WINDOW_SIZE)
-        self.acc_z = deque([0] * WINDOW_SIZE, maxlen=WINDOW_SIZE)
-        self.gyro_x = deque([0] * WINDOW_SIZE, maxlen=WINDOW_SIZE)
-        self.gyro_y = deque([0] * WINDOW_SIZE, maxlen=WINDOW_SIZE)
-        self.gyro_z = deque([0] * WINDOW_SIZE, maxlen=WINDOW_SIZE)
+        # StreamBuffer filled by the ingest thread; the plots show copies of its
+        # latest WINDOW_SIZE samples, or the min/max envelope of every pixel
+        # column in history mode
+        self.stream = stream
         
         self.font = pygame.font.Font(None, 24)
-        self.refresh_rate = 0.0  # Displayed refresh rate
         
         # Y-axis ranges
         self.acc_range = 2    # ±2g for accelerometer
         self.gyro_range = 250  # ±250 deg/s for gyroscope
 
-    def update_data(self, values):
-        # Expecting values to be a list of at least 6 floats
-        self.acc_x.append(values[0])
-        self.acc_y.append(values[1])
-        self.acc_z.append(values[2])
-        self.gyro_x.append(values[3])
-        self.gyro_y.append(values[4])
-        self.gyro_z.append(values[5])
+        # Plot centre lines; extra spacing between the two plots
+        self.acc_y_offset = PADDING + PLOT_HEIGHT
+        self.gyro_y_offset = 3 * PADDING + 2 * PLOT_HEIGHT
 
-    def draw_y_axis_labels(self, y_offset, range_val, title):
+        # Per-trace mapping from value to screen y, for all six channels at once
+        self.trace_offsets = np.array([self.acc_y_offset] * 3 + [self.gyro_y_offset] * 3, dtype=float)
+        self.trace_scales = np.array([PLOT_HEIGHT / self.acc_range] * 3
+                                     + [PLOT_HEIGHT / self.gyro_range] * 3)
+        self.trace_colors = [RED, GREEN, BLUE] * 2
+        self.x_coords = PADDING + np.arange(WINDOW_SIZE) * PLOT_WIDTH / WINDOW_SIZE
+        self.column_x = PADDING + np.arange(PLOT_WIDTH, dtype=float)
+
+        # Everything that doesn't change between frames is drawn once
+        self.background = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.draw_background(self.background)
+        self.status = None
+        self.status_time = 0.0
+
+    def draw_y_axis_labels(self, surface, y_offset, range_val, title):
         # Draw title above the plot
         title_surface = self.font.render(title, True, WHITE)
-        self.screen.blit(title_surface, (PADDING, y_offset - PLOT_HEIGHT - 30))
+        surface.blit(title_surface, (PADDING, y_offset - PLOT_HEIGHT - 30))
         
         # Draw y-axis scale labels (4 steps)
         steps = 4
@@ -60,99 +195,395 @@ class IMUVisualizer:
             val = range_val * (2 * i / steps - 1)
             y_pos = y_offset - (val * PLOT_HEIGHT / range_val)
             label = self.font.render(f"{val:.1f}", True, WHITE)
-            self.screen.blit(label, (5, y_pos - 10))
+            surface.blit(label, (5, y_pos - 10))
 
-    def draw_plot(self, data, y_offset, title, color, range_val):
+    def draw_axes(self, surface, y_offset):
         # Draw vertical axis line
-        pygame.draw.line(self.screen, WHITE, 
+        pygame.draw.line(surface, WHITE, 
                          (PADDING, y_offset - PLOT_HEIGHT), 
                          (PADDING, y_offset + PLOT_HEIGHT), 1)
         # Draw horizontal axis line
-        pygame.draw.line(self.screen, WHITE, 
+        pygame.draw.line(surface, WHITE, 
                          (PADDING, y_offset), 
                          (WINDOW_WIDTH - PADDING, y_offset), 1)
         
         # Draw legend text on the right side of the plot
-        legend = self.font.render(title, True, color)
         legend_x = WINDOW_WIDTH - PADDING - 100  # Right-side positioning
-        self.screen.blit(legend, (legend_x, y_offset - PLOT_HEIGHT + 20 * (color[0] // 255)))
-        
-        # Generate list of points for the plot line
-        points = []
-        for i, value in enumerate(data):
-            x = PADDING + (i * (WINDOW_WIDTH - 2 * PADDING) / WINDOW_SIZE)
-            scaled_y = (value * PLOT_HEIGHT / range_val)
-            y = y_offset - scaled_y
-            points.append((x, y))
-            
-        if len(points) > 1:
-            pygame.draw.lines(self.screen, color, False, points, 2)
+        for i, (title, color) in enumerate(zip(["X-axis", "Y-axis", "Z-axis"], [RED, GREEN, BLUE])):
+            legend = self.font.render(title, True, color)
+            surface.blit(legend, (legend_x, y_offset - PLOT_HEIGHT + 20 * i))
+
+    def draw_background(self, surface):
+        surface.fill(BLACK)
+        self.draw_y_axis_labels(surface, self.acc_y_offset, self.acc_range, "Accelerometer (g)")
+        self.draw_axes(surface, self.acc_y_offset)
+        self.draw_y_axis_labels(surface, self.gyro_y_offset, self.gyro_range, "Gyroscope (deg/s)")
+        self.draw_axes(surface, self.gyro_y_offset)
+        if self.stream.history is not None:
+            span = self.font.render(f"Last {self.stream.history.seconds:g} s", True, WHITE)
+            surface.blit(span, (WINDOW_WIDTH - PADDING - span.get_width(), WINDOW_HEIGHT - 25))
+
+    def status_surface(self):
+        # Ingest rate and lag, re-rendered a few times per second rather than every frame
+        now = time.perf_counter()
+        if self.status is None or now - self.status_time >= STATUS_INTERVAL:
+            self.status = pygame.Surface((200, 40))
+            self.status.fill(BLACK)
+            if not self.stream.connected:
+                self.status.blit(self.font.render("Reconnecting...", True, RED), (0, 0))
+            else:
+                rate_text = self.font.render(f"Sample Rate: {self.stream.rate:.1f} Hz", True, YELLOW)
+                self.status.blit(rate_text, (0, 0))
+                lag = f"{self.stream.lag * 1000:.1f} ms" if self.stream.lag is not None else "-"
+                self.status.blit(self.font.render(f"Ingest Lag: {lag}", True, YELLOW), (0, 20))
+            self.status_time = now
+        return self.status
 
     def draw(self):
-        # Clear screen
-        self.screen.fill(BLACK)
-        
-        # Display refresh rate at top-right
-        rate_text = self.font.render(f"Refresh Rate: {self.refresh_rate:.1f} Hz", True, YELLOW)
-        self.screen.blit(rate_text, (WINDOW_WIDTH - 200, 10))
-        
-        # Draw accelerometer plot
-        acc_y_offset = PADDING + PLOT_HEIGHT
-        self.draw_y_axis_labels(acc_y_offset, self.acc_range, "Accelerometer (g)")
-        self.draw_plot(self.acc_x, acc_y_offset, "X-axis", RED, self.acc_range)
-        self.draw_plot(self.acc_y, acc_y_offset, "Y-axis", GREEN, self.acc_range)
-        self.draw_plot(self.acc_z, acc_y_offset, "Z-axis", BLUE, self.acc_range)
-        
-        # Draw gyroscope plot
-        gyro_y_offset = 3 * PADDING + 2 * PLOT_HEIGHT  # Extra spacing between plots
-        self.draw_y_axis_labels(gyro_y_offset, self.gyro_range, "Gyroscope (deg/s)")
-        self.draw_plot(self.gyro_x, gyro_y_offset, "X-axis", RED, self.gyro_range)
-        self.draw_plot(self.gyro_y, gyro_y_offset, "Y-axis", GREEN, self.gyro_range)
-        self.draw_plot(self.gyro_z, gyro_y_offset, "Z-axis", BLUE, self.gyro_range)
+        self.screen.blit(self.background, (0, 0))
+        self.screen.blit(self.status_surface(), (WINDOW_WIDTH - 200, 10))
+
+        if self.stream.history is not None:
+            self.draw_envelopes()
+            pygame.display.flip()
+            return
+
+        # Screen coordinates of all six traces in one step: (samples, channels)
+        window = self.stream.latest(WINDOW_SIZE)[:, :IMU_CHANNELS]
+        if len(window) > 1:
+            ys = self.trace_offsets - window * self.trace_scales
+            points = np.empty((len(window), IMU_CHANNELS, 2))
+            points[:, :, 0] = self.x_coords[:len(window), None]
+            points[:, :, 1] = ys
+            points = points.transpose(1, 0, 2).tolist()
+            for trace, color in zip(points, self.trace_colors):
+                pygame.draw.lines(self.screen, color, False, trace, 2)
         
         pygame.display.flip()
 
-def main():
+    def draw_envelopes(self):
+        # One vertical stroke per pixel column from min to max, as a single zigzag line
+        mins, maxs = self.stream.envelope()
+        lows = self.trace_offsets - mins[:, :IMU_CHANNELS] * self.trace_scales
+        highs = self.trace_offsets - maxs[:, :IMU_CHANNELS] * self.trace_scales
+        valid = ~np.isnan(lows[:, 0])
+        if valid.sum() < 2:
+            return
+        columns = int(valid.sum())
+        points = np.empty((IMU_CHANNELS, 2 * columns, 2))
+        points[:, 0::2, 0] = points[:, 1::2, 0] = self.column_x[valid]
+        points[:, 0::2, 1] = highs[valid].T
+        points[:, 1::2, 1] = lows[valid].T
+        for trace, color in zip(points.tolist(), self.trace_colors):
+            pygame.draw.lines(self.screen, color, False, trace, 1)
+
+class StreamBuffer:
+    """Inlet, ring buffer and ingest statistics of one dashboard stream.
+
+    The inlet doesn't recover on its own: when its outlet goes away the
+    stream is marked disconnected, and a background thread resolves it
+    again, by source id when it has one, and swaps in a new inlet.
+    With history_seconds the min/max envelope of that span is kept too.
+    """
+
+    def __init__(self, info, history_seconds=0):
+        self.info = info
+        self.name = info.name()
+        self.inlet = StreamInlet(info, recover=False)
+        self.connected = True
+        self.stop_event = threading.Event()
+        channels = info.channel_count()
+        rate = info.nominal_srate()
+        capacity = max(RING_MIN_SAMPLES, int(rate * max(RING_SECONDS, history_seconds)))
+        self.ring = SampleRing(capacity, channels, np.float64)
+        self.history = MinMaxHistory(PLOT_WIDTH, history_seconds, channels) if history_seconds else None
+        self.buffer = np.empty((CHUNK_SAMPLES, channels), dtype=CHANNEL_DTYPES[info.channel_format()])
+        self.lock = threading.Lock()
+        self.clock_offset = None
+        self.rate = 0.0
+        self.lag = None
+        self._count = 0
+        self._start = time.perf_counter()
+
+    def ingest(self):
+        """Drain the inlet into the ring; returns how many samples arrived."""
+        if not self.connected:
+            return 0
+        try:
+            if self.clock_offset is None:
+                # Never wait here, it would hold up every other stream: liblsl keeps
+                # measuring in the background and a later drain picks the offset up
+                try:
+                    self.clock_offset = self.inlet.time_correction(timeout=0.0)
+                except LostError:
+                    raise
+                except Exception:
+                    pass
+            with self.lock:
+                pulled = drain(self.inlet, self.ring, self.buffer, self.history)
+                if self.ring.count and self.clock_offset is not None:
+                    self.lag = local_clock() - (self.ring.last_timestamp + self.clock_offset)
+        except LostError:
+            self.disconnect()
+            return 0
+        self._count += pulled
+        elapsed = time.perf_counter() - self._start
+        if elapsed >= 1.0:
+            self.rate = self._count / elapsed
+            self._count = 0
+            self._start += elapsed
+        return pulled
+
+    def disconnect(self):
+        print(f"Lost {self.name}, trying to reconnect")
+        self.connected = False
+        self.rate = 0.0
+        self.lag = None
+        self.inlet.close_stream()
+        threading.Thread(target=self.reconnect, name=f"reconnect-{self.name}", daemon=True).start()
+
+    def reconnect(self):
+        """Resolve the stream again until it's back or the dashboard closes (runs on its own thread)."""
+        source_id = self.info.source_id()
+        while not self.stop_event.is_set():
+            if source_id:
+                found = resolve_byprop('source_id', source_id, timeout=RECONNECT_TIMEOUT)
+            else:
+                found = resolve_bypred(f"name='{self.name}' and type='{self.info.type()}'",
+                                       timeout=RECONNECT_TIMEOUT)
+            # Only a stream that fits the existing ring can take its place
+            found = [info for info in found
+                     if info.channel_count() == self.info.channel_count()
+                     and CHANNEL_DTYPES.get(info.channel_format()) == self.buffer.dtype]
+            if found:
+                self.info = found[0]
+                self.inlet = StreamInlet(self.info, recover=False)
+                self.clock_offset = None
+                self._count = 0
+                self._start = time.perf_counter()
+                self.connected = True
+                print(f"Reconnected {self.name}")
+                return
+            self.stop_event.wait(RECONNECT_INTERVAL)
+
+    def close(self):
+        self.stop_event.set()
+
+    def latest(self, n):
+        """Copy of the last n samples, oldest first."""
+        with self.lock:
+            return self.ring.latest(n).copy()
+
+    def envelope(self):
+        """Per-column (minima, maxima) of the history span; see MinMaxHistory.window()."""
+        with self.lock:
+            return self.history.window()
+
+    def window(self, seconds):
+        """Copies of (timestamps, samples) of the last `seconds`, oldest first."""
+        with self.lock:
+            rate = self.info.nominal_srate()
+            n = int(seconds * rate * 1.5) + 2 if rate > 0 else self.ring.count
+            timestamps = self.ring.latest_timestamps(n).copy()
+            samples = self.ring.latest(n).copy()
+        if len(timestamps):
+            keep = timestamps >= timestamps[-1] - seconds
+            timestamps, samples = timestamps[keep], samples[keep]
+        return timestamps, samples
+
+
+class IngestThread(threading.Thread):
+    """Drain every StreamBuffer's inlet in the background."""
+
+    def __init__(self, streams):
+        super().__init__(name="lsl-ingest", daemon=True)
+        self.streams = streams
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if not sum(stream.ingest() for stream in self.streams):
+                time.sleep(INGEST_INTERVAL)
+
+
+def find_streams(name=None, stream_type=None, source_id=None, wait_time=RESOLVE_SECONDS):
+    """Every numeric stream whose name, type and source id match the given glob patterns."""
+    found = []
+    for info in resolve_streams(wait_time):
+        if name and not fnmatch.fnmatch(info.name(), name):
+            continue
+        if stream_type and not fnmatch.fnmatch(info.type(), stream_type):
+            continue
+        if source_id and not fnmatch.fnmatch(info.source_id(), source_id):
+            continue
+        if info.channel_format() not in CHANNEL_DTYPES:
+            print(f"Skipping {info.name()}: string samples can't be plotted")
+            continue
+        found.append(info)
+    return sorted(found, key=lambda i: (i.type(), i.name(), i.source_id()))
+
+
+class Dashboard:
+    """Auto-laid-out panels, one per stream, each with its rate and lag."""
+
+    def __init__(self, streams):
+        pygame.init()
+        self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+        pygame.display.set_caption("LSL Dashboard")
+        self.font = pygame.font.Font(None, 20)
+        self.streams = streams
+        self.panels = self.layout(len(streams))
+        self.background = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.draw_background()
+        self.status = [None] * len(streams)
+        self.status_time = 0.0
+
+    @staticmethod
+    def layout(count):
+        """Panel rectangles in a grid as close to square as the count allows."""
+        columns = max(1, math.ceil(math.sqrt(count)))
+        rows = max(1, math.ceil(count / columns))
+        width = WINDOW_WIDTH // columns
+        height = WINDOW_HEIGHT // rows
+        return [pygame.Rect((i % columns) * width + PANEL_MARGIN, (i // columns) * height + PANEL_MARGIN,
+                            width - 2 * PANEL_MARGIN, height - 2 * PANEL_MARGIN)
+                for i in range(count)]
+
+    def plot_rect(self, panel):
+        # Below the two text lines at the top of the panel
+        return pygame.Rect(panel.x, panel.y + 40, panel.width, panel.height - 40)
+
+    def draw_background(self):
+        self.background.fill(BLACK)
+        for stream, panel in zip(self.streams, self.panels):
+            pygame.draw.rect(self.background, (60, 60, 60), self.plot_rect(panel), 1)
+            info = stream.info
+            title = f"{info.name()} ({info.type()}, {info.channel_count()} ch, {info.source_id()})"
+            self.background.blit(self.font.render(title, True, WHITE), (panel.x, panel.y))
+
+    def status_surface(self, i):
+        stream = self.streams[i]
+        if not stream.connected:
+            return self.font.render("disconnected, reconnecting...", True, RED)
+        lag = f"{stream.lag * 1000:.1f} ms" if stream.lag is not None else "-"
+        text = f"{stream.rate:.1f} Hz, lag {lag}"
+        return self.font.render(text, True, YELLOW)
+
+    def draw(self):
+        self.screen.blit(self.background, (0, 0))
+        now = time.perf_counter()
+        if now - self.status_time >= STATUS_INTERVAL:
+            self.status = [self.status_surface(i) for i in range(len(self.streams))]
+            self.status_time = now
+        for i, (stream, panel) in enumerate(zip(self.streams, self.panels)):
+            self.screen.blit(self.status[i], (panel.x, panel.y + 18))
+            self.draw_traces(stream, self.plot_rect(panel))
+        pygame.display.flip()
+
+    def draw_traces(self, stream, rect):
+        timestamps, samples = stream.window(PANEL_SECONDS)
+        if len(timestamps) < 2:
+            return
+        samples = samples[:, :MAX_TRACES]
+        # Autoscale the panel to what is on screen
+        low, high = np.nanmin(samples), np.nanmax(samples)
+        if high <= low:
+            low, high = low - 1, high + 1
+        columns = ((timestamps - (timestamps[-1] - PANEL_SECONDS)) / PANEL_SECONDS * (rect.width - 1))
+        columns = np.clip(columns, 0, rect.width - 1).astype(np.int64)
+        if len(timestamps) > 2 * rect.width:
+            # More samples than pixels: one min/max pair per pixel column
+            starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+            xs = np.repeat(columns[starts], 2)
+            values = np.empty((2 * len(starts), samples.shape[1]))
+            values[0::2] = np.maximum.reduceat(samples, starts, axis=0)
+            values[1::2] = np.minimum.reduceat(samples, starts, axis=0)
+        else:
+            xs, values = columns, samples
+        points = np.empty((samples.shape[1], len(xs), 2))
+        points[:, :, 0] = rect.x + xs
+        points[:, :, 1] = (rect.bottom - 1 - (values - low) / (high - low) * (rect.height - 2)).T
+        for trace, color in zip(points.tolist(), TRACE_COLORS):
+            pygame.draw.lines(self.screen, color, False, trace, 1)
+
+
+def dashboard_main(args):
+    print("Resolving LSL streams...")
+    infos = find_streams(args.name, args.type, args.source_id)
+    if not infos:
+        print("No matching streams found.")
+        return
+    for info in infos:
+        print(f"  {info.name()} ({info.type()}, {info.channel_count()} ch, "
+              f"{info.nominal_srate():g} Hz, {info.source_id()})")
+
+    streams = [StreamBuffer(info) for info in infos]
+    ingest = IngestThread(streams)
+    ingest.start()
+    dashboard = Dashboard(streams)
+    clock = pygame.time.Clock()
+    try:
+        while True:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return
+            dashboard.draw()
+            clock.tick(args.fps)
+    finally:
+        ingest.stop_event.set()
+        ingest.join()
+        for stream in streams:
+            stream.close()
+        pygame.quit()
+
+def main(fps=TARGET_FPS, history_seconds=0):
     print("Resolving IMU_Stream LSL stream...")
-    streams = resolve_stream('name', 'IMU_Stream')
+    streams = resolve_byprop('name', 'IMU_Stream')
     if not streams:
         print("No IMU_Stream found! Make sure your BLE script is running and streaming LSL data.")
         return
+    info = streams[0]
+    if info.channel_count() < IMU_CHANNELS:
+        print(f"IMU_Stream has {info.channel_count()} channels, expected {IMU_CHANNELS}")
+        return
 
-    inlet = StreamInlet(streams[0])
     print("IMU_Stream resolved. Listening for samples...")
-    
-    viz = IMUVisualizer()
-    
-    # For refresh rate calculation
-    frame_count = 0
-    start_time = time.time()
-    
-    # Main loop (no delay calls; runs as fast as possible)
-    while True:
-        # Use non-blocking call so there is no artificial delay
-        sample, timestamp = inlet.pull_sample(timeout=0.0)
-        if sample is not None:
-            if len(sample) >= 6:
-                viz.update_data(sample)
-                frame_count += 1
-                current_time = time.time()
-                elapsed_time = current_time - start_time
-                if elapsed_time >= 1.0:
-                    viz.refresh_rate = frame_count / elapsed_time
-                    frame_count = 0
-                    start_time = current_time
-            else:
-                print("Received sample with insufficient channels:", sample)
+    # Samples are pulled on the ingest thread; this loop only draws copies of them
+    stream = StreamBuffer(info, history_seconds)
+    ingest = IngestThread([stream])
+    ingest.start()
+    viz = IMUVisualizer(stream)
+    clock = pygame.time.Clock()
+    try:
+        while True:
+            # Process Pygame events for graceful exit
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return
+            viz.draw()
+            clock.tick(fps)
+    finally:
+        ingest.stop_event.set()
+        ingest.join()
+        stream.close()
+        pygame.quit()
 
-        # Process Pygame events for graceful exit
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                return
-        
-        viz.draw()
-        # Removed clock.tick() to avoid FPS limitation and sleep delays.
+def parse_args():
+    parser = argparse.ArgumentParser(description="Plot the IMU_Stream LSL stream, or a dashboard of several streams")
+    parser.add_argument('--fps', type=float, default=TARGET_FPS,
+                        help="redraws per second")
+    parser.add_argument('--history', type=float, default=0, metavar='SECONDS',
+                        help="show the min/max envelope of this many seconds instead of the last samples")
+    parser.add_argument('--dashboard', action='store_true',
+                        help="plot every stream matching --name/--type/--source-id, one panel each")
+    parser.add_argument('--name', help="stream name pattern for the dashboard, e.g. 'IMU_Stream*'")
+    parser.add_argument('--type', help="stream type pattern for the dashboard, e.g. 'IMU'")
+    parser.add_argument('--source-id', help="source id pattern for the dashboard, e.g. 'imu-*'")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    main() 
+    args = parse_args()
+    if args.dashboard or args.name or args.type or args.source_id:
+        dashboard_main(args)
+    else:
+        main(args.fps, args.history)
@@ -0,0 +1,150 @@
+import sys
+import queue
+import threading
+from collections import namedtuple
+from pylsl import local_clock
+
+# Remote control of camels.py over MQTT.
+#
+# Payloads published to the control topic:
+#   start            begin recording (pre-trigger frames included)
+#   stop             finish the current recording
+#   mark [label]     drop a marker at the current frame
+#   segment          close the current file and continue in a new one
+MQTT_HOST = "127.0.0.1"
+MQTT_PORT = 1883
+MQTT_TOPIC = "video"
+COMMANDS = ("start", "stop", "mark", "segment")
+
+# A parsed control message with the LSL time it arrived at
+Command = namedtuple('Command', ['name', 'argument', 'timestamp'])
+
+
+def parse_command(payload):
+    """Turn a raw MQTT payload into a Command, or None if it isn't one."""
+    if isinstance(payload, bytes):
+        payload = payload.decode(errors='replace')
+    parts = payload.strip().split(maxsplit=1)
+    if not parts or parts[0].lower() not in COMMANDS:
+        return None
+    argument = parts[1] if len(parts) > 1 else ""
+    return Command(parts[0].lower(), argument, local_clock())
+
+
+class MqttControl:
+    """Subscribe to the control topic in the background and queue the commands.
+
+    The paho network loop runs on its own thread, so the recorder only ever
+    polls its command queue and never waits on the broker. Every queue handed
+    out by listen() receives every command.
+    """
+
+    def __init__(self, host=MQTT_HOST, port=MQTT_PORT, topic=MQTT_TOPIC, client=None):
+        self.topic = topic
+        self.listeners = []
+        if client is None:
+            import paho.mqtt.client as mqtt
+            if hasattr(mqtt, 'CallbackAPIVersion'):
+                client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+            else:
+                client = mqtt.Client()
+        self.client = client
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.client.connect_async(host, port)
+        self.client.loop_start()
+
+    def _on_connect(self, client, userdata, *args):
+        # Subscribe here so the subscription survives reconnects
+        client.subscribe(self.topic)
+
+    def _on_message(self, client, userdata, msg):
+        command = parse_command(msg.payload)
+        if command is None:
+            print(f"Ignoring unknown control message: {msg.payload!r}")
+            return
+        for listener in self.listeners:
+            listener.put(command)
+
+    def listen(self):
+        listener = queue.Queue()
+        self.listeners.append(listener)
+        return listener
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+class LocalBroker:
+    """In-process stand-in for an MQTT broker.
+
+    client() returns objects with the subset of the paho client API that
+    MqttControl uses, and publish() delivers synchronously to every
+    subscriber, so the control path can run without mosquitto.
+    """
+
+    def __init__(self):
+        self.clients = []
+        self.lock = threading.Lock()
+
+    def client(self):
+        client = LocalClient(self)
+        with self.lock:
+            self.clients.append(client)
+        return client
+
+    def publish(self, topic, payload):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.deliver(topic, payload)
+
+
+LocalMessage = namedtuple('LocalMessage', ['topic', 'payload'])
+
+
+class LocalClient:
+    def __init__(self, broker):
+        self.broker = broker
+        self.topics = set()
+        self.connected = False
+        self.on_connect = None
+        self.on_message = None
+
+    def connect_async(self, host, port=MQTT_PORT):
+        pass
+
+    def loop_start(self):
+        self.connected = True
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0)
+
+    def loop_stop(self):
+        self.connected = False
+
+    def disconnect(self):
+        self.connected = False
+
+    def subscribe(self, topic):
+        self.topics.add(topic)
+
+    def publish(self, topic, payload):
+        self.broker.publish(topic, payload)
+
+    def deliver(self, topic, payload):
+        if self.connected and topic in self.topics and self.on_message:
+            self.on_message(self, None, LocalMessage(topic, payload))
+
+
+def stdin_publisher(broker, topic=MQTT_TOPIC):
+    """Publish every line typed on stdin to the local broker (runs as a daemon thread)."""
+    def run():
+        for line in sys.stdin:
+            if line.strip():
+                broker.publish(topic, line.strip())
+    thread = threading.Thread(target=run, name="stdin-control", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,273 @@
+import os
+import time
+import queue
+import shutil
+import threading
+import subprocess
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import cv2
+
+# Multi-process video encoding for camels.py.
+#
+# Frames are copied once into a ring of preallocated slots in shared memory.
+# Only the slot number travels through the task queues, so nothing is pickled.
+# The stream is cut into short parts and part k is encoded by worker
+# k % workers, which keeps every part in order while the workers run in
+# parallel. release() stitches the parts back into one file.
+#
+# The ring and the worker processes belong to an EncoderPool, which outlives
+# the files written through it: a recording rotated into many files keeps one
+# set of workers, and each ProcessEncoder only tells them where its parts go.
+SEGMENT_FRAMES = 30   # Frames per part (0.5 s at 60 fps)
+WORKER_CHECK_INTERVAL = 1.0   # Seconds between worker liveness checks while waiting on the workers
+
+
+class SharedFrameRing:
+    """Preallocated frame slots in shared memory, mapped as one (slots, h, w, c) array."""
+
+    def __init__(self, slots, frame_shape, name=None):
+        self.owner = name is None
+        size = slots * int(np.prod(frame_shape))
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray((slots,) + tuple(frame_shape), dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        # Views into the buffer have to go before the mapping can be closed
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def segment_path(filename, segment):
+    base, ext = os.path.splitext(filename)
+    return f"{base}.part{segment:06d}{ext}"
+
+
+def _encode_worker(ring_name, slots, frame_shape, tasks, free_slots, closed, fps, fourcc):
+    # Tasks are (slot, part, path) for the first frame of a part, (slot, part)
+    # for the rest, ('close', part) once its file is released and None to exit.
+    # Every finished part is reported on closed.
+    ring = SharedFrameRing(slots, frame_shape, name=ring_name)
+    h, w = frame_shape[:2]
+    writer = None
+    current_part = None
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            if task[0] == 'close':
+                if task[1] == current_part:
+                    writer.release()
+                    writer = current_part = None
+                    closed.put(task[1])
+                continue
+            slot, part = task[:2]
+            if part != current_part:
+                if writer is not None:
+                    writer.release()
+                    closed.put(current_part)
+                writer = cv2.VideoWriter(task[2], cv2.VideoWriter_fourcc(*fourcc), fps, (w, h))
+                current_part = part
+            writer.write(ring.frames[slot])
+            free_slots.put(slot)
+    finally:
+        if writer is not None:
+            writer.release()
+            closed.put(current_part)
+        ring.close()
+
+
+class EncoderPool:
+    """Shared frame ring and encoder processes, reused by every ProcessEncoder given to it."""
+
+    def __init__(self, fourcc, fps, frame_size, workers=None, segment_frames=SEGMENT_FRAMES, slots=None):
+        if workers is None:
+            workers = max(1, min(4, (os.cpu_count() or 2) - 1))
+        if slots is None:
+            # Enough for every worker to hold a full part in flight
+            slots = workers * segment_frames
+        w, h = frame_size
+        self.frame_size = frame_size
+        self.segment_frames = segment_frames
+        self.next_part = 0
+        self.ring = SharedFrameRing(slots, (h, w, 3))
+
+        ctx = multiprocessing.get_context('spawn')
+        self.free_slots = ctx.Queue()
+        for slot in range(slots):
+            self.free_slots.put(slot)
+        self.closed = ctx.Queue()
+        self.closed_parts = set()
+        self.closed_lock = threading.Lock()
+        self.tasks = [ctx.Queue() for _ in range(workers)]
+        self.workers = [
+            ctx.Process(target=_encode_worker, name=f"encoder-{i}",
+                        args=(self.ring.name, slots, (h, w, 3), tasks, self.free_slots,
+                              self.closed, fps, fourcc))
+            for i, tasks in enumerate(self.tasks)
+        ]
+        for p in self.workers:
+            p.start()
+
+    def new_part(self):
+        """Number of a new part; parts are numbered across files so the workers take turns."""
+        part = self.next_part
+        self.next_part += 1
+        return part
+
+    def write(self, image, part, path=None):
+        # Blocks when every slot is still being encoded, unless a worker has died
+        while True:
+            try:
+                slot = self.free_slots.get(timeout=WORKER_CHECK_INTERVAL)
+                break
+            except queue.Empty:
+                self.check_workers()
+        np.copyto(self.ring.frames[slot], image)
+        task = (slot, part) if path is None else (slot, part, path)
+        self.tasks[part % len(self.tasks)].put(task)
+
+    def check_workers(self):
+        for p in self.workers:
+            if not p.is_alive():
+                raise RuntimeError(f"Encoder process {p.name} exited with code {p.exitcode}")
+
+    def finish(self, parts):
+        """Wait until the workers have closed the given parts, or until one of them has died."""
+        for part in parts:
+            self.tasks[part % len(self.tasks)].put(('close', part))
+        parts = set(parts)
+        while True:
+            # Several files can be finishing at once, so whoever reads a report keeps it for all
+            with self.closed_lock:
+                while True:
+                    try:
+                        self.closed_parts.add(self.closed.get_nowait())
+                    except queue.Empty:
+                        break
+                if parts <= self.closed_parts:
+                    self.closed_parts -= parts
+                    return
+            try:
+                self.check_workers()
+            except RuntimeError as e:
+                print(e)
+                return
+            time.sleep(0.01)
+
+    def close(self):
+        if self.ring is None:
+            return
+        for tasks in self.tasks:
+            tasks.put(None)
+        for p in self.workers:
+            p.join()
+        self.ring.close()
+        self.ring = None
+
+
+class ProcessEncoder:
+    """Drop-in replacement for cv2.VideoWriter that encodes on several processes.
+
+    Given a pool, it writes through the pool's workers and leaves them running
+    when released; otherwise it starts a pool of its own for this one file.
+    """
+
+    def __init__(self, filename, fourcc, fps, frame_size, workers=None,
+                 segment_frames=SEGMENT_FRAMES, slots=None, pool=None):
+        self.owns_pool = pool is None
+        if pool is None:
+            pool = EncoderPool(fourcc, fps, frame_size, workers, segment_frames, slots)
+        self.pool = pool
+        self.filename = filename
+        self.frame_count = 0
+        self.part_numbers = []   # Pool part number of each part of this file
+        self.parts = None        # Encoded parts left in place when they couldn't be stitched
+        self.released = False
+
+    def isOpened(self):
+        return not self.released
+
+    def write(self, image):
+        index, position = divmod(self.frame_count, self.pool.segment_frames)
+        if position == 0:
+            self.part_numbers.append(self.pool.new_part())
+            self.pool.write(image, self.part_numbers[index], segment_path(self.filename, index))
+        else:
+            self.pool.write(image, self.part_numbers[index])
+        self.frame_count += 1
+
+    def bytes_written(self):
+        """Bytes on disk so far: the parts while encoding, the stitched file once it's joined."""
+        if self.released and self.parts is None:
+            try:
+                return os.path.getsize(self.filename)
+            except OSError:
+                return 0
+        total = 0
+        for i in range(len(self.part_numbers)):
+            try:
+                total += os.path.getsize(segment_path(self.filename, i))
+            except OSError:
+                pass    # Not created by its worker yet
+        return total
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        if self.owns_pool:
+            self.pool.close()
+        else:
+            self.pool.finish(self.part_numbers)
+
+        if self.frame_count == 0:
+            return
+        # A worker that died leaves gaps
+        parts = [segment_path(self.filename, i) for i in range(len(self.part_numbers))
+                 if os.path.exists(segment_path(self.filename, i))]
+        if not stitch_segments(self.filename, parts):
+            self.parts = parts
+
+
+def ffmpeg_path():
+    """The ffmpeg executable that stitches the encoded parts, or None if it isn't installed."""
+    return shutil.which('ffmpeg')
+
+
+def stitch_segments(filename, parts):
+    """Concatenate encoded segments into filename without re-encoding (needs ffmpeg).
+
+    Returns False, leaving the parts and a list of them in place, if that failed.
+    """
+    list_path = os.path.splitext(filename)[0] + '.parts.txt'
+    with open(list_path, 'w') as f:
+        for part in parts:
+            f.write(f"file '{os.path.abspath(part)}'\n")
+
+    ffmpeg = ffmpeg_path()
+    if ffmpeg is None:
+        print(f"ffmpeg not found; segments left in place, listed in {list_path}")
+        return False
+
+    result = subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                             '-i', list_path, '-c', 'copy', filename])
+    if result.returncode != 0:
+        print(f"Stitching failed; segments left in place, listed in {list_path}")
+        return False
+
+    for part in parts:
+        os.remove(part)
+    os.remove(list_path)
+    return True
@@ -0,0 +1,98 @@
+import os
+import json
+import sys
+import threading
+import pytest
+import camels
+from frame_store import FrameIndex, MJPEG_EXTENSION, index_path
+
+CAMERAS = 3
+FPS = 30
+DURATION = 3.0
+
+
+class RecordingOutlet:
+    """Stands in for camels' StreamOutlets and keeps what each one pushed, by stream name."""
+
+    pushed = {}
+    lock = threading.Lock()
+
+    def __init__(self, info):
+        self.name = info.name()
+        self.channels = info.channel_count()
+        with self.lock:
+            self.pushed[self.name] = []
+
+    def push_sample(self, sample, timestamp=None):
+        assert len(sample) == self.channels
+        with self.lock:
+            self.pushed[self.name].append((list(sample), timestamp))
+
+
+@pytest.fixture
+def outlets(monkeypatch):
+    RecordingOutlet.pushed = {}
+    monkeypatch.setattr(camels, 'StreamOutlet', RecordingOutlet)
+    return RecordingOutlet.pushed
+
+
+def record(monkeypatch, output_dir, *options):
+    argv = ['camels.py', '--headless', '--sync', '--duration', str(DURATION),
+            '--output-dir', str(output_dir), *options]
+    for _ in range(CAMERAS):
+        argv += ['--camera', f'synthetic:64x48@{FPS}']
+    monkeypatch.setattr(sys, 'argv', argv)
+    return camels.run(camels.parse_args())
+
+
+def test_synthetic_cameras_are_recorded_and_synchronized(monkeypatch, tmp_path, outlets):
+    summary = record(monkeypatch, tmp_path, '--passthrough')
+
+    # One frame number outlet per camera, the first under the original name
+    names = ['FrameNumberStream'] + [f'FrameNumberStream{k}' for k in range(1, CAMERAS)]
+    assert set(names) <= set(outlets)
+    for camera, name in enumerate(names):
+        numbers = [sample[0] for sample, _ in outlets[name]]
+        assert len(numbers) >= FPS * DURATION * 0.5
+        assert numbers == sorted(set(numbers))
+        assert summary['cameras'][camera]['frames'] == len(numbers)
+
+    # Every camera wrote its own session: manifest, video and index per segment
+    for camera, name in enumerate(names):
+        manifests = [f for f in os.listdir(tmp_path) if f.endswith(f'_cam{camera}.manifest.json')]
+        assert len(manifests) == 1
+        with open(tmp_path / manifests[0]) as f:
+            segments = json.load(f)['segments']
+        assert segments and all(segment['complete'] for segment in segments)
+        stored = []
+        for segment in segments:
+            assert segment['file'].endswith(MJPEG_EXTENSION)
+            video = str(tmp_path / segment['file'])
+            assert os.path.getsize(video) > 0
+            assert os.path.basename(index_path(video)) == segment['index']
+            stored.extend(FrameIndex.for_video(video).records['frame'].tolist())
+        # Everything published was recorded; nothing is pre-triggered without MQTT
+        published = [sample[0] for sample, _ in outlets[name]]
+        assert stored == published[-len(stored):]
+        assert len(stored) == sum(segment['frames'] for segment in segments)
+
+    # The sync outlet carries one sample per group, with -1 for a dropped frame
+    sync = summary['sync']
+    groups = outlets['FrameSyncStream']
+    assert sync['groups'] == len(groups) > 0
+    times = [t for _, t in groups]
+    assert times == sorted(times)
+    for camera, (name, stats) in enumerate(zip(names, sync['cameras'])):
+        column = [numbers[camera] for numbers, _ in groups]
+        published = [sample[0] for sample, _ in outlets[name]]
+        assert [n for n in column if n >= 0] == published
+        assert stats['dropped'] == column.count(-1)
+        assert stats['frames'] + stats['dropped'] == sync['groups']
+        # Cameras paced at the same rate land in the same group almost always
+        assert stats['dropped'] <= 0.1 * sync['groups']
+        assert 0 <= stats['mean_abs_skew_ms'] <= stats['max_abs_skew_ms'] <= sync['tolerance_ms']
+    assert sync['tolerance_ms'] == pytest.approx(500.0 / FPS)
+
+    # The health summary written next to the recordings includes the sync report
+    with open(tmp_path / f"{summary['session']}_health.json") as f:
+        assert json.load(f)['sync'] == sync
@@ -0,0 +1,146 @@
+import os
+import json
+import queue
+import threading
+import cv2
+import numpy as np
+import pytest
+from camels import Frame, PreTriggerBuffer, Recorder, encoder_loop
+from capture_health import CaptureHealth
+from frame_store import MjpegWriter, MjpegReader, FrameIndexWriter, FrameIndex, index_path, MJPEG_EXTENSION
+from mqtt_control import MqttControl, LocalBroker, parse_command, MQTT_TOPIC
+
+FPS = 10.0
+SIZE = (32, 24)
+
+
+class RecordingOutlet:
+    """Stands in for the marker StreamOutlet and keeps what was pushed."""
+
+    def __init__(self):
+        self.samples = []
+
+    def push_sample(self, sample, timestamp=None):
+        self.samples.append((sample[0], timestamp))
+
+
+class ScriptedQueue:
+    """Encoder queue that publishes control messages just before handing out given frames.
+
+    LocalBroker delivers synchronously, so a command published before frame N
+    is dequeued is applied by encoder_loop right before it writes frame N.
+    """
+
+    def __init__(self, frames, broker, script):
+        self.items = list(frames) + [None]
+        self.broker = broker
+        self.script = script
+
+    def get(self):
+        item = self.items.pop(0)
+        number = item.number if item is not None else None
+        for payload in self.script.get(number, ()):
+            self.broker.publish(MQTT_TOPIC, payload)
+        return item
+
+
+def jpeg_frame(number):
+    image = np.full((SIZE[1], SIZE[0], 3), number, np.uint8)
+    ok, payload = cv2.imencode('.jpg', image)
+    assert ok
+    return Frame(number, 100.0 + number / FPS, number * 1000 / FPS, payload)
+
+
+def open_output(base):
+    filename = base + MJPEG_EXTENSION
+    return filename, MjpegWriter(filename, FPS, SIZE), FrameIndexWriter(index_path(filename))
+
+
+def run_session(tmp_path, frames, script):
+    broker = LocalBroker()
+    control = MqttControl(client=broker.client())
+    outlet = RecordingOutlet()
+    recorder = Recorder(open_output, str(tmp_path), PreTriggerBuffer(2.0, 1 << 20), outlet)
+    try:
+        encoder_loop(recorder, ScriptedQueue(frames, broker, script), control.listen(),
+                     CaptureHealth("test", FPS), threading.Event())
+    finally:
+        control.close()
+    return recorder, outlet
+
+
+def test_session_over_local_broker(tmp_path):
+    frames = [jpeg_frame(n) for n in range(1, 15)]
+    script = {6: ["start"], 8: ["mark hello"], 10: ["segment"], 13: ["stop"]}
+    recorder, outlet = run_session(tmp_path, frames, script)
+
+    # Every segment is in the manifest, complete, with the frames it got
+    with open(os.path.join(tmp_path, f"{recorder.session}.manifest.json")) as f:
+        manifest = json.load(f)
+    entries = manifest['segments']
+    assert [e['file'] for e in entries] == [os.path.basename(s.filename) for s in recorder.segments]
+    assert all(e['complete'] for e in entries)
+    # The frames from before the trigger open the first segment
+    assert (entries[0]['first_frame'], entries[0]['last_frame'], entries[0]['frames']) == (1, 9, 9)
+    assert (entries[1]['first_frame'], entries[1]['last_frame'], entries[1]['frames']) == (10, 12, 3)
+
+    # The files hold those frames, and the index agrees
+    for entry in entries:
+        path = os.path.join(tmp_path, entry['file'])
+        reader = MjpegReader(path)
+        assert sum(1 for _ in reader) == entry['frames']
+        reader.file.close()
+        index = FrameIndex(os.path.join(tmp_path, entry['index']))
+        assert list(index.records['frame']) == list(range(entry['first_frame'], entry['last_frame'] + 1))
+        index.close()
+    # Nothing was left behind by the writer opened ahead for a third segment
+    expected = {f"{recorder.session}.manifest.json"} | {e['file'] for e in entries} | {e['index'] for e in entries}
+    assert set(os.listdir(tmp_path)) == expected
+
+    # Each command left its marker, at the frame it was applied before
+    texts = [text for text, _ in outlet.samples]
+    assert texts[0].startswith("start ") and texts[0].endswith("frame=5")
+    assert texts[1] == "mark hello frame=7"
+    assert texts[2].startswith("segment ") and texts[2].endswith("frame=9")
+    assert texts[3] == f"stop {recorder.session} frame=12"
+    assert len(texts) == 4
+    assert all(timestamp is not None for _, timestamp in outlet.samples)
+
+
+def test_commands_outside_a_recording_are_harmless(tmp_path):
+    frames = [jpeg_frame(n) for n in range(1, 5)]
+    recorder, outlet = run_session(tmp_path, frames, {2: ["stop", "segment"], 3: ["mark idle"]})
+    assert recorder.session is None
+    assert [text for text, _ in outlet.samples] == ["mark idle frame=2"]
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize('payload', [b"", b"   ", b"bogus", b"starting", b"\xff\xfe", "record now", "\n"])
+def test_parse_command_rejects_malformed(payload):
+    assert parse_command(payload) is None
+
+
+@pytest.mark.parametrize('payload, name, argument', [
+    (b"start", "start", ""),
+    ("  STOP \n", "stop", ""),
+    (b"mark door opened", "mark", "door opened"),
+    ("Segment", "segment", ""),
+])
+def test_parse_command(payload, name, argument):
+    command = parse_command(payload)
+    assert (command.name, command.argument) == (name, argument)
+    assert command.timestamp > 0
+
+
+def test_malformed_messages_are_not_queued():
+    broker = LocalBroker()
+    control = MqttControl(client=broker.client())
+    commands = control.listen()
+    broker.publish(MQTT_TOPIC, b"bogus")
+    broker.publish("other/topic", b"start")
+    broker.publish(MQTT_TOPIC, b"mark ok")
+    control.close()
+    broker.publish(MQTT_TOPIC, b"stop")
+    assert [commands.get_nowait().name for _ in range(commands.qsize())] == ["mark"]
+    with pytest.raises(queue.Empty):
+        commands.get_nowait()
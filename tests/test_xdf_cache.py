@@ -0,0 +1,33 @@
+import os
+import numpy as np
+from xdf_cache import XDFCache
+
+
+def cached_entry(cache, tmp_path, name):
+    path = tmp_path / f"{name}.xdf"
+    path.write_bytes(b"XDF:" + name.encode())
+    entry = cache.entry(str(path), {'reader': 'test'})
+    entry.write_stream(1, {'info': {'channel_format': ['float32'], 'channel_count': ['2']},
+                           'time_stamps': np.arange(5.0), 'time_series': np.ones((5, 2), np.float32)})
+    return entry
+
+
+def test_mapped_entries_are_kept_until_released(tmp_path):
+    cache = XDFCache(str(tmp_path / 'cache'))
+    entry = cached_entry(cache, tmp_path, 'first')
+    stream = entry.read_stream(1)
+    view = stream['time_series'][1:3]
+    assert isinstance(stream['time_stamps'], np.memmap)
+
+    # Eviction and clearing leave the mapped entry alone, and say so
+    cache.max_bytes = 0
+    cached_entry(cache, tmp_path, 'second')
+    assert os.path.isdir(entry.directory)
+    assert cache.clear() == [(entry.directory, "in use")]
+
+    # A view keeps the mapping alive; once everything is dropped the entry goes
+    del stream
+    assert cache.in_use(entry.directory)
+    del view
+    assert cache.clear() == []
+    assert os.listdir(cache.directory) == []
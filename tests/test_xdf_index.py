@@ -0,0 +1,209 @@
+import struct
+import numpy as np
+import threading
+import pytest
+import xdf_index
+from xdf_index import XDFIndex, LazyStream, LoadCancelled
+from xdf_cache import XDFCache
+
+pyxdf = pytest.importorskip('pyxdf')
+
+XDF_FORMATS = {'float32': '<f4', 'double64': '<f8', 'int32': '<i4'}
+
+
+def varlen(n):
+    if n < 256:
+        return b'\x01' + bytes([n])
+    return b'\x04' + struct.pack('<I', n)
+
+
+def chunk(tag, content):
+    return varlen(len(content) + 2) + struct.pack('<H', tag) + content
+
+
+def header_chunk(stream_id, name, stream_type, channels, rate, fmt, desc=""):
+    xml = (f"<?xml version='1.0'?><info><name>{name}</name><type>{stream_type}</type>"
+           f"<channel_count>{channels}</channel_count><nominal_srate>{rate}</nominal_srate>"
+           f"<channel_format>{fmt}</channel_format><source_id>{name}-src</source_id>"
+           f"<desc>{desc}</desc></info>")
+    return chunk(2, struct.pack('<I', stream_id) + xml.encode())
+
+
+def samples_chunk(stream_id, time_stamps, values, fmt):
+    content = bytearray(struct.pack('<I', stream_id)) + varlen(len(time_stamps))
+    for t, row in zip(time_stamps, values):
+        content += b'\x08' + struct.pack('<d', t)
+        if fmt == 'string':
+            for value in row:
+                data = value.encode()
+                content += varlen(len(data)) + data
+        else:
+            content += np.asarray(row, XDF_FORMATS[fmt]).tobytes()
+    return chunk(3, bytes(content))
+
+
+def offset_chunk(stream_id, time, value):
+    return chunk(4, struct.pack('<Idd', stream_id, time, value))
+
+
+def footer_chunk(stream_id, count):
+    xml = f"<?xml version='1.0'?><info><sample_count>{count}</sample_count></info>"
+    return chunk(6, struct.pack('<I', stream_id) + xml.encode())
+
+
+def write_xdf(path, seed=0):
+    """An XDF file whose streams exercise clock resets, noisy offsets and dejittering."""
+    rng = np.random.default_rng(seed)
+    out = bytearray(b'XDF:')
+    out += chunk(1, b"<?xml version='1.0'?><info><version>1.0</version></info>")
+    out += header_chunk(1, 'IMU_Stream', 'IMU', 3, 100, 'float32')
+    out += header_chunk(2, 'FrameNumberStream', 'Markers', 1, 30, 'int32',
+                        "<synchronization><can_drop_samples>true</can_drop_samples></synchronization>")
+    out += header_chunk(3, 'RecorderMarkers', 'Markers', 1, 0, 'string')
+    out += header_chunk(4, 'Late', 'EEG', 2, 50, 'double64')
+
+    # Stream 1 restarts halfway: its clock jumps back from ~1060 s to ~5 s and
+    # its offset to the recorder clock jumps by the same amount. The offsets are
+    # noisy with an outlier, where a least-squares fit and a robust one differ.
+    counts = {1: 0, 2: 0, 3: 0, 4: 0}
+    for second in range(120):
+        reset = second >= 60
+        local = (5.0 + second - 60) if reset else (1000.0 + second)
+        offset = (1055.0 if reset else 0.01) + 2e-5 * second
+        if second % 5 == 0:
+            noise = 0.05 if second == 35 else rng.normal(0, 2e-4)
+            out += offset_chunk(1, local + 0.5, offset + noise)
+            out += offset_chunk(2, 1000.0 + second, 0.02 + 1e-5 * second + rng.normal(0, 2e-4))
+            out += offset_chunk(3, 1000.0 + second, 0.03)
+        stamps = local + np.arange(100) / 100 + rng.normal(0, 1e-3, 100)
+        out += samples_chunk(1, stamps, rng.normal(size=(100, 3)), 'float32')
+        counts[1] += 100
+        frames = [k for k in range(30) if (second * 30 + k) % 17]   # Dropped frames
+        out += samples_chunk(2, 1000.0 + second + np.array(frames) / 30.0,
+                             [[second * 30 + k] for k in frames], 'int32')
+        counts[2] += len(frames)
+        if second % 10 == 0:
+            out += samples_chunk(3, [1000.0 + second + 0.25], [[f"marker {second}"]], 'string')
+            counts[3] += 1
+        if second >= 100:
+            # Samples with a gap of over a second, and no clock offsets at all
+            base = 1000.0 + second + (2.5 if second >= 110 else 0.0)
+            out += samples_chunk(4, base + np.arange(50) / 50 + rng.normal(0, 1e-3, 50),
+                                 rng.normal(size=(50, 2)), 'double64')
+            counts[4] += 50
+    for stream_id, count in counts.items():
+        out += footer_chunk(stream_id, count)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def write_truncated_xdf(path):
+    """A stream whose outlet went away mid-recording: one sample past the footer and a garbage offset."""
+    out = bytearray(b'XDF:')
+    out += chunk(1, b"<?xml version='1.0'?><info><version>1.0</version></info>")
+    out += header_chunk(1, 'IMU_Stream', 'IMU', 1, 10, 'float32')
+    for second in range(20):
+        out += offset_chunk(1, 100.0 + second, 0.5 + 1e-4 * (second % 3))
+        out += samples_chunk(1, 100.0 + second + np.arange(10) / 10, np.ones((10, 1)), 'float32')
+    out += offset_chunk(1, 100.0 + 20.001, -3.0e6)
+    out += samples_chunk(1, [120.0], [[9.0]], 'float32')
+    out += footer_chunk(1, 200)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def by_id(streams):
+    return {stream['info']['stream_id']: stream for stream in streams}
+
+
+def assert_same_streams(expected, actual):
+    assert sorted(expected) == sorted(actual)
+    for stream_id, reference in expected.items():
+        stream = actual[stream_id]
+        np.testing.assert_allclose(stream['time_stamps'], reference['time_stamps'], rtol=0, atol=1e-9)
+        if isinstance(reference['time_series'], list):
+            assert stream['time_series'] == reference['time_series']
+        else:
+            np.testing.assert_array_equal(stream['time_series'], reference['time_series'])
+        for key in ('segments', 'clock_segments'):
+            assert [tuple(s) for s in stream['info'][key]] == [tuple(s) for s in reference['info'][key]]
+        assert stream['info']['effective_srate'] == pytest.approx(reference['info']['effective_srate'],
+                                                                  rel=1e-9)
+        assert list(stream['clock_times']) == list(reference['clock_times'])
+        assert list(stream['clock_values']) == list(reference['clock_values'])
+
+
+@pytest.fixture
+def xdf_file(tmp_path):
+    path = str(tmp_path / 'recording.xdf')
+    write_xdf(path)
+    return path
+
+
+def test_lazy_streams_match_pyxdf(xdf_file):
+    expected = by_id(pyxdf.load_xdf(xdf_file)[0])
+    streams, header = XDFIndex.open(xdf_file).load_streams()
+    assert all(isinstance(stream, LazyStream) and not stream.loaded for stream in streams)
+    assert_same_streams(expected, by_id(streams))
+
+    # The reset splits stream 1 into two clock segments, each mapped with its own offset
+    clock_segments = by_id(streams)[1]['info']['clock_segments']
+    assert len(clock_segments) == 2
+    time_stamps = by_id(streams)[1]['time_stamps']
+    assert np.all(np.diff(time_stamps) > 0)
+    assert time_stamps[clock_segments[1][0]] == pytest.approx(1060.01, abs=0.01)
+
+
+def test_cached_streams_match_pyxdf(xdf_file, tmp_path):
+    expected = by_id(pyxdf.load_xdf(xdf_file)[0])
+    cache = XDFCache(str(tmp_path / 'cache'))
+    for _ in range(2):
+        # Decoded and written on the first pass, mapped from the cache on the second
+        streams, _ = XDFIndex.open(xdf_file, cache).load_streams()
+        assert_same_streams(expected, by_id(streams))
+
+
+def test_corrupted_last_offset_is_truncated_like_pyxdf(tmp_path):
+    path = str(tmp_path / 'truncated.xdf')
+    write_truncated_xdf(path)
+    expected = by_id(pyxdf.load_xdf(path)[0])
+    assert len(expected[1]['time_stamps']) == 200
+    streams, _ = XDFIndex.open(path).load_streams()
+    assert_same_streams(expected, by_id(streams))
+
+
+def test_full_load_reports_progress_and_can_be_cancelled(xdf_file, monkeypatch):
+    monkeypatch.setattr(xdf_index, 'PROGRESS_BYTES', 4096)
+    streams, _ = XDFIndex.open(xdf_file).load_streams()
+    stream = by_id(streams)[1]
+
+    cancel_event = threading.Event()
+    progress = []
+
+    def on_progress(decoded):
+        progress.append(decoded)
+        if len(progress) == 3:
+            cancel_event.set()
+
+    # Stops at the chunk after the request, with nothing half decoded left behind
+    with pytest.raises(LoadCancelled):
+        stream.load(on_progress, cancel_event)
+    assert not stream.loaded
+    assert progress == sorted(progress) and progress[-1] < stream.entry.sample_bytes
+
+    progress.clear()
+    stream.load(progress.append)
+    assert stream.loaded and len(progress) > 3
+    expected = by_id(pyxdf.load_xdf(xdf_file)[0])
+    assert_same_streams({1: expected[1]}, {1: stream})
+
+
+@pytest.mark.parametrize('tail', [b'\x04', b'\x04\x10\x00', b'\x08\x10\x00\x00\x00', b'\x01'])
+def test_truncated_length_field_ends_the_scan(xdf_file, tail):
+    expected = XDFIndex.scan(xdf_file)
+    with open(xdf_file, 'ab') as f:
+        f.write(tail)
+    index = XDFIndex.scan(xdf_file)
+    assert sorted(index.streams) == sorted(expected.streams)
+    for stream_id, entry in expected.streams.items():
+        assert index.streams[stream_id].sample_chunks == entry.sample_chunks
@@ -0,0 +1,191 @@
+import os
+import gc
+import json
+import mmap
+import shutil
+import hashlib
+import weakref
+import threading
+from collections import defaultdict
+import numpy as np
+
+# On-disk cache of parsed XDF files.
+#
+# Each XDF file, read with given reader options, gets a directory under
+# CACHE_DIR named by a hash of its absolute path, size, modification time and
+# the options, so an edited file or different options simply miss. In it,
+# JSON files hold the file header, the chunk index and each stream's info,
+# footer and clock offsets, and .npy files hold each stream's timestamps and
+# samples. Numeric arrays are memory-mapped copy-on-write on reopen, which
+# takes milliseconds whatever their size; string samples are small and read
+# whole. Entries are evicted least recently used first once the cache grows
+# past CACHE_MAX_BYTES. Entries whose arrays are still mapped are never
+# removed, since Windows can't delete a mapped file, and removals that fail
+# anyway are reported rather than ignored.
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'xdf')
+CACHE_MAX_BYTES = 20 << 30
+CACHE_VERSION = 1          # Bump when the layout of an entry changes
+STRING_FORMAT = 'string'
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class XDFCache:
+    """A directory of CacheEntry directories with size-based eviction."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.maps = defaultdict(weakref.WeakSet)   # Entry directory -> its live file mappings
+        self.lock = threading.Lock()
+
+    def track(self, directory, array):
+        """Remember the mapping behind array until it, and every view of it, is gone."""
+        base = array
+        while base is not None and not isinstance(base, mmap.mmap):
+            base = getattr(base, 'base', None)
+        if base is not None:
+            with self.lock:
+                self.maps[directory].add(base)
+
+    def in_use(self, directory):
+        """Whether arrays mapped from the entry's files are still alive."""
+        with self.lock:
+            if not self.maps.get(directory):
+                return False
+        # Dropped arrays caught in reference cycles still hold their mappings
+        gc.collect()
+        with self.lock:
+            if self.maps.get(directory):
+                return True
+            self.maps.pop(directory, None)
+            return False
+
+    def remove(self, directory):
+        """Delete an entry unless it's in use; returns None, or why it is still there."""
+        if self.in_use(directory):
+            return "in use"
+        try:
+            shutil.rmtree(directory)
+        except OSError as e:
+            return str(e)
+        return None
+
+    def entry(self, path, options):
+        """The CacheEntry for the XDF file at path as read with options (a JSON-able dict)."""
+        stat = os.stat(path)
+        key = json.dumps([CACHE_VERSION, os.path.abspath(path), stat.st_size, stat.st_mtime_ns, options],
+                         sort_keys=True)
+        return CacheEntry(self, os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest()))
+
+    def evict(self, keep=None):
+        """Remove the least recently used entries until the cache fits in max_bytes."""
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for name in os.listdir(self.directory):
+            directory = os.path.join(self.directory, name)
+            if not os.path.isdir(directory):
+                continue
+            size = sum(e.stat().st_size for e in os.scandir(directory) if e.is_file())
+            entries.append((os.stat(directory).st_mtime, size, directory))
+        total = sum(e[1] for e in entries)
+        for _, size, directory in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if directory == keep:
+                continue
+            error = self.remove(directory)
+            if error is None:
+                total -= size
+            elif error != "in use":
+                print(f"Could not evict {directory} from the XDF cache: {error}")
+
+    def clear(self):
+        """Delete every entry that isn't in use; returns (directory, reason) of those left."""
+        if not os.path.isdir(self.directory):
+            return []
+        kept = []
+        for name in os.listdir(self.directory):
+            directory = os.path.join(self.directory, name)
+            if os.path.isdir(directory):
+                error = self.remove(directory)
+                if error is not None:
+                    kept.append((directory, error))
+        return kept
+
+
+class CacheEntry:
+    """The cached parse of one XDF file: JSON documents and per-stream arrays."""
+
+    def __init__(self, cache, directory):
+        self.cache = cache
+        self.directory = directory
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _touch(self):
+        # The directory's mtime is the entry's last use, for eviction
+        try:
+            os.utime(self.directory)
+        except OSError:
+            pass
+
+    def _write(self, name, write):
+        # Write next to the target and rename, so readers never see half a file
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self._path(name + '.tmp')
+        with open(temporary, 'wb') as f:
+            write(f)
+        os.replace(temporary, self._path(name))
+
+    def read_json(self, name):
+        try:
+            with open(self._path(name + '.json')) as f:
+                document = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._touch()
+        return document
+
+    def write_json(self, name, document):
+        text = json.dumps(document, default=_json_default).encode()
+        self._write(name + '.json', lambda f: f.write(text))
+        self.cache.evict(keep=self.directory)
+
+    def read_stream(self, stream_id):
+        """A cached stream dict like pyxdf.load_xdf's, or None if it isn't cached."""
+        stream = self.read_json(f"stream_{stream_id}")
+        if stream is None:
+            return None
+        info = stream['info']
+        for key in ('segments', 'clock_segments'):
+            if key in info:
+                info[key] = [tuple(segment) for segment in info[key]]
+        try:
+            stream['time_stamps'] = np.load(self._path(f"stream_{stream_id}_time_stamps.npy"), mmap_mode='c')
+            if stream['info']['channel_format'][0] == STRING_FORMAT:
+                stream['time_series'] = np.load(self._path(f"stream_{stream_id}_time_series.npy")).tolist()
+            else:
+                stream['time_series'] = np.load(self._path(f"stream_{stream_id}_time_series.npy"), mmap_mode='c')
+        except (OSError, ValueError):
+            return None
+        for key in ('time_stamps', 'time_series'):
+            self.cache.track(self.directory, stream[key])
+        return stream
+
+    def write_stream(self, stream_id, stream):
+        """Store a decoded stream; the JSON goes last so a partial write reads as a miss."""
+        time_series = stream['time_series']
+        if isinstance(time_series, list):
+            channels = int(stream['info']['channel_count'][0])
+            time_series = np.array(time_series, dtype=str).reshape(len(time_series), channels)
+        self._write(f"stream_{stream_id}_time_stamps.npy", lambda f: np.save(f, np.asarray(stream['time_stamps'])))
+        self._write(f"stream_{stream_id}_time_series.npy", lambda f: np.save(f, time_series))
+        self.write_json(f"stream_{stream_id}", {key: value for key, value in stream.items()
+                                                if key not in ('time_stamps', 'time_series')})
@@ -0,0 +1,566 @@
+import os
+import struct
+import threading
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+import numpy as np
+
+# Chunk index of XDF files.
+#
+# An XDF file is the magic "XDF:" followed by chunks, each a variable-length
+# byte count, a uint16 tag and the content; every chunk but the file header
+# and boundaries starts its content with the uint32 stream id. scan() walks
+# the chunks once, parsing the small XML ones (file header, stream headers and
+# footers) and the clock offsets, and only records where each sample chunk is,
+# seeking past it. That takes a fraction of the time of decoding the file and
+# gives the streams long before their samples are read.
+#
+# load_streams() then returns LazyStream dicts shaped like pyxdf.load_xdf's
+# streams, whose samples are read from the indexed chunks, clock-synchronized
+# and dejittered the first time they are asked for. Both follow pyxdf.load_xdf
+# with its default options step for step: a corrupted last clock offset is
+# dropped, the offsets are split at clock resets and each range gets a robust
+# (Huber) fit, and every gap-free segment is dejittered by least squares.
+#
+# Given an xdf_cache.XDFCache, open() reuses a cached index and LazyStream
+# maps cached samples instead of decoding them, writing both on a miss.
+XDF_MAGIC = b"XDF:"
+TAG_FILE_HEADER = 1
+TAG_STREAM_HEADER = 2
+TAG_SAMPLES = 3
+TAG_CLOCK_OFFSET = 4
+TAG_BOUNDARY = 5
+TAG_STREAM_FOOTER = 6
+PROGRESS_BYTES = 16 << 20   # Report progress every this many bytes scanned
+JITTER_BREAK_SECONDS = 1    # Gaps that start a new dejitter segment, as pyxdf.load_xdf
+JITTER_BREAK_SAMPLES = 500
+CLOCK_RESET_SECONDS = 5     # Clock offset glitches that mark a clock reset, as pyxdf.load_xdf
+CLOCK_RESET_STDS = 5
+CLOCK_RESET_OFFSET_SECONDS = 1
+CLOCK_RESET_OFFSET_STDS = 10
+WINSOR_THRESHOLD = 0.0001   # Scale of the clock offset errors the robust fit treats as normal
+DECODE_OPTIONS = {'reader': 'xdf_index', 'clock_sync': 'robust',
+                  'jitter_break_seconds': JITTER_BREAK_SECONDS,
+                  'jitter_break_samples': JITTER_BREAK_SAMPLES}   # Cache key of what load_streams() gives
+XDF_DTYPES = {'int8': '<i1', 'int16': '<i2', 'int32': '<i4', 'int64': '<i8',
+              'float32': '<f4', 'double64': '<f8'}
+
+
+class LoadCancelled(Exception):
+    """Raised by a scan or load when its cancel event is set."""
+
+
+def xml_to_dict(element):
+    """Convert an attribute-less XML element into nested dicts of lists, like pyxdf."""
+    children = defaultdict(list)
+    for child in map(xml_to_dict, element):
+        for key, value in child.items():
+            children[key].append(value)
+    return {element.tag: children or element.text}
+
+
+def read_varlen_int(f):
+    """A variable-length integer read from f; EOFError if the file ends within it."""
+    width = f.read(1)
+    if not width:
+        raise EOFError()
+    formats = {b"\x01": "<B", b"\x04": "<I", b"\x08": "<Q"}
+    if width not in formats:
+        raise ValueError(f"Invalid variable-length integer width {width[0]}")
+    size = int.from_bytes(width, 'little')
+    data = f.read(size)
+    if len(data) < size:
+        raise EOFError()     # Truncated inside the length field
+    return struct.unpack(formats[width], data)[0]
+
+
+class StreamEntry:
+    """What the index knows about one stream: header, footer, clock offsets and sample chunks."""
+
+    def __init__(self, stream_id, info):
+        self.stream_id = stream_id
+        self.info = info              # The stream header as pyxdf's stream['info']
+        self.footer = None
+        self.clock_times = []         # Collection time of every clock offset measurement
+        self.clock_values = []
+        self.sample_chunks = []       # (offset, length) of the content after the stream id
+
+    @property
+    def sample_bytes(self):
+        return sum(length for _, length in self.sample_chunks)
+
+    @property
+    def name(self):
+        return self.info.get('name', [None])[0]
+
+    @property
+    def type(self):
+        return self.info.get('type', [None])[0]
+
+    @property
+    def channel_count(self):
+        return int(self.info['channel_count'][0])
+
+    @property
+    def srate(self):
+        return float(self.info['nominal_srate'][0])
+
+    @property
+    def channel_format(self):
+        return self.info['channel_format'][0]
+
+    def read_samples(self, f, on_progress=None, cancel_event=None):
+        """Decode every sample chunk of the stream from the open file f.
+
+        Returns the raw (unsynchronized) timestamps and the samples, an array
+        for numeric streams and a list of lists for string streams.
+        on_progress(bytes_decoded) is called every PROGRESS_BYTES; setting
+        cancel_event makes it raise LoadCancelled between chunks.
+        """
+        fmt = self.channel_format
+        channels = self.channel_count
+        tdiff = 1.0 / self.srate if self.srate > 0 else 0.0
+        stamps, values = [], []
+        last_timestamp = 0.0
+        decoded = 0
+        next_report = PROGRESS_BYTES
+        for offset, length in self.sample_chunks:
+            if cancel_event is not None and cancel_event.is_set():
+                raise LoadCancelled()
+            if on_progress and decoded >= next_report:
+                on_progress(decoded)
+                next_report = decoded + PROGRESS_BYTES
+            decoded += length
+            f.seek(offset)
+            content = memoryview(f.read(length))
+            count, position = _varlen_from(content, 0)
+            if fmt != 'string':
+                # Fast path: every sample carries its own 8-byte timestamp
+                dtype = np.dtype([('flag', 'u1'), ('t', '<f8'), ('v', XDF_DTYPES[fmt], (channels,))])
+                if len(content) - position == count * dtype.itemsize:
+                    records = np.frombuffer(content, dtype, count, position)
+                    if np.all(records['flag'] == 8):
+                        stamps.append(records['t'].copy())
+                        values.append(records['v'].astype(XDF_DTYPES[fmt][1:]))
+                        if count:
+                            last_timestamp = stamps[-1][-1]
+                        continue
+            chunk_stamps = np.empty(count)
+            chunk_values = [] if fmt == 'string' else np.empty((count, channels), XDF_DTYPES[fmt][1:])
+            item = 0 if fmt == 'string' else np.dtype(XDF_DTYPES[fmt]).itemsize * channels
+            for k in range(count):
+                if content[position] == 8:
+                    last_timestamp = struct.unpack_from("<d", content, position + 1)[0]
+                    position += 9
+                else:
+                    last_timestamp += tdiff
+                    position += 1
+                chunk_stamps[k] = last_timestamp
+                if fmt == 'string':
+                    sample = []
+                    for _ in range(channels):
+                        size, position = _varlen_from(content, position)
+                        sample.append(bytes(content[position:position + size]).decode(errors='replace'))
+                        position += size
+                    chunk_values.append(sample)
+                else:
+                    chunk_values[k] = np.frombuffer(content, XDF_DTYPES[fmt], channels, position)
+                    position += item
+            stamps.append(chunk_stamps)
+            values.append(chunk_values)
+
+        time_stamps = np.concatenate(stamps) if stamps else np.zeros(0)
+        if fmt == 'string':
+            time_series = [sample for chunk in values for sample in chunk]
+        elif values:
+            time_series = np.concatenate(values)
+        else:
+            time_series = np.zeros((0, channels))
+        return time_stamps, time_series
+
+    @property
+    def can_drop_samples(self):
+        """Whether the header says samples may be missing (video, HMDs), which rules out dejittering."""
+        try:
+            value = self.info['desc'][0]['synchronization'][0]['can_drop_samples'][0]
+        except (KeyError, IndexError, TypeError):
+            return False
+        return str(value).lower() == 'true'
+
+    def truncate_corrupted(self, time_stamps, time_series):
+        """Drop the extra last sample and clock offset a destroyed outlet can leave (pylsl#67).
+
+        Both have to be there, more samples than the footer counts and an
+        anomalous last offset, as in pyxdf. Returns the time stamps, samples,
+        clock times and clock values to go on with.
+        """
+        clock_times, clock_values = self.clock_times, self.clock_values
+        try:
+            footer_count = int(self.footer['info']['sample_count'][0])
+        except (KeyError, IndexError, TypeError, ValueError):
+            return time_stamps, time_series, clock_times, clock_values
+        if len(time_stamps) <= footer_count or not _last_offset_corrupted(clock_times, clock_values):
+            return time_stamps, time_series, clock_times, clock_values
+        return time_stamps[:footer_count], time_series[:footer_count], clock_times[:-1], clock_values[:-1]
+
+    def synchronize(self, time_stamps, clock_times, clock_values):
+        """Map the timestamps to the recording computer's clock with the clock offsets.
+
+        The offsets are split where the stream's clock was reset and each range
+        is fitted robustly, exactly as pyxdf.load_xdf does. Returns the
+        timestamps, changed in place, and the clock segments.
+        """
+        if not len(time_stamps) or not clock_times:
+            return time_stamps, []
+        if len(clock_times) > 1:
+            ranges = _clock_reset_ranges(clock_times, clock_values)
+        else:
+            ranges = [(0, 0)]
+        coefficients = []
+        for start, stop in ranges:
+            if start == stop:
+                coefficients.append((clock_values[start], 0))
+                continue
+            X = np.column_stack([np.ones(stop + 1 - start),
+                                 np.array(clock_times[start:stop + 1]) / WINSOR_THRESHOLD])
+            y = np.array(clock_values[start:stop + 1]) / WINSOR_THRESHOLD
+            try:
+                coefficient = _robust_fit(X, y)
+                coefficient[0] *= WINSOR_THRESHOLD
+            except np.linalg.LinAlgError:
+                coefficient = [0, 0]
+            coefficients.append(coefficient)
+
+        if len(ranges) == 1:
+            intercept, slope = coefficients[0]
+            time_stamps += intercept + slope * time_stamps
+            return time_stamps, [(0, len(time_stamps) - 1)]
+        # Each range maps the timestamps up to the first one closer to the next range's offsets
+        clock_segments = []
+        ts_start = 0
+        for (intercept, slope), (_, stop) in zip(coefficients, ranges):
+            if stop + 1 < len(clock_times):
+                closer_to_current = (np.abs(time_stamps[ts_start:] - clock_times[stop]) <
+                                     np.abs(time_stamps[ts_start:] - clock_times[stop + 1]))
+                if all(closer_to_current):
+                    ts_stop = ts_start + len(closer_to_current)
+                else:
+                    ts_stop = ts_start + np.argmin(closer_to_current).item()
+            else:
+                ts_stop = len(time_stamps)
+            if ts_start != ts_stop:
+                clock_segments.append((ts_start, ts_stop - 1))
+                time_stamps[ts_start:ts_stop] += intercept + slope * time_stamps[ts_start:ts_stop]
+                ts_start = ts_stop
+        return time_stamps, clock_segments
+
+    def dejitter(self, time_stamps):
+        """Replace the timestamps by a linear fit within each gap-free segment.
+
+        Returns the segments (inclusive index ranges) and the effective rate.
+        """
+        count = len(time_stamps)
+        if not count:
+            return [], 0
+        if self.srate == 0:
+            return [(0, count - 1)], 0
+        if self.can_drop_samples:
+            # A fit would squeeze the dropped samples' gaps out of the timestamps
+            duration = time_stamps[-1] - time_stamps[0]
+            return [(0, count - 1)], (count - 1) / duration if count > 1 and duration > 0 else 0
+        breaks = np.flatnonzero(np.abs(np.diff(time_stamps)) >
+                                max(JITTER_BREAK_SECONDS, JITTER_BREAK_SAMPLES / self.srate))
+        starts = np.r_[0, breaks + 1]
+        stops = np.r_[breaks, count - 1]
+        for start, stop in zip(starts, stops):
+            index = np.arange(start, stop + 1)[:, None]
+            X = np.concatenate((np.ones_like(index), index), axis=1)
+            mapping = np.linalg.lstsq(X, time_stamps[index], rcond=-1)[0]
+            time_stamps[index] = mapping[0] + mapping[1] * index
+        counts = stops + 1 - starts
+        effective_srate = 0
+        if np.any(counts > 1):
+            effective_srate = np.sum(counts - 1) / np.sum(time_stamps[stops] - time_stamps[starts])
+        return [(int(a), int(b)) for a, b in zip(starts, stops)], effective_srate
+
+
+def _last_offset_corrupted(clock_times, clock_values, time_ratio=10.0, value_zscore=10.0):
+    """Whether the last clock offset stands out from the others in interval or value, as in pyxdf."""
+    times = np.asarray(clock_times)
+    values = np.asarray(clock_values)
+    if len(times) < 3:
+        return False
+    intervals = np.diff(times)
+    median_interval = np.median(intervals[:-1])
+    last_interval = np.abs(intervals[-1])
+    if median_interval > 0:
+        ratio = last_interval / median_interval
+    else:
+        ratio = np.inf if last_interval > 0 else 1.0
+    median_value = np.median(values[:-1])
+    mad = np.median(np.abs(values[:-1] - median_value))
+    # 1.4826 * MAD estimates the standard deviation of normally distributed values
+    zscore = np.abs(values[-1] - median_value) / (1.4826 * mad) if mad > np.finfo(float).eps else 0.0
+    return ratio > time_ratio or zscore > value_zscore
+
+
+def _glitches(diff, threshold_stds, threshold_seconds):
+    # Steps that are far from the median step, both relative to the spread and in seconds
+    shifted = diff - np.median(diff)
+    mad = np.median(np.abs(shifted)) + np.finfo(float).eps
+    return (np.abs(shifted / mad) > threshold_stds) & (np.abs(shifted) > threshold_seconds)
+
+
+def _clock_reset_ranges(clock_times, clock_values):
+    """Inclusive index ranges of the clock offsets between clock resets, as pyxdf detects them."""
+    time_diff = np.diff(clock_times)
+    value_diff = np.diff(clock_values)
+    resets = (time_diff < 0) | (_glitches(time_diff, CLOCK_RESET_STDS, CLOCK_RESET_SECONDS) &
+                                _glitches(value_diff, CLOCK_RESET_OFFSET_STDS, CLOCK_RESET_OFFSET_SECONDS))
+    breaks = np.flatnonzero(resets)
+    return list(zip(np.r_[0, breaks + 1].tolist(), np.r_[breaks, len(resets)].tolist()))
+
+
+def _robust_fit(A, y, rho=1, iters=1000):
+    """Least-Huber-loss solution x of A x = y by ADMM, the same iteration as pyxdf's."""
+    A = np.copy(A)
+    offset = np.min(A[:, 1])
+    A[:, 1] -= offset
+    Aty = np.dot(A.T, y)
+    L = np.linalg.cholesky(np.dot(A.T, A))
+    U = L.T
+    z = np.zeros_like(y)
+    u = z
+    x = z
+    for _ in range(iters):
+        x = np.linalg.solve(U, np.linalg.solve(L, Aty + np.dot(A.T, z - u)))
+        d = np.dot(A, x) - y + u
+        d_inv = np.zeros_like(d)
+        np.divide(1, d, out=d_inv, where=d != 0)
+        shrink = np.maximum(0, 1 - (1 + 1 / rho) * np.abs(d_inv))
+        z = rho / (1 + rho) * d + 1 / (1 + rho) * shrink * d
+        u = d - z
+    x[0] -= x[1] * offset
+    return x
+
+
+def _varlen_from(buffer, position):
+    """A variable-length integer read from buffer at position, and the position after it."""
+    width = buffer[position]
+    if width == 1:
+        return buffer[position + 1], position + 2
+    if width == 4:
+        return struct.unpack_from("<I", buffer, position + 1)[0], position + 5
+    if width == 8:
+        return struct.unpack_from("<Q", buffer, position + 1)[0], position + 9
+    raise ValueError(f"Invalid variable-length integer width {width}")
+
+
+class LazyStream(dict):
+    """A stream dict like pyxdf.load_xdf's whose samples are decoded on first access.
+
+    info, footer and the clock offsets are there from the start; asking for
+    'time_series' or 'time_stamps' (or iterating over the keys) decodes the
+    samples once, which can take a while for long high-rate streams.
+    """
+    SAMPLE_KEYS = ('time_series', 'time_stamps')
+
+    def __init__(self, entry, path, cache_entry=None):
+        entry.info['stream_id'] = entry.stream_id
+        super().__init__(info=entry.info, footer=entry.footer,
+                         clock_times=entry.clock_times, clock_values=entry.clock_values)
+        self.entry = entry
+        self.path = path
+        self.cache_entry = cache_entry
+        self.lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return dict.__contains__(self, 'time_stamps')
+
+    def load(self, on_progress=None, cancel_event=None):
+        """Decode the samples unless they are already; see StreamEntry.read_samples for the arguments."""
+        with self.lock:
+            if self.loaded:
+                return
+            info = self['info']
+            cached = self.cache_entry.read_stream(self.entry.stream_id) if self.cache_entry else None
+            if cached is not None:
+                info.update(cached['info'])
+                for key in ('clock_times', 'clock_values'):
+                    if key in cached:
+                        dict.__setitem__(self, key, cached[key])
+                dict.__setitem__(self, 'time_series', cached['time_series'])
+                dict.__setitem__(self, 'time_stamps', cached['time_stamps'])
+                return
+            with open(self.path, 'rb') as f:
+                time_stamps, time_series = self.entry.read_samples(f, on_progress, cancel_event)
+            time_stamps, time_series, clock_times, clock_values = self.entry.truncate_corrupted(
+                time_stamps, time_series)
+            time_stamps, clock_segments = self.entry.synchronize(time_stamps, clock_times, clock_values)
+            segments, effective_srate = self.entry.dejitter(time_stamps)
+            info['effective_srate'] = effective_srate
+            info['segments'] = segments
+            info['clock_segments'] = clock_segments
+            dict.__setitem__(self, 'clock_times', clock_times)
+            dict.__setitem__(self, 'clock_values', clock_values)
+            dict.__setitem__(self, 'time_series', time_series)
+            dict.__setitem__(self, 'time_stamps', time_stamps)
+            if self.cache_entry is not None:
+                try:
+                    self.cache_entry.write_stream(self.entry.stream_id, dict(dict.items(self)))
+                except OSError as e:
+                    print(f"Could not cache stream {self.entry.stream_id}: {e}")
+
+    def __missing__(self, key):
+        if key in self.SAMPLE_KEYS:
+            self.load()
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.SAMPLE_KEYS or dict.__contains__(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __iter__(self):
+        self.load()
+        return dict.__iter__(self)
+
+    def keys(self):
+        self.load()
+        return dict.keys(self)
+
+    def values(self):
+        self.load()
+        return dict.values(self)
+
+    def items(self):
+        self.load()
+        return dict.items(self)
+
+
+class XDFIndex:
+    """Locations of every chunk in an XDF file, grouped by stream."""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.header = None
+        self.streams = {}             # stream id -> StreamEntry, in header order
+        self.boundaries = []          # Offsets of boundary chunks
+        self.cache_entry = None       # Where load_streams() caches samples, set by open()
+
+    @classmethod
+    def scan(cls, path, on_stream=None, on_progress=None, cancel_event=None):
+        """Index the file at path.
+
+        on_stream(entry) is called as each stream header is parsed and
+        on_progress(bytes_scanned, total_bytes) every PROGRESS_BYTES; setting
+        cancel_event makes the scan raise LoadCancelled.
+        """
+        index = cls(path)
+        with open(path, 'rb') as f:
+            if f.read(4) != XDF_MAGIC:
+                raise ValueError(f"{path} is not an XDF file")
+            next_report = PROGRESS_BYTES
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise LoadCancelled()
+                offset = f.tell()
+                if on_progress and offset >= next_report:
+                    on_progress(offset, index.size)
+                    next_report = offset + PROGRESS_BYTES
+                try:
+                    length = read_varlen_int(f)
+                except EOFError:
+                    break
+                start = f.tell()
+                header = f.read(2)
+                if len(header) < 2:
+                    break     # Truncated by a crashed recorder; keep what was complete
+                tag = struct.unpack("<H", header)[0]
+                end = start + length
+                if end > index.size:
+                    break
+                index._add_chunk(f, tag, offset, end, on_stream)
+                f.seek(end)
+        if on_progress:
+            on_progress(index.size, index.size)
+        return index
+
+    @classmethod
+    def open(cls, path, cache=None, on_stream=None, on_progress=None, cancel_event=None):
+        """scan() the file, or read its index from cache (an XDFCache) when it was scanned before."""
+        cache_entry = cache.entry(path, DECODE_OPTIONS) if cache is not None else None
+        document = cache_entry.read_json('index') if cache_entry is not None else None
+        if document is not None:
+            index = cls.from_json(path, document)
+            for entry in index.streams.values():
+                if on_stream:
+                    on_stream(entry)
+            if on_progress:
+                on_progress(index.size, index.size)
+        else:
+            index = cls.scan(path, on_stream, on_progress, cancel_event)
+            if cache_entry is not None:
+                try:
+                    cache_entry.write_json('index', index.to_json())
+                except OSError as e:
+                    print(f"Could not cache the index of {path}: {e}")
+        index.cache_entry = cache_entry
+        return index
+
+    def to_json(self):
+        return {
+            'header': self.header,
+            'boundaries': self.boundaries,
+            'streams': [{'stream_id': e.stream_id, 'info': e.info, 'footer': e.footer,
+                         'clock_times': e.clock_times, 'clock_values': e.clock_values,
+                         'sample_chunks': e.sample_chunks} for e in self.streams.values()],
+        }
+
+    @classmethod
+    def from_json(cls, path, document):
+        index = cls(path)
+        index.header = document['header']
+        index.boundaries = document['boundaries']
+        for stream in document['streams']:
+            entry = StreamEntry(stream['stream_id'], stream['info'])
+            entry.footer = stream['footer']
+            entry.clock_times = stream['clock_times']
+            entry.clock_values = stream['clock_values']
+            entry.sample_chunks = [tuple(chunk) for chunk in stream['sample_chunks']]
+            index.streams[entry.stream_id] = entry
+        return index
+
+    def load_streams(self):
+        """(streams, header) like pyxdf.load_xdf, with each stream's samples decoded on demand."""
+        return [LazyStream(entry, self.path, self.cache_entry) for entry in self.streams.values()], self.header
+
+    def _add_chunk(self, f, tag, offset, end, on_stream):
+        if tag == TAG_FILE_HEADER:
+            self.header = xml_to_dict(ET.fromstring(f.read(end - f.tell())))
+            return
+        if tag == TAG_BOUNDARY:
+            self.boundaries.append(offset)
+            return
+        stream_id = struct.unpack("<I", f.read(4))[0]
+        if tag == TAG_STREAM_HEADER:
+            info = xml_to_dict(ET.fromstring(f.read(end - f.tell())))['info']
+            entry = self.streams[stream_id] = StreamEntry(stream_id, info)
+            if on_stream:
+                on_stream(entry)
+            return
+        entry = self.streams.get(stream_id)
+        if entry is None:
+            return    # Chunk of a stream whose header is missing
+        if tag == TAG_SAMPLES:
+            entry.sample_chunks.append((f.tell(), end - f.tell()))
+        elif tag == TAG_CLOCK_OFFSET:
+            collection_time, offset_value = struct.unpack("<dd", f.read(16))
+            entry.clock_times.append(collection_time)
+            entry.clock_values.append(offset_value)
+        elif tag == TAG_STREAM_FOOTER:
+            entry.footer = {'info': xml_to_dict(ET.fromstring(f.read(end - f.tell())))['info']}